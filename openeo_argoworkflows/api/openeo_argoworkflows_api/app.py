@@ -17,14 +17,68 @@ gtif = FileFormat(
     parameters={},
 )
 
+# Opt-in splitting of large results into several files, written in parallel.
+piece_size = {
+    "type": "integer",
+    "description": (
+        "Split the result into files of about this edge length in pixels. "
+        "By default the result is written as a single file."
+    ),
+}
+
 netcdf = FileFormat(
     title="netCDF",
     gis_data_types=[GisDataType("raster")],
     parameters={},
 )
 
+netcdf_output = FileFormat(
+    title="netCDF",
+    gis_data_types=[GisDataType("raster")],
+    parameters={"piece_size": piece_size},
+)
+
+cog = FileFormat(
+    title="GTiff",
+    description="Cloud optimised GeoTIFF, one file per timestep.",
+    gis_data_types=[GisDataType("raster")],
+    parameters={
+        "dtype": {
+            "type": "string",
+            "description": "Data type of the bands, defaults to the data type of the result.",
+        },
+        "nodata": {
+            "type": "number",
+            "description": "Nodata value, defaults to the nodata value of the result.",
+        },
+        "compress": {
+            "type": "string",
+            "description": "GDAL compression of the tiles.",
+            "default": "DEFLATE",
+        },
+        "blocksize": {
+            "type": "integer",
+            "description": "Edge length of the internal tiles in pixels.",
+            "default": 512,
+        },
+        "overview_resampling": {
+            "type": "string",
+            "description": "Resampling method of the overviews.",
+            "default": "nearest",
+        },
+        "piece_size": piece_size,
+    },
+)
+
+zarr = FileFormat(
+    title="Zarr",
+    description="Zarr store with consolidated metadata.",
+    gis_data_types=[GisDataType("raster")],
+    parameters={},
+)
+
 input_formats = [gtif, netcdf]
-output_formats = [netcdf]
+output_formats = [netcdf_output, cog, zarr]
 
 links = []
 
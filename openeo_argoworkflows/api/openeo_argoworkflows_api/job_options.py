@@ -0,0 +1,110 @@
+import logging
+
+from pydantic import BaseModel, Extra, conint
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for the options a profile doesn't bound through its own MAX_* key.
+# Worker options default to the profile's own WORKER_* values, so without an
+# explicit MAX_* users can only scale down.
+DEFAULT_LIMITS = {
+    "MAX_CHUNK_SIZE": 4096,
+    "MAX_TILE_SIZE": 100000,
+    "MAX_PARALLEL_TILES": 1,
+    "MAX_EXECUTOR_MEMORY": None,
+}
+
+# job option -> key in the dask profile passed to the executor.
+PROFILE_OPTIONS = {
+    "worker_count": "WORKER_LIMIT",
+    "worker_memory": "WORKER_MEMORY",
+    "idle_timeout": "CLUSTER_IDLE_TIMEOUT",
+    "chunk_size": "CHUNK_SIZE",
+    "tile_size": "TILE_SIZE",
+    "max_parallel_tiles": "PARALLEL_TILES",
+}
+
+
+class JobOptions(BaseModel):
+    """Performance options a user can pass with a job.
+
+    They are merged over the dask profile selected for the job and clamped to
+    the MAX_* limits of the profile the user's roles allow.
+    """
+
+    worker_count: Optional[conint(ge=1)]
+    """Maximum number of dask workers."""
+    worker_memory: Optional[conint(ge=1)]
+    """Memory per dask worker, in GB."""
+    idle_timeout: Optional[conint(ge=60)]
+    """Seconds the dask cluster may idle before it is shut down."""
+    chunk_size: Optional[conint(ge=256)]
+    """Spatial chunk size of loaded data, in pixels."""
+    tile_size: Optional[conint(ge=1000)]
+    """Edge length of the tiles the job is split into, in metres."""
+    max_parallel_tiles: Optional[conint(ge=1)]
+    """Number of tiles processed at the same time."""
+    executor_memory: Optional[conint(ge=1)]
+    """Memory of the executor pod, in GiB."""
+    reuse_results: Optional[bool]
+    """Whether the results of an identical recent or running job may be reused."""
+
+    class Config:
+        extra = Extra.forbid
+
+
+def _limit(key: str, limits: dict) -> Optional[int]:
+    if f"MAX_{key}" in limits:
+        return limits[f"MAX_{key}"]
+    if key in ("WORKER_LIMIT", "WORKER_MEMORY", "CLUSTER_IDLE_TIMEOUT"):
+        return limits.get(key)
+    return DEFAULT_LIMITS.get(f"MAX_{key}")
+
+
+def apply_job_options(
+    job_options: Optional[dict],
+    dask_profile: dict,
+    executor_resources: dict,
+    limits: dict,
+) -> tuple[dict, dict]:
+    """Merge job options over the dask profile and executor resources.
+
+    Every option is clamped to its limit in limits (the profile of the user's
+    roles), and options without a limit are ignored. The MAX_* keys are
+    dropped from the returned dask profile.
+    """
+    dask_profile = {
+        key: value for key, value in dask_profile.items() if not key.startswith("MAX_")
+    }
+    executor_resources = dict(executor_resources)
+
+    if not job_options:
+        return dask_profile, executor_resources
+
+    options = JobOptions(**job_options)
+
+    for option, profile_key in PROFILE_OPTIONS.items():
+        value = getattr(options, option)
+        if value is None:
+            continue
+
+        limit = _limit(profile_key, limits)
+        if limit is None:
+            logger.info("Ignoring job option %s, it is not enabled.", option)
+            continue
+        if value > int(limit):
+            logger.info("Clamping job option %s=%s to %s.", option, value, limit)
+            value = int(limit)
+        dask_profile[profile_key] = value
+
+    if options.executor_memory is not None:
+        limit = _limit("EXECUTOR_MEMORY", limits)
+        if limit is None:
+            logger.info("Ignoring job option executor_memory, it is not enabled.")
+        else:
+            memory = f"{min(options.executor_memory, int(limit))}Gi"
+            executor_resources["MEMORY_REQUEST"] = memory
+            executor_resources["MEMORY_LIMIT"] = memory
+
+    return dask_profile, executor_resources
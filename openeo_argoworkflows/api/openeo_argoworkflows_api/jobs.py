@@ -31,6 +31,7 @@ from openeo_fastapi.client.jobs import JobsRegister
 from openeo_fastapi.client.auth import Authenticator, User
 
 from openeo_argoworkflows_api.auth import ExtendedAuthenticator
+from openeo_argoworkflows_api.job_options import JobOptions
 from openeo_argoworkflows_api.psql.models import ArgoJob
 from openeo_argoworkflows_api.tasks import queue_to_submit, submit_job
 
@@ -80,6 +81,12 @@ class UserWorkspace(BaseModel):
             return self.stac_directory / f"{self.job_id}_collection.json"
 
 
+class ExtendedJobsRequest(JobsRequest):
+
+    job_options: Optional[JobOptions]
+    """Performance options for the job, see JobOptions."""
+
+
 class ArgoJobsRegister(JobsRegister):
 
     def __init__(self, settings, links) -> None:
@@ -97,12 +104,12 @@ class ArgoJobsRegister(JobsRegister):
         )
 
     def create_job(
-        self, body: JobsRequest, user: User = Depends(Authenticator.validate)
+        self, body: ExtendedJobsRequest, user: User = Depends(Authenticator.validate)
     ):
         """Create a new BatchJob.
 
         Args:
-            body (JobsRequest): The Job Request that should be used to create the new BatchJob.
+            body (ExtendedJobsRequest): The Job Request that should be used to create the new BatchJob.
             user (User): The User returned from the Authenticator.
 
         Returns:
@@ -124,6 +131,9 @@ class ArgoJobsRegister(JobsRegister):
             description=body.description,
             user_id=user.user_id,
             created=datetime.datetime.now(),
+            job_options=(
+                body.job_options.dict(exclude_none=True) if body.job_options else None
+            ),
         )
 
         try:
@@ -212,20 +222,22 @@ class ArgoJobsRegister(JobsRegister):
                 detail="The job isn't running or queued and therefore could not be canceled",
             )
 
-        req = WorkflowStopRequest(
-            name=job.workflowname,
-            namespace=self.settings.ARGO_WORKFLOWS_NAMESPACE,
-        )
-
-        try:
-            self.workflows_service.stop_workflow(
-                name=job.workflowname, req=req, namespace=req.namespace
-            )
-        except NotFound:
-            logger.warning(
-                f"Could not stop workflow {job.workflowname} for job {job.job_id}."
+        # Jobs that joined a running job have no workflow of their own.
+        if job.workflowname:
+            req = WorkflowStopRequest(
+                name=job.workflowname,
+                namespace=self.settings.ARGO_WORKFLOWS_NAMESPACE,
             )
 
+            try:
+                self.workflows_service.stop_workflow(
+                    name=job.workflowname, req=req, namespace=req.namespace
+                )
+            except NotFound:
+                logger.warning(
+                    f"Could not stop workflow {job.workflowname} for job {job.job_id}."
+                )
+
         job.status = "created"
         engine.modify(modify_object=job)
         return Response(
@@ -239,6 +251,10 @@ class ArgoJobsRegister(JobsRegister):
         if not job:
             raise HTTPException(404, "Job not found.")
 
+        # Jobs that reused the results of another job show the logs of its run.
+        if job.result_of:
+            job = engine.get(get_model=ArgoJob, primary_key=job.result_of) or job
+
         if not job.workflowname:
             raise HTTPException(404, "No Job run found for this Job.")
 
@@ -306,7 +322,7 @@ class ArgoJobsRegister(JobsRegister):
         wspace = UserWorkspace(
             root_dir=self.settings.OPENEO_WORKSPACE_ROOT,
             user_id=str(user.user_id),
-            job_id=str(job.job_id),
+            job_id=str(job.result_of or job.job_id),
         )
 
         stac_collection = Collection.from_file(str(wspace.results_collection_json))
@@ -343,7 +359,7 @@ class ArgoJobsRegister(JobsRegister):
         for value in stac_collection.assets.values():
             file_name = value.href.split("/")[-1]
             relative_path = "/{job_id}/RESULTS/{file}".format(
-                user_id=user, job_id=job_id, file=file_name
+                user_id=user, job_id=job.result_of or job_id, file=file_name
             )
             path = "{prefix}/files{path}".format(
                 prefix=self.settings.OPENEO_PREFIX, path=relative_path
@@ -372,13 +388,13 @@ class ArgoJobsRegister(JobsRegister):
 
     def process_sync_job(
         self,
-        body: JobsRequest = JobsRequest(),
+        body: ExtendedJobsRequest = ExtendedJobsRequest(),
         user: User = Depends(Authenticator.validate),
     ):
         """Start the processing of a synchronous Job.
 
         Args:
-            body (JobsRequest): The Job Request that should be used to create the new BatchJob.
+            body (ExtendedJobsRequest): The Job Request that should be used to create the new BatchJob.
             user (User): The User returned from the Authenticator.
 
         Raises:
@@ -403,6 +419,9 @@ class ArgoJobsRegister(JobsRegister):
             user_id=user.user_id,
             created=datetime.datetime.now(),
             synchronous=True,
+            job_options=(
+                body.job_options.dict(exclude_none=True) if body.job_options else None
+            ),
         )
 
         engine.create(create_object=job)
@@ -430,17 +449,18 @@ class ArgoJobsRegister(JobsRegister):
         wspace = UserWorkspace(
             root_dir=self.settings.OPENEO_WORKSPACE_ROOT,
             user_id=str(user.user_id),
-            job_id=str(job.job_id),
+            job_id=str(job.result_of or job.job_id),
         )
 
-        files = [file for file in wspace.results_directory.glob(f"*") if file.is_file()]
+        # Zarr results are directories, they are returned in the tar archive.
+        files = list(wspace.results_directory.glob(f"*"))
 
         if len(files) == 0:
             raise HTTPException(
                 status_code=500,
                 detail=f"No files to return for request.",
             )
-        elif len(files) == 1:
+        elif len(files) == 1 and files[0].is_file():
 
             def single_file_iterator(file_path):
                 with open(file_path, "rb") as file:
@@ -0,0 +1,29 @@
+"""add-result-reuse-to-jobs
+
+Revision ID: 5b8e1c3d9f20
+Revises: 7c2d4e8f1a93
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = '5b8e1c3d9f20'
+down_revision: Union[str, None] = '7c2d4e8f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('result_hash', sa.VARCHAR(), nullable=True))
+    op.add_column('jobs', sa.Column('result_of', postgresql.UUID(), nullable=True))
+    op.create_index(op.f('ix_jobs_result_hash'), 'jobs', ['result_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_jobs_result_hash'), table_name='jobs')
+    op.drop_column('jobs', 'result_of')
+    op.drop_column('jobs', 'result_hash')
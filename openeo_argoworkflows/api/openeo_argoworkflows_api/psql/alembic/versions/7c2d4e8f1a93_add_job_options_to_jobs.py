@@ -0,0 +1,33 @@
+"""add-job-options-to-jobs
+
+Revision ID: 7c2d4e8f1a93
+Revises: 3a1f9e0d4b72
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = '7c2d4e8f1a93'
+down_revision: Union[str, None] = '3a1f9e0d4b72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'jobs',
+        sa.Column('job_options', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    )
+    op.add_column(
+        'jobs',
+        sa.Column('resources', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('jobs', 'resources')
+    op.drop_column('jobs', 'job_options')
@@ -1,3 +1,5 @@
+import uuid
+
 from typing import List, Optional
 from openeo_fastapi.client.auth import User
 from openeo_fastapi.client.jobs import Job
@@ -34,12 +36,36 @@ class ArgoJobORM(JobORM):
     workflowname = Column(VARCHAR, nullable=True)
     """The name of the argo workflow."""
 
+    job_options = Column(JSON, nullable=True)
+    """The job options requested by the user."""
+
+    resources = Column(JSON, nullable=True)
+    """The dask profile and executor resources the job was last submitted with."""
+
+    result_hash = Column(VARCHAR, nullable=True, index=True)
+    """Hash of the resolved process graph and the data versions it loads."""
+
+    result_of = Column(UUID(as_uuid=True), nullable=True)
+    """The job whose results this job reuses, if any."""
+
 
 class ArgoJob(Job):
 
     workflowname: Optional[str]
     """The name of the argo workflow."""
 
+    job_options: Optional[dict]
+    """The job options requested by the user."""
+
+    resources: Optional[dict]
+    """The dask profile and executor resources the job was last submitted with."""
+
+    result_hash: Optional[str]
+    """Hash of the resolved process graph and the data versions it loads."""
+
+    result_of: Optional[uuid.UUID]
+    """The job whose results this job reuses, if any."""
+
     @classmethod
     def get_orm(cls):
         return ArgoJobORM
@@ -0,0 +1,157 @@
+import datetime
+import hashlib
+import json
+import logging
+
+from typing import Any, Callable, Optional
+
+from openeo_fastapi.api.types import Status
+from openeo_fastapi.client.psql.engine import Filter, _list
+
+from openeo_argoworkflows_api.psql.models import ArgoJob
+from openeo_argoworkflows_api.workload import get_collection
+
+logger = logging.getLogger(__name__)
+
+# Node fields that don't change what a node computes.
+IGNORED_NODE_FIELDS = {"description"}
+
+# Collection fields that change when a collection's data changes.
+VERSION_FIELDS = ("version", "updated")
+
+
+def _references(value: Any) -> set:
+    if isinstance(value, dict):
+        if "from_node" in value:
+            return {value["from_node"]}
+        if "process_graph" in value:
+            return set()
+        return set().union(*(_references(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_references(v) for v in value))
+    return set()
+
+
+def _canonical_value(value: Any, node_hashes: dict) -> Any:
+    if isinstance(value, dict):
+        if "from_node" in value:
+            return {"from_node": node_hashes[value["from_node"]]}
+        if "process_graph" in value:
+            return {
+                **{k: v for k, v in value.items() if k != "process_graph"},
+                "process_graph": canonical_process_graph(value["process_graph"]),
+            }
+        return {k: _canonical_value(v, node_hashes) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_canonical_value(v, node_hashes) for v in value]
+    return value
+
+
+def _digest(value: Any) -> str:
+    serialised = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialised.encode()).hexdigest()
+
+
+def canonical_process_graph(process_graph: dict) -> list:
+    """A process graph without its node ids, as a sorted list of node hashes.
+
+    Every node is hashed from its process and arguments, with references to
+    other nodes replaced by their hashes, so graphs that only differ in how
+    their nodes are named (or described) are equal.
+    """
+    node_hashes: dict[str, str] = {}
+
+    def visit(node_id: str, path: tuple) -> str:
+        if node_id in node_hashes:
+            return node_hashes[node_id]
+        if node_id in path:
+            raise ValueError(f"The process graph has a cycle through {node_id}.")
+
+        node = process_graph[node_id]
+        for reference in _references(node.get("arguments", {})):
+            visit(reference, path + (node_id,))
+
+        node_hashes[node_id] = _digest(
+            {
+                key: _canonical_value(value, node_hashes)
+                for key, value in node.items()
+                if key not in IGNORED_NODE_FIELDS
+            }
+        )
+        return node_hashes[node_id]
+
+    return sorted(visit(node_id, ()) for node_id in process_graph)
+
+
+def collection_versions(process_graph: dict) -> dict:
+    """The data version of every collection a process graph loads.
+
+    Taken from the collection's version and updated fields and its temporal
+    extent, None for collections that can't be fetched.
+    """
+    versions = {}
+    for node in process_graph.values():
+        if node.get("process_id") != "load_collection":
+            continue
+        collection_id = node.get("arguments", {}).get("id")
+        if not isinstance(collection_id, str) or collection_id in versions:
+            continue
+
+        collection = get_collection(collection_id)
+        if collection is None:
+            versions[collection_id] = None
+            continue
+        versions[collection_id] = {
+            **{field: collection.get(field) for field in VERSION_FIELDS},
+            "temporal": collection.get("extent", {}).get("temporal"),
+        }
+    return versions
+
+
+def result_hash(process_graph: dict) -> str:
+    """Hash of a UDP-resolved process graph and the data it loads."""
+    return _digest(
+        {
+            "process_graph": canonical_process_graph(process_graph),
+            "collections": collection_versions(process_graph),
+        }
+    )
+
+
+def find_reusable_job(
+    job: ArgoJob,
+    job_hash: str,
+    window: int,
+    results_exist: Callable[[ArgoJob], bool],
+) -> Optional[ArgoJob]:
+    """A job of the same user whose results job can reuse.
+
+    Only jobs created within the last window seconds count. The most recent
+    finished job whose results still exist wins, otherwise a job that is
+    running the same graph right now, which job can join.
+    """
+    created_after = datetime.datetime.now() - datetime.timedelta(seconds=window)
+    candidates = sorted(
+        (
+            candidate
+            for candidate in _list(
+                list_model=ArgoJob,
+                filter_with=Filter(column_name="result_hash", value=job_hash),
+            )
+            if candidate.job_id != job.job_id
+            and candidate.user_id == job.user_id
+            and candidate.created >= created_after
+        ),
+        key=lambda candidate: candidate.created,
+        reverse=True,
+    )
+
+    for candidate in candidates:
+        if candidate.status == Status.finished and results_exist(candidate):
+            return candidate
+
+    for candidate in candidates:
+        # Joined jobs run nothing themselves, join the job they wait for.
+        if candidate.status == Status.running and candidate.result_of is None:
+            return candidate
+    return None
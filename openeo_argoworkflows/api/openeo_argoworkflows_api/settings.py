@@ -20,12 +20,61 @@ class ExtendedAppSettings(AppSettings):
     # one: without it the scheduler can place the executor on a small node, and
     # the data reads — computed locally on the executor, not on the dask workers —
     # get node-OOM-killed under memory pressure. The request reserves RAM / forces
-    # a roomy node; the limit is the hard ceiling.
+    # a roomy node; the limit is the hard ceiling. Profiles with DISTRIBUTED_IO
+    # also move the search, download and opening of dedl products onto a
+    # worker.
     OPENEO_EXECUTOR_CPU_REQUEST: str = "1"
     OPENEO_EXECUTOR_CPU_LIMIT: str = "4"
     OPENEO_EXECUTOR_MEMORY_REQUEST: str = "8Gi"
     OPENEO_EXECUTOR_MEMORY_LIMIT: str = "16Gi"
 
+    # Optional size tiers for the executor pod, as a JSON object of tier name ->
+    # {"MAX_BYTES", "CPU_REQUEST", "CPU_LIMIT", "MEMORY_REQUEST", "MEMORY_LIMIT",
+    # "NODE_SELECTOR"}. A job runs on the smallest tier whose MAX_BYTES (null for
+    # unbounded) holds its estimated data volume, instead of the worst-case size
+    # above, so small jobs pack densely onto nodes. Missing keys fall back to the
+    # OPENEO_EXECUTOR_* settings. The role mapping (role -> tier name, with an
+    # optional "default") caps the tier a user can get.
+    OPENEO_EXECUTOR_RESOURCE_TIERS: Optional[str] = None
+    OPENEO_EXECUTOR_ROLE_TIER_MAPPING: Optional[str] = None
+
+    # Number of times Argo retries an executor pod that failed for a transient
+    # reason, an OOM kill or an Argo error such as an evicted pod. Failures of
+    # the process graph itself aren't retried. Completed tiles are checkpointed
+    # in the job workspace and skipped on retry. Defaults to one retry, 0
+    # disables retries.
+    OPENEO_EXECUTOR_RETRY_LIMIT: int = 1
+
+    # Jobs whose resolved process graph and collection versions match a job of
+    # the same user created within the window (in seconds) reuse its results:
+    # a finished job is served by reference, a running one is joined instead of
+    # launching a duplicate workflow. Off by default, as a reused job has no
+    # workflow or results directory of its own. Users opt out per job with the
+    # reuse_results job option, or for all their jobs through the opt-out role.
+    # Jobs stop waiting for a joined job after the join timeout (in seconds) and
+    # run on their own.
+    OPENEO_RESULT_REUSE: bool = False
+    OPENEO_RESULT_REUSE_WINDOW: int = 3600
+    OPENEO_RESULT_REUSE_JOIN_TIMEOUT: int = 6 * 3600
+    OPENEO_RESULT_REUSE_OPT_OUT_ROLE: Optional[str] = None
+
+    # Optional cache of loaded data cubes shared by all jobs, enabled by its
+    # size in GB. Cubes are stored as Zarr under OPENEO_WORKSPACE_ROOT/.cache,
+    # or at OPENEO_CUBE_CACHE_URL (e.g. an s3:// URL), and evicted after
+    # OPENEO_CUBE_CACHE_MAX_AGE seconds or least recently used first. A local
+    # cache is only used by profiles that run on the executor pod or have
+    # DISTRIBUTED_IO, as the dask workers must mount it.
+    OPENEO_CUBE_CACHE_MAX_GB: Optional[float] = None
+    OPENEO_CUBE_CACHE_MAX_AGE: int = 7 * 24 * 3600
+    OPENEO_CUBE_CACHE_URL: Optional[str] = None
+
+    # Size in GB of a download cache shared by the jobs of all users, under
+    # OPENEO_WORKSPACE_ROOT/.cache. Products the dedl loader downloaded are kept
+    # there for later jobs, least recently used ones are evicted once no running
+    # job may read them. Without it, every job's downloads are removed when it
+    # ends.
+    OPENEO_DOWNLOAD_CACHE_MAX_GB: Optional[float] = None
+
     STAC_API_USERNAME: Optional[SecretStr] = None
     STAC_API_PASSWORD: Optional[SecretStr] = None
 
@@ -65,9 +114,28 @@ class ExtendedAppSettings(AppSettings):
     DASK_WORKER_LIMIT: str = "6"
     DASK_CLUSTER_IDLE_TIMEOUT: str = "3600"
 
+    # JSON mapping of profile name to cluster settings (WORKER_CORES, WORKER_MEMORY,
+    # WORKER_LIMIT, ...). A profile can keep a warm pool of reusable clusters via
+    # WARM_POOL_SIZE, WARM_POOL_IDLE_TIMEOUT, WARM_POOL_ISOLATION ("user" or
+    # "shared") and WARM_POOL_RESTART_WORKERS. The MAX_* keys (MAX_WORKER_LIMIT,
+    # MAX_WORKER_MEMORY, MAX_CLUSTER_IDLE_TIMEOUT, MAX_CHUNK_SIZE, MAX_TILE_SIZE,
+    # MAX_PARALLEL_TILES, MAX_EXECUTOR_MEMORY) bound the job options of users
+    # whose roles map to the profile. DISTRIBUTED_IO runs the dedl loader on a
+    # dask worker instead of the executor pod and allows a local cube cache; the
+    # workers must mount the workspace at OPENEO_MOUNT_PATH too, so it can't be
+    # combined with a warm pool, whose clusters keep the mounts of the job that
+    # created them.
     DASK_PROFILES: Optional[str] = None
     DASK_ROLE_PROFILE_MAPPING: Optional[str] = None
 
+    # Pick the smallest profile whose cluster memory (WORKER_MEMORY x WORKER_LIMIT)
+    # holds the estimated job data volume times the factor below, capped by the
+    # profile of the user's role. The revisit is used to count timesteps for
+    # collections that publish no temporal step.
+    DASK_WORKLOAD_AWARE_PROFILES: bool = False
+    DASK_WORKLOAD_MEMORY_FACTOR: float = 2.0
+    DASK_WORKLOAD_REVISIT_DAYS: float = 5.0
+
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
 
@@ -1,24 +1,32 @@
 from copy import deepcopy
+import functools
 import json
 import logging
 
-from datetime import timedelta
+from datetime import datetime, timedelta
+from pathlib import Path
 from hera.workflows import WorkflowsService
 from openeo_fastapi.api.types import Status
 from redis import Redis
 from rq import Queue
-from typing import Any
+from typing import Any, Optional
 
 from openeo_fastapi.client.psql import engine
 from openeo_fastapi.client.psql.engine import modify, get
+from openeo_argoworkflows_api.job_options import apply_job_options
 from openeo_argoworkflows_api.psql.models import ArgoJob, ExtendedUser
+from openeo_argoworkflows_api.result_reuse import find_reusable_job, result_hash
 from openeo_argoworkflows_api.workflows import executor_workflow
+from openeo_argoworkflows_api.workload import estimate_job_bytes
 from openeo_argoworkflows_api.settings import ExtendedAppSettings
 
 logger = logging.getLogger(__name__)
 
 settings = ExtendedAppSettings()
 
+# Seconds the lock that makes identical jobs run only once is held at most.
+RESULT_REUSE_LOCK_TIMEOUT = 300
+
 
 def _select_dask_profile(
     user_roles: list,
@@ -49,17 +57,120 @@ def _select_dask_profile(
     return base_profile
 
 
-def _resolve_udps(process_graph: dict, user_id) -> dict:
+def _profile_capacity(profile: dict) -> float:
+    """Total worker memory of a profile, in bytes."""
+    return float(profile["WORKER_MEMORY"]) * float(profile["WORKER_LIMIT"]) * 2**30
+
+
+def _select_workload_profile(
+    estimated_bytes: Optional[int],
+    max_profile: dict,
+    profiles: dict,
+    base_profile: dict,
+    memory_factor: float = 2.0,
+) -> dict:
+    """Return the smallest profile that fits the estimated job data volume.
+
+    Only profiles no bigger than max_profile (the one chosen for the user's
+    roles) are considered, and max_profile is returned when none fits or no
+    estimate is available.
+    """
+    if estimated_bytes is None:
+        return max_profile
+
+    max_capacity = _profile_capacity(max_profile)
+    candidates = sorted(
+        (
+            candidate
+            for candidate in (
+                {**base_profile, **profile} for profile in profiles.values()
+            )
+            if _profile_capacity(candidate) <= max_capacity
+        ),
+        key=lambda candidate: (
+            _profile_capacity(candidate),
+            float(candidate["WORKER_CORES"]),
+        ),
+    )
+
+    for candidate in candidates:
+        if estimated_bytes * memory_factor <= _profile_capacity(candidate):
+            return candidate
+    return max_profile
+
+
+def _select_executor_resources(
+    estimated_bytes: Optional[int],
+    user_roles: list,
+    tiers: dict,
+    role_mapping: dict,
+    base_resources: dict,
+) -> dict:
+    """Return the executor pod resources for a job of the given size.
+
+    Tiers are ordered by MAX_BYTES (unbounded last) and the smallest one that
+    holds estimated_bytes is merged over base_resources. The first of
+    user_roles found in role_mapping (or its "default") names the largest
+    tier the user may get, which is also used when there is no estimate.
+    """
+    ordered = sorted(
+        tiers.items(),
+        key=lambda item: (
+            item[1].get("MAX_BYTES") is None,
+            item[1].get("MAX_BYTES") or 0,
+        ),
+    )
+
+    ceiling = next(
+        (role_mapping[role] for role in user_roles if role in role_mapping),
+        role_mapping.get("default"),
+    )
+    names = [name for name, _ in ordered]
+    if ceiling in names:
+        ordered = ordered[: names.index(ceiling) + 1]
+
+    if not ordered:
+        return base_resources
+
+    selected = ordered[-1][1]
+    if estimated_bytes is not None:
+        for _, tier in ordered:
+            if tier.get("MAX_BYTES") is None or estimated_bytes <= tier["MAX_BYTES"]:
+                selected = tier
+                break
+
+    return {
+        **base_resources,
+        **{key: value for key, value in selected.items() if key != "MAX_BYTES"},
+    }
+
+
+def _get_user_roles(job: ArgoJob) -> list:
+    user = engine.get(get_model=ExtendedUser, primary_key=job.user_id)
+    return (user.roles or []) if user else []
+
+
+@functools.lru_cache(maxsize=None)
+def _predefined_processes() -> dict:
+    """Spec-only processes for every predefined process, built once per worker."""
     import openeo_processes_dask_slim.specs
-    from openeo_pg_parser_networkx import Process as pgProcess, ProcessRegistry
+    from openeo_pg_parser_networkx import Process as pgProcess
+
+    return {
+        pid: pgProcess(getattr(openeo_processes_dask_slim.specs, pid))
+        for pid in openeo_processes_dask_slim.specs.__all__
+    }
+
+
+def _resolve_udps(process_graph: dict, user_id) -> dict:
+    from openeo_pg_parser_networkx import ProcessRegistry
     from openeo_pg_parser_networkx.resolving_utils import resolve_process_graph
     from openeo_fastapi.client.processes import UserDefinedProcessGraph
 
+    # resolve_process_graph registers the UDPs it resolves, so every submission
+    # gets a fresh registry over the shared, prebuilt predefined processes.
     process_registry = ProcessRegistry()
-    for pid in openeo_processes_dask_slim.specs.__all__:
-        process_registry[("predefined", pid)] = pgProcess(
-            getattr(openeo_processes_dask_slim.specs, pid)
-        )
+    process_registry[("predefined", None)] = _predefined_processes()
 
     def get_udp_spec(process_id: str, namespace: str) -> dict:
         udp = get(
@@ -75,6 +186,30 @@ def _resolve_udps(process_graph: dict, user_id) -> dict:
     )
 
 
+def _results_directory(job: ArgoJob) -> Path:
+    """The results directory of a job, that of the job it reuses if any."""
+    return (
+        settings.OPENEO_WORKSPACE_ROOT
+        / str(job.user_id)
+        / str(job.result_of or job.job_id)
+        / "RESULTS"
+    )
+
+
+def _results_exist(job: ArgoJob) -> bool:
+    results_directory = _results_directory(job)
+    return results_directory.is_dir() and any(results_directory.iterdir())
+
+
+def _reuses_results(job: ArgoJob) -> bool:
+    if not settings.OPENEO_RESULT_REUSE:
+        return False
+    if (job.job_options or {}).get("reuse_results") is False:
+        return False
+    opt_out_role = settings.OPENEO_RESULT_REUSE_OPT_OUT_ROLE
+    return not (opt_out_role and opt_out_role in _get_user_roles(job))
+
+
 q = Queue(connection=Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT))
 
 
@@ -103,14 +238,44 @@ def queue_to_submit(job: ArgoJob):
         return q.enqueue(submit_job, job)
 
 
-def submit_job(job: ArgoJob):
-    """Submit the job to argo."""
-    argo = WorkflowsService(
-        host=settings.ARGO_WORKFLOWS_SERVER,
-        verify_ssl=False,
-        namespace=settings.ARGO_WORKFLOWS_NAMESPACE,
-        token=settings.ARGO_WORKFLOWS_TOKEN.get_secret_value(),
+def _reuse_job(job: ArgoJob, source: ArgoJob):
+    """Serve the results of source for job, or wait for source to finish."""
+    job.result_of = source.result_of or source.job_id
+    if source.status == Status.finished:
+        logger.info("Job %s reuses the results of job %s.", job.job_id, job.result_of)
+        job.status = Status.finished
+        modify(job)
+        return None
+
+    logger.info("Job %s joins the running job %s.", job.job_id, job.result_of)
+    job.status = Status.running
+    modify(job)
+    deadline = datetime.now() + timedelta(
+        seconds=settings.OPENEO_RESULT_REUSE_JOIN_TIMEOUT
     )
+    return q.enqueue(poll_joined_job, job, deadline)
+
+
+def _executor_workflow(argo: WorkflowsService, job: ArgoJob, process_graph: dict):
+    """The executor workflow of a job, with the resources it is given."""
+    # The estimate fetches collection metadata, only when something uses it.
+    workload_aware_profiles = bool(
+        settings.DASK_GATEWAY_SERVER
+        and settings.OPENEO_EXECUTOR_IMAGE
+        and settings.DASK_PROFILES
+        and settings.DASK_ROLE_PROFILE_MAPPING
+        and settings.DASK_WORKLOAD_AWARE_PROFILES
+    )
+    estimated_bytes = None
+    if workload_aware_profiles or settings.OPENEO_EXECUTOR_RESOURCE_TIERS:
+        estimated_bytes = estimate_job_bytes(process_graph)
+        logger.info("Job %s loads an estimated %s bytes.", job.job_id, estimated_bytes)
+
+    user_roles = None
+    if (settings.DASK_PROFILES and settings.DASK_ROLE_PROFILE_MAPPING) or (
+        settings.OPENEO_EXECUTOR_RESOURCE_TIERS
+    ):
+        user_roles = _get_user_roles(job)
 
     if settings.DASK_GATEWAY_SERVER and settings.OPENEO_EXECUTOR_IMAGE:
         base_profile = {
@@ -120,26 +285,45 @@ def submit_job(job: ArgoJob):
             "WORKER_MEMORY": settings.DASK_WORKER_MEMORY,
             "WORKER_LIMIT": settings.DASK_WORKER_LIMIT,
             "CLUSTER_IDLE_TIMEOUT": settings.DASK_CLUSTER_IDLE_TIMEOUT,
+            # Warm pools are enabled per profile through WARM_POOL_SIZE and the
+            # other WARM_POOL_* keys in DASK_PROFILES.
+            "WARM_POOL_PATH": str(settings.OPENEO_WORKSPACE_ROOT / ".dask_warm_pool"),
         }
         if settings.DASK_PROFILES and settings.DASK_ROLE_PROFILE_MAPPING:
-            user = engine.get(get_model=ExtendedUser, primary_key=job.user_id)
-            user_roles = (user.roles or []) if user else []
             logger.debug(
                 "Selecting dask profile for job %s: user=%s roles=%s",
                 job.job_id,
                 job.user_id,
                 user_roles,
             )
+            profiles = json.loads(settings.DASK_PROFILES)
             dask_profile = _select_dask_profile(
                 user_roles,
                 json.loads(settings.DASK_ROLE_PROFILE_MAPPING),
-                json.loads(settings.DASK_PROFILES),
+                profiles,
                 base_profile,
             )
+            # The profile of the user's roles bounds the workload selection
+            # and the job options.
+            limits = dask_profile
+            if workload_aware_profiles:
+                dask_profile = _select_workload_profile(
+                    estimated_bytes,
+                    dask_profile,
+                    profiles,
+                    base_profile,
+                    settings.DASK_WORKLOAD_MEMORY_FACTOR,
+                )
+                logger.info(
+                    "Job %s uses %s workers with %sGB.",
+                    job.job_id,
+                    dask_profile["WORKER_LIMIT"],
+                    dask_profile["WORKER_MEMORY"],
+                )
         else:
-            dask_profile = base_profile
+            dask_profile = limits = base_profile
     else:
-        dask_profile = {"LOCAL": True}
+        dask_profile = limits = {"LOCAL": True}
 
     user_profile = {
         "OPENEO_JOB_ID": str(job.job_id),
@@ -149,11 +333,81 @@ def submit_job(job: ArgoJob):
         ),
     }
 
-    process_graph = _resolve_udps(deepcopy(job.process.process_graph), job.user_id)
+    # Without tiers the executor_workflow falls back to the OPENEO_EXECUTOR_* settings.
+    executor_resources = {}
+    if settings.OPENEO_EXECUTOR_RESOURCE_TIERS:
+        executor_resources = _select_executor_resources(
+            estimated_bytes,
+            user_roles,
+            json.loads(settings.OPENEO_EXECUTOR_RESOURCE_TIERS),
+            json.loads(settings.OPENEO_EXECUTOR_ROLE_TIER_MAPPING or "{}"),
+            executor_resources,
+        )
+
+    dask_profile, executor_resources = apply_job_options(
+        job.job_options, dask_profile, executor_resources, limits
+    )
+    logger.info(
+        "Job %s dask profile: %s, executor resources: %s",
+        job.job_id,
+        dask_profile,
+        executor_resources,
+    )
+    job.resources = {
+        "dask_profile": dask_profile,
+        "executor_resources": executor_resources,
+    }
+
+    return executor_workflow(
+        argo, process_graph, dask_profile, user_profile, executor_resources
+    )
+
 
-    workflow = executor_workflow(argo, process_graph, dask_profile, user_profile)
 
-    response = workflow.create()
+def submit_job(job: ArgoJob, reuse_results: bool = True):
+    """Submit the job to argo.
+
+    Unless reuse_results is False or the job opts out, a job identical to a
+    recent or running job of the same user reuses that job's results instead.
+    """
+    argo = WorkflowsService(
+        host=settings.ARGO_WORKFLOWS_SERVER,
+        verify_ssl=False,
+        namespace=settings.ARGO_WORKFLOWS_NAMESPACE,
+        token=settings.ARGO_WORKFLOWS_TOKEN.get_secret_value(),
+    )
+
+    process_graph = _resolve_udps(deepcopy(job.process.process_graph), job.user_id)
+
+    job.result_of = None
+    job.result_hash = None
+    if reuse_results and _reuses_results(job):
+        job.result_hash = result_hash(process_graph)
+        # Held until the job is marked running, so of identical jobs submitted
+        # at the same time only one runs and the others join it.
+        with q.connection.lock(
+            f"openeo:result_hash:{job.result_hash}", timeout=RESULT_REUSE_LOCK_TIMEOUT
+        ):
+            source = find_reusable_job(
+                job,
+                job.result_hash,
+                settings.OPENEO_RESULT_REUSE_WINDOW,
+                _results_exist,
+            )
+            if source is None:
+                job.status = Status.running
+                modify(job)
+        if source is not None:
+            return _reuse_job(job, source)
+
+    try:
+        workflow = _executor_workflow(argo, job, process_graph)
+        response = workflow.create()
+    except Exception:
+        # Jobs that joined this one stop waiting for it.
+        job.status = Status.error
+        modify(job)
+        raise
 
     job.status = Status.running
     job.workflowname = response.metadata.name
@@ -181,3 +435,30 @@ def poll_job_status(job: ArgoJob, metadata: Any):
         modify(job)
     else:
         return q.enqueue_in(timedelta(seconds=15), poll_job_status, job, metadata)
+
+
+def poll_joined_job(job: ArgoJob, deadline: datetime):
+    """Follow the job a job joined, until it has finished or deadline passed."""
+    job = get(get_model=ArgoJob, primary_key=job.job_id)
+    if job is None or job.status != Status.running:
+        # The job was stopped.
+        return None
+
+    source = get(get_model=ArgoJob, primary_key=job.result_of)
+    if source is not None and source.status in (Status.finished, Status.error):
+        job.status = source.status
+        modify(job)
+    elif source is None or source.status not in (Status.queued, Status.running):
+        logger.info(
+            "Job %s was stopped, job %s runs on its own.", job.result_of, job.job_id
+        )
+        return q.enqueue(submit_job, job, reuse_results=False)
+    elif datetime.now() >= deadline:
+        logger.info(
+            "Job %s is still running, job %s stops waiting and runs on its own.",
+            job.result_of,
+            job.job_id,
+        )
+        return q.enqueue(submit_job, job, reuse_results=False)
+    else:
+        return q.enqueue_in(timedelta(seconds=15), poll_joined_job, job, deadline)
@@ -1,5 +1,6 @@
 import json
 
+from typing import Optional
 from pydantic import SecretStr
 
 from hera.workflows import Steps, Workflow, WorkflowsService, Step, Env
@@ -9,6 +10,7 @@ from hera.workflows.models import (
     Metadata,
     PersistentVolumeClaimVolumeSource,
     ResourceRequirements,
+    RetryStrategy,
     Volume,
     VolumeMount,
     SecurityContext,
@@ -17,12 +19,20 @@ from hera.workflows.models import (
 
 from openeo_argoworkflows_api.settings import ExtendedAppSettings
 
+# Only transient executor failures are retried: Argo errors (e.g. the pod was
+# evicted or its node went away) and OOM kills (exit code 137). A failing
+# process graph exits with 1 and would fail the same way again.
+EXECUTOR_RETRY_EXPRESSION = (
+    "lastRetry.status == 'Error' or asInt(lastRetry.exitCode) == 137"
+)
+
 
 def executor_workflow(
     service: WorkflowsService,
     process_graph: dict,
     dask_profile: dict,
     user_profile: dict,
+    executor_resources: Optional[dict] = None,
 ):
     user_profile_as_json = json.dumps(user_profile)
     dask_profile_as_json = json.dumps(dask_profile)
@@ -30,7 +40,20 @@ def executor_workflow(
 
     settings = ExtendedAppSettings()
 
-    executor_env = [Env(name="STAC_API_URL", value=str(settings.STAC_API_URL))]
+    executor_resources = {
+        "CPU_REQUEST": settings.OPENEO_EXECUTOR_CPU_REQUEST,
+        "CPU_LIMIT": settings.OPENEO_EXECUTOR_CPU_LIMIT,
+        "MEMORY_REQUEST": settings.OPENEO_EXECUTOR_MEMORY_REQUEST,
+        "MEMORY_LIMIT": settings.OPENEO_EXECUTOR_MEMORY_LIMIT,
+        **(executor_resources or {}),
+    }
+
+    executor_env = [
+        Env(name="STAC_API_URL", value=str(settings.STAC_API_URL)),
+        # Identifies this run of the job. Argo retries of the executor pod share
+        # it and resume from its tile checkpoints, a restarted job gets a new one.
+        Env(name="OPENEO_RUN_ID", value="{{workflow.uid}}"),
+    ]
     if settings.STAC_API_USERNAME and settings.STAC_API_PASSWORD:
         executor_env.extend(
             [
@@ -45,6 +68,41 @@ def executor_workflow(
             ]
         )
 
+    # Caches shared by the executors of all jobs (e.g. collection metadata).
+    if settings.OPENEO_WORKSPACE_ROOT:
+        executor_env.append(
+            Env(
+                name="OPENEO_CACHE_ROOT",
+                value=str(settings.OPENEO_WORKSPACE_ROOT / ".cache"),
+            )
+        )
+
+    if settings.OPENEO_DOWNLOAD_CACHE_MAX_GB:
+        executor_env.append(
+            Env(
+                name="OPENEO_DOWNLOAD_CACHE_MAX_GB",
+                value=str(settings.OPENEO_DOWNLOAD_CACHE_MAX_GB),
+            )
+        )
+
+    if settings.OPENEO_CUBE_CACHE_MAX_GB:
+        executor_env.extend(
+            [
+                Env(
+                    name="OPENEO_CUBE_CACHE_MAX_GB",
+                    value=str(settings.OPENEO_CUBE_CACHE_MAX_GB),
+                ),
+                Env(
+                    name="OPENEO_CUBE_CACHE_MAX_AGE",
+                    value=str(settings.OPENEO_CUBE_CACHE_MAX_AGE),
+                ),
+            ]
+        )
+        if settings.OPENEO_CUBE_CACHE_URL:
+            executor_env.append(
+                Env(name="OPENEO_CUBE_CACHE_URL", value=settings.OPENEO_CUBE_CACHE_URL)
+            )
+
     # Icechunk-store (S3) access + EODAG/DEDL credentials, passed through to the
     # executor with the exact env var names that boto3, EODAG and icechunk read.
     executor_passthrough_env = {
@@ -93,18 +151,27 @@ def executor_workflow(
                 name="process-graph",
                 template=Template(
                     name="executor",
+                    # The executor checkpoints each completed tile of the run
+                    # in the job workspace, so a retry (e.g. after an OOM kill)
+                    # only recomputes the tiles that hadn't finished yet.
+                    node_selector=executor_resources.get("NODE_SELECTOR"),
+                    retry_strategy=RetryStrategy(
+                        limit=str(settings.OPENEO_EXECUTOR_RETRY_LIMIT),
+                        retry_policy="Always",
+                        expression=EXECUTOR_RETRY_EXPRESSION,
+                    ),
                     container=Container(
                         env=executor_env,
                         image=settings.OPENEO_EXECUTOR_IMAGE,
                         image_pull_policy=settings.OPENEO_EXECUTOR_IMAGE_PULL_POLICY,
                         resources=ResourceRequirements(
                             requests={
-                                "cpu": settings.OPENEO_EXECUTOR_CPU_REQUEST,
-                                "memory": settings.OPENEO_EXECUTOR_MEMORY_REQUEST,
+                                "cpu": executor_resources["CPU_REQUEST"],
+                                "memory": executor_resources["MEMORY_REQUEST"],
                             },
                             limits={
-                                "cpu": settings.OPENEO_EXECUTOR_CPU_LIMIT,
-                                "memory": settings.OPENEO_EXECUTOR_MEMORY_LIMIT,
+                                "cpu": executor_resources["CPU_LIMIT"],
+                                "memory": executor_resources["MEMORY_LIMIT"],
                             },
                         ),
                         command=["openeo_executor"],
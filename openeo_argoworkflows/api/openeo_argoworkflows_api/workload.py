@@ -0,0 +1,208 @@
+import datetime
+import logging
+import math
+import re
+import requests
+import time
+
+from typing import Optional
+
+from openeo_argoworkflows_api.settings import ExtendedAppSettings
+
+logger = logging.getLogger(__name__)
+
+settings = ExtendedAppSettings()
+
+# Metres per degree of latitude, and of longitude at the equator.
+METRES_PER_DEGREE = 111_320
+
+DEFAULT_RESOLUTION_METRES = 10
+DEFAULT_DTYPE_BYTES = 4
+
+DTYPE_BYTES = {
+    "int8": 1,
+    "uint8": 1,
+    "int16": 2,
+    "uint16": 2,
+    "int32": 4,
+    "uint32": 4,
+    "int64": 8,
+    "uint64": 8,
+    "float16": 2,
+    "float32": 4,
+    "float64": 8,
+    "cint16": 4,
+    "cint32": 8,
+    "cfloat32": 8,
+    "cfloat64": 16,
+}
+
+COLLECTION_CACHE_TTL = 300
+
+_collection_cache: dict[str, tuple[float, Optional[dict]]] = {}
+
+
+def get_collection(collection_id: str) -> Optional[dict]:
+    """Fetch a collection document from the STAC API, cached for a few minutes."""
+    now = time.monotonic()
+    cached = _collection_cache.get(collection_id)
+    if cached and now - cached[0] < COLLECTION_CACHE_TTL:
+        return cached[1]
+
+    auth = None
+    if settings.STAC_API_USERNAME and settings.STAC_API_PASSWORD:
+        auth = (
+            settings.STAC_API_USERNAME.get_secret_value(),
+            settings.STAC_API_PASSWORD.get_secret_value(),
+        )
+
+    collection = None
+    try:
+        resp = requests.get(
+            str(settings.STAC_API_URL).rstrip("/") + f"/collections/{collection_id}",
+            auth=auth,
+            timeout=10,
+        )
+        if resp.status_code == 200:
+            collection = resp.json()
+        else:
+            logger.warning(
+                "Could not fetch collection %s: [%s]", collection_id, resp.status_code
+            )
+    except requests.RequestException:
+        logger.warning("Could not fetch collection %s", collection_id, exc_info=True)
+
+    _collection_cache[collection_id] = (now, collection)
+    return collection
+
+
+def _extent_metres(spatial_extent: dict) -> Optional[tuple[float, float]]:
+    """Width and height of a bounding box in metres."""
+    try:
+        west, east = float(spatial_extent["west"]), float(spatial_extent["east"])
+        south, north = float(spatial_extent["south"]), float(spatial_extent["north"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    crs = spatial_extent.get("crs")
+    if crs in (None, 4326, "4326", "EPSG:4326"):
+        mid_latitude = math.radians((north + south) / 2)
+        return (
+            abs(east - west) * METRES_PER_DEGREE * math.cos(mid_latitude),
+            abs(north - south) * METRES_PER_DEGREE,
+        )
+    return abs(east - west), abs(north - south)
+
+
+def _resolution_metres(collection: dict) -> float:
+    summaries = collection.get("summaries", {})
+
+    gsd = summaries.get("gsd")
+    if isinstance(gsd, list) and gsd:
+        return float(min(gsd))
+
+    x_dimension = collection.get("cube:dimensions", {}).get("x", {})
+    if "step" in x_dimension:
+        step = abs(float(x_dimension["step"]))
+        # Steps below a metre are degrees.
+        return step * METRES_PER_DEGREE if step < 1 else step
+
+    return DEFAULT_RESOLUTION_METRES
+
+
+def _band_count(collection: dict, bands: Optional[list]) -> int:
+    if bands:
+        return len(bands)
+
+    summaries = collection.get("summaries", {})
+    for key in ("eo:bands", "bands", "raster:bands"):
+        if isinstance(summaries.get(key), list) and summaries[key]:
+            return len(summaries[key])
+
+    band_values = (
+        collection.get("cube:dimensions", {}).get("bands", {}).get("values", [])
+    )
+    return len(band_values) or 1
+
+
+def _dtype_bytes(collection: dict) -> int:
+    raster_bands = collection.get("summaries", {}).get("raster:bands", [])
+    sizes = [
+        DTYPE_BYTES[band["data_type"]]
+        for band in raster_bands
+        if isinstance(band, dict) and band.get("data_type") in DTYPE_BYTES
+    ]
+    return max(sizes) if sizes else DEFAULT_DTYPE_BYTES
+
+
+def _parse_datetime(value: str) -> datetime.datetime:
+    parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed.replace(tzinfo=None)
+
+
+def _timestep_count(collection: dict, temporal_extent: Optional[list]) -> int:
+    if not temporal_extent or len(temporal_extent) != 2:
+        return 1
+
+    interval = collection.get("extent", {}).get("temporal", {}).get("interval")
+    first_interval = interval[0] if interval and isinstance(interval[0], list) else []
+    collection_start, collection_end = (first_interval + [None, None])[:2]
+
+    start = temporal_extent[0] or collection_start
+    end = temporal_extent[1] or collection_end or datetime.datetime.now().isoformat()
+    try:
+        days = (_parse_datetime(end) - _parse_datetime(start)).total_seconds() / 86400
+    except (TypeError, ValueError):
+        return 1
+
+    revisit_days = settings.DASK_WORKLOAD_REVISIT_DAYS
+    step = collection.get("cube:dimensions", {}).get("t", {}).get("step")
+    if isinstance(step, str):
+        match = re.fullmatch(r"P(\d+)D", step)
+        if match:
+            revisit_days = int(match.group(1))
+
+    return max(1, math.ceil(days / revisit_days))
+
+
+def estimate_job_bytes(process_graph: dict) -> Optional[int]:
+    """Estimate the uncompressed size of the data a process graph loads.
+
+    Sums extent x bands x timesteps x dtype size over the graph's
+    load_collection nodes, using the collection metadata from the STAC API.
+    Returns None when any load can't be estimated.
+    """
+    estimate = 0
+    for node in process_graph.values():
+        if "load_" not in node.get("process_id", ""):
+            continue
+        if node["process_id"] != "load_collection":
+            return None
+
+        arguments = node.get("arguments", {})
+        if not isinstance(arguments.get("id"), str) or not isinstance(
+            arguments.get("spatial_extent"), dict
+        ):
+            return None
+
+        extent = _extent_metres(arguments["spatial_extent"])
+        collection = get_collection(arguments["id"])
+        if extent is None or collection is None:
+            return None
+
+        resolution = _resolution_metres(collection)
+        pixels = (extent[0] / resolution) * (extent[1] / resolution)
+        bands = arguments.get("bands")
+        temporal_extent = arguments.get("temporal_extent")
+
+        estimate += int(
+            pixels
+            * _band_count(collection, bands if isinstance(bands, list) else None)
+            * _timestep_count(
+                collection,
+                temporal_extent if isinstance(temporal_extent, list) else None,
+            )
+            * _dtype_bytes(collection)
+        )
+
+    return estimate
@@ -62,7 +62,7 @@ def test_file_formats(mock_settings):
 
     assert resp.status_code == 200
     assert len(json_out["input"]) == 2
-    assert len(json_out["output"]) == 1
+    assert len(json_out["output"]) == 3
 
 
 def test_file_list(a_mock_user, mock_settings):
@@ -0,0 +1,67 @@
+import pydantic
+import pytest
+
+from openeo_argoworkflows_api.job_options import apply_job_options
+
+PROFILE = {
+    "GATEWAY_URL": "http://gateway",
+    "WORKER_CORES": "4",
+    "WORKER_MEMORY": "8",
+    "WORKER_LIMIT": "6",
+    "CLUSTER_IDLE_TIMEOUT": "3600",
+}
+
+POWER_PROFILE = {
+    **PROFILE,
+    "MAX_WORKER_LIMIT": 20,
+    "MAX_PARALLEL_TILES": 4,
+    "MAX_EXECUTOR_MEMORY": 32,
+}
+
+
+def test_no_job_options_keeps_profile():
+    dask_profile, executor_resources = apply_job_options(
+        None, POWER_PROFILE, {}, POWER_PROFILE
+    )
+    assert dask_profile == PROFILE
+    assert executor_resources == {}
+
+
+def test_job_options_are_merged_and_clamped():
+    dask_profile, executor_resources = apply_job_options(
+        {
+            "worker_count": 50,
+            "worker_memory": 4,
+            "max_parallel_tiles": 2,
+            "tile_size": 500000,
+            "executor_memory": 64,
+        },
+        PROFILE,
+        {"MEMORY_REQUEST": "8Gi"},
+        POWER_PROFILE,
+    )
+    assert dask_profile["WORKER_LIMIT"] == 20
+    assert dask_profile["WORKER_MEMORY"] == 4
+    assert dask_profile["PARALLEL_TILES"] == 2
+    assert dask_profile["TILE_SIZE"] == 100000
+    assert executor_resources == {"MEMORY_REQUEST": "32Gi", "MEMORY_LIMIT": "32Gi"}
+
+
+def test_job_options_without_limits_only_scale_down():
+    dask_profile, executor_resources = apply_job_options(
+        {"worker_count": 50, "idle_timeout": 600, "executor_memory": 64},
+        PROFILE,
+        {},
+        PROFILE,
+    )
+    assert dask_profile["WORKER_LIMIT"] == 6
+    assert dask_profile["CLUSTER_IDLE_TIMEOUT"] == 600
+    assert executor_resources == {}
+
+
+def test_invalid_job_options_are_rejected():
+    with pytest.raises(pydantic.ValidationError):
+        apply_job_options({"worker_count": 0}, PROFILE, {}, PROFILE)
+
+    with pytest.raises(pydantic.ValidationError):
+        apply_job_options({"workers": 4}, PROFILE, {}, PROFILE)
@@ -0,0 +1,435 @@
+import datetime
+import json
+import pytest
+import uuid
+
+from openeo_fastapi.api.types import Status
+from pystac import Asset, Collection, Extent, SpatialExtent, TemporalExtent
+from unittest.mock import MagicMock, patch
+
+from openeo_fastapi.client.psql.engine import create
+
+from openeo_argoworkflows_api.jobs import ArgoJobsRegister, UserWorkspace
+from openeo_argoworkflows_api.psql.models import ArgoJob
+from openeo_argoworkflows_api.result_reuse import (
+    canonical_process_graph,
+    collection_versions,
+    find_reusable_job,
+    result_hash,
+)
+from openeo_argoworkflows_api.tasks import (
+    _reuse_job,
+    _reuses_results,
+    poll_joined_job,
+    submit_job,
+)
+
+COLLECTION = {
+    "id": "sentinel-2-l2a",
+    "updated": "2026-10-01T00:00:00Z",
+    "extent": {"temporal": {"interval": [["2015-06-27T00:00:00Z", None]]}},
+}
+
+
+def _graph(load_id="load1", bands=("B04",)):
+    return {
+        load_id: {
+            "process_id": "load_collection",
+            "arguments": {"id": "sentinel-2-l2a", "bands": list(bands)},
+        },
+        "save": {
+            "process_id": "save_result",
+            "arguments": {"data": {"from_node": load_id}, "format": "netCDF"},
+            "result": True,
+        },
+    }
+
+
+def _job(user_id, status, job_hash, created=None, result_of=None):
+    return ArgoJob(
+        job_id=uuid.uuid4(),
+        process={"process_graph": _graph()},
+        status=status,
+        user_id=user_id,
+        created=created or datetime.datetime.now(),
+        result_hash=job_hash,
+        result_of=result_of,
+    )
+
+
+def test_canonical_process_graph_ignores_node_ids():
+    renamed = _graph(load_id="my_load")
+    renamed["save"]["description"] = "Save it"
+
+    assert canonical_process_graph(_graph()) == canonical_process_graph(renamed)
+
+
+def test_canonical_process_graph_differs_by_arguments():
+    assert canonical_process_graph(_graph()) != canonical_process_graph(
+        _graph(bands=("B08",))
+    )
+
+
+@patch("openeo_argoworkflows_api.result_reuse.get_collection")
+def test_result_hash_includes_collection_versions(mock_collection):
+    mock_collection.return_value = COLLECTION
+    assert collection_versions(_graph()) == {
+        "sentinel-2-l2a": {
+            "version": None,
+            "updated": "2026-10-01T00:00:00Z",
+            "temporal": COLLECTION["extent"]["temporal"],
+        }
+    }
+    before = result_hash(_graph())
+
+    mock_collection.return_value = {**COLLECTION, "updated": "2026-10-02T00:00:00Z"}
+    assert result_hash(_graph()) != before
+
+
+def test_find_reusable_job_prefers_finished_results(mock_engine):
+    user_id = uuid.uuid4()
+    running = _job(user_id, "running", "hash")
+    finished = _job(user_id, "finished", "hash")
+    for existing in (running, finished):
+        create(existing)
+
+    job = _job(user_id, "queued", "hash")
+    found = find_reusable_job(job, "hash", 3600, lambda candidate: True)
+    assert found.job_id == finished.job_id
+
+    found = find_reusable_job(job, "hash", 3600, lambda candidate: False)
+    assert found.job_id == running.job_id
+
+
+def test_find_reusable_job_respects_user_and_window(mock_engine):
+    user_id = uuid.uuid4()
+    old = datetime.datetime.now() - datetime.timedelta(hours=2)
+    create(_job(user_id, "finished", "hash", created=old))
+    create(_job(uuid.uuid4(), "finished", "hash"))
+    # Jobs that joined another job are never joined themselves.
+    create(_job(user_id, "running", "hash", result_of=uuid.uuid4()))
+
+    job = _job(user_id, "queued", "hash")
+    assert find_reusable_job(job, "hash", 3600, lambda candidate: True) is None
+
+
+def _later(seconds=3600):
+    return datetime.datetime.now() + datetime.timedelta(seconds=seconds)
+
+
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.modify")
+def test_reuse_job_serves_finished_results(mock_modify, mock_q):
+    user_id = uuid.uuid4()
+    source = _job(user_id, Status.finished, "hash")
+    job = _job(user_id, Status.queued, "hash")
+
+    assert _reuse_job(job, source) is None
+    assert job.status == Status.finished
+    assert job.result_of == source.job_id
+    mock_modify.assert_called_once_with(job)
+    mock_q.enqueue.assert_not_called()
+
+
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.modify")
+def test_reuse_job_joins_running_job(mock_modify, mock_q):
+    user_id = uuid.uuid4()
+    source = _job(user_id, Status.running, "hash")
+    job = _job(user_id, Status.queued, "hash")
+
+    _reuse_job(job, source)
+    assert job.status == Status.running
+    assert job.result_of == source.job_id
+
+    function, joined, deadline = mock_q.enqueue.call_args.args
+    assert function is poll_joined_job
+    assert joined is job
+    assert deadline > datetime.datetime.now()
+
+
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.modify")
+def test_reuse_job_reuses_the_results_of_the_source(mock_modify, mock_q):
+    user_id = uuid.uuid4()
+    original = uuid.uuid4()
+    source = _job(user_id, Status.finished, "hash", result_of=original)
+    job = _job(user_id, Status.queued, "hash")
+
+    _reuse_job(job, source)
+    assert job.result_of == original
+
+
+@pytest.mark.parametrize("status", [Status.finished, Status.error])
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.modify")
+@patch("openeo_argoworkflows_api.tasks.get")
+def test_poll_joined_job_takes_the_status_of_the_source(
+    mock_get, mock_modify, mock_q, status
+):
+    user_id = uuid.uuid4()
+    source = _job(user_id, status, "hash")
+    job = _job(user_id, Status.running, "hash", result_of=source.job_id)
+    mock_get.side_effect = [job, source]
+
+    poll_joined_job(job, _later())
+    assert job.status == status
+    mock_modify.assert_called_once_with(job)
+    mock_q.enqueue.assert_not_called()
+    mock_q.enqueue_in.assert_not_called()
+
+
+@pytest.mark.parametrize("status", [Status.canceled, Status.created, None])
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.modify")
+@patch("openeo_argoworkflows_api.tasks.get")
+def test_poll_joined_job_runs_the_job_when_the_source_stopped(
+    mock_get, mock_modify, mock_q, status
+):
+    user_id = uuid.uuid4()
+    source = _job(user_id, status, "hash") if status else None
+    job = _job(user_id, Status.running, "hash", result_of=uuid.uuid4())
+    mock_get.side_effect = [job, source]
+
+    poll_joined_job(job, _later())
+    mock_q.enqueue.assert_called_once_with(submit_job, job, reuse_results=False)
+    mock_modify.assert_not_called()
+
+
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.get")
+def test_poll_joined_job_waits_until_the_deadline(mock_get, mock_q):
+    user_id = uuid.uuid4()
+    source = _job(user_id, Status.running, "hash")
+    job = _job(user_id, Status.running, "hash", result_of=source.job_id)
+
+    mock_get.side_effect = [job, source]
+    deadline = _later()
+    poll_joined_job(job, deadline)
+    assert mock_q.enqueue_in.call_args.args[1:] == (poll_joined_job, job, deadline)
+    mock_q.enqueue.assert_not_called()
+
+    mock_get.side_effect = [job, source]
+    poll_joined_job(job, _later(-1))
+    mock_q.enqueue.assert_called_once_with(submit_job, job, reuse_results=False)
+
+
+@patch("openeo_argoworkflows_api.tasks.q")
+@patch("openeo_argoworkflows_api.tasks.get")
+def test_poll_joined_job_stops_for_stopped_jobs(mock_get, mock_q):
+    job = _job(uuid.uuid4(), Status.created, "hash", result_of=uuid.uuid4())
+    mock_get.return_value = job
+
+    assert poll_joined_job(job, _later()) is None
+    mock_q.enqueue.assert_not_called()
+    mock_q.enqueue_in.assert_not_called()
+
+
+@patch("openeo_argoworkflows_api.tasks._get_user_roles")
+@patch("openeo_argoworkflows_api.tasks.settings")
+def test_reuses_results_opt_outs(mock_app_settings, mock_roles):
+    mock_app_settings.OPENEO_RESULT_REUSE = True
+    mock_app_settings.OPENEO_RESULT_REUSE_OPT_OUT_ROLE = "no_reuse"
+    mock_roles.return_value = ["early_adopter"]
+    job = _job(uuid.uuid4(), Status.queued, None)
+
+    assert _reuses_results(job)
+
+    job.job_options = {"reuse_results": False}
+    assert not _reuses_results(job)
+
+    job.job_options = None
+    mock_roles.return_value = ["early_adopter", "no_reuse"]
+    assert not _reuses_results(job)
+
+    mock_roles.return_value = []
+    mock_app_settings.OPENEO_RESULT_REUSE = False
+    assert not _reuses_results(job)
+
+
+def _patch_submission(func):
+    # The innermost patch is passed first.
+    for target in (
+        "q",
+        "modify",
+        "_executor_workflow",
+        "_reuse_job",
+        "find_reusable_job",
+        "result_hash",
+        "_reuses_results",
+        "_resolve_udps",
+        "WorkflowsService",
+    ):
+        func = patch(f"openeo_argoworkflows_api.tasks.{target}")(func)
+    return func
+
+
+@_patch_submission
+def test_submit_job_reuses_under_the_result_hash_lock(
+    mock_q,
+    mock_modify,
+    mock_workflow,
+    mock_reuse_job,
+    mock_find,
+    mock_hash,
+    mock_reuses,
+    mock_resolve,
+    mock_argo,
+):
+    mock_reuses.return_value = True
+    mock_hash.return_value = "hash"
+    job = _job(uuid.uuid4(), Status.queued, None)
+    source = _job(job.user_id, Status.running, "hash")
+    mock_find.return_value = source
+
+    submit_job(job)
+    mock_q.connection.lock.assert_called_once()
+    assert mock_q.connection.lock.call_args.args == ("openeo:result_hash:hash",)
+    assert job.result_hash == "hash"
+    mock_reuse_job.assert_called_once_with(job, source)
+    mock_workflow.assert_not_called()
+
+
+@_patch_submission
+def test_submit_job_marks_the_job_running_under_the_lock(
+    mock_q,
+    mock_modify,
+    mock_workflow,
+    mock_reuse_job,
+    mock_find,
+    mock_hash,
+    mock_reuses,
+    mock_resolve,
+    mock_argo,
+):
+    mock_reuses.return_value = True
+    mock_find.return_value = None
+    statuses = []
+    lock = mock_q.connection.lock.return_value
+    lock.__exit__.side_effect = lambda *args: statuses.append(job.status)
+    job = _job(uuid.uuid4(), Status.queued, None)
+
+    submit_job(job)
+    assert statuses == [Status.running]
+    assert job.workflowname == mock_workflow.return_value.create().metadata.name
+    mock_reuse_job.assert_not_called()
+
+
+@_patch_submission
+def test_submit_job_marks_the_job_errored_when_submission_fails(
+    mock_q,
+    mock_modify,
+    mock_workflow,
+    mock_reuse_job,
+    mock_find,
+    mock_hash,
+    mock_reuses,
+    mock_resolve,
+    mock_argo,
+):
+    mock_reuses.return_value = True
+    mock_find.return_value = None
+    job = _job(uuid.uuid4(), Status.queued, None)
+
+    for failure in ("build", "create"):
+        mock_workflow.reset_mock(side_effect=True)
+        if failure == "build":
+            mock_workflow.side_effect = ValueError("No profile.")
+        else:
+            mock_workflow.return_value.create.side_effect = ValueError("No argo.")
+        job.status = Status.queued
+
+        with pytest.raises(ValueError):
+            submit_job(job)
+        assert job.status == Status.error
+        mock_q.enqueue.assert_not_called()
+
+
+@_patch_submission
+def test_submit_job_without_reuse_skips_the_lock(
+    mock_q,
+    mock_modify,
+    mock_workflow,
+    mock_reuse_job,
+    mock_find,
+    mock_hash,
+    mock_reuses,
+    mock_resolve,
+    mock_argo,
+):
+    mock_reuses.return_value = True
+    job = _job(uuid.uuid4(), Status.running, "hash", result_of=uuid.uuid4())
+
+    submit_job(job, reuse_results=False)
+    mock_q.connection.lock.assert_not_called()
+    assert job.result_of is None
+    assert job.result_hash is None
+    assert job.status == Status.running
+
+
+@patch("openeo_argoworkflows_api.jobs.engine")
+def test_stop_job_of_a_joined_job(mock_engine, a_mock_user, mock_links, mock_settings):
+    job = _job(a_mock_user.user_id, Status.running, "hash", result_of=uuid.uuid4())
+    mock_engine.get.return_value = job
+
+    register = ArgoJobsRegister(mock_settings, mock_links)
+    register.workflows_service = MagicMock()
+    register.stop_job(job.job_id, user=a_mock_user)
+
+    register.workflows_service.stop_workflow.assert_not_called()
+    mock_engine.modify.assert_called_once_with(modify_object=job)
+    assert job.status == "created"
+
+
+def _write_results_collection(settings, user_id, job_id):
+    wspace = UserWorkspace(
+        root_dir=settings.OPENEO_WORKSPACE_ROOT, user_id=str(user_id), job_id=job_id
+    )
+    wspace.ensure(wspace.stac_directory)
+    now = datetime.datetime.now()
+    collection = Collection(
+        id=str(job_id),
+        description="Results",
+        extent=Extent(SpatialExtent([[0, 0, 1, 1]]), TemporalExtent([[now, now]])),
+    )
+    collection.add_asset(
+        "result", Asset(href=str(wspace.results_directory / "result.nc"))
+    )
+    wspace.results_collection_json.write_text(json.dumps(collection.to_dict()))
+
+
+@patch("openeo_argoworkflows_api.jobs.engine")
+def test_get_results_of_a_reusing_job(
+    mock_engine, a_mock_user, mock_links, mock_settings
+):
+    source_id = uuid.uuid4()
+    job = _job(a_mock_user.user_id, Status.finished, "hash", result_of=source_id)
+    mock_engine.get.return_value = job
+    _write_results_collection(mock_settings, a_mock_user.user_id, source_id)
+
+    register = ArgoJobsRegister(mock_settings, mock_links)
+    results = register.get_results(job.job_id, user=a_mock_user)
+
+    assert results["id"] == str(source_id)
+    assert f"/{source_id}/RESULTS/result.nc" in results["assets"]["result"]["href"]
+    assert f"/jobs/{job.job_id}/results" in results["links"][-1]["href"]
+
+
+@patch("openeo_argoworkflows_api.jobs.requests")
+@patch("openeo_argoworkflows_api.jobs.engine")
+def test_logs_of_a_reusing_job(mock_engine, mock_requests, mock_links, mock_settings):
+    source = _job(uuid.uuid4(), Status.finished, "hash")
+    source.workflowname = "source-workflow"
+    job = _job(source.user_id, Status.finished, "hash", result_of=source.job_id)
+    mock_engine.get.side_effect = [job, source]
+    mock_requests.get.return_value.status_code = 404
+
+    register = ArgoJobsRegister(mock_settings, mock_links)
+    register.workflows_service = MagicMock(host="http://argo.mock.com/")
+    register.logs(job.job_id)
+
+    assert mock_engine.get.call_args.kwargs["primary_key"] == source.job_id
+    assert (
+        register.workflows_service.get_workflow.call_args.kwargs["name"]
+        == "source-workflow"
+    )
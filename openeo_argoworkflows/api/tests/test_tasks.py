@@ -9,7 +9,15 @@ from unittest.mock import patch
 from openeo_fastapi.client.processes import UserDefinedProcessGraph
 from openeo_fastapi.client.psql.engine import create
 
-from openeo_argoworkflows_api.tasks import queue_to_submit, q, _select_dask_profile, _resolve_udps
+from openeo_argoworkflows_api.tasks import (
+    queue_to_submit,
+    q,
+    _select_dask_profile,
+    _select_workload_profile,
+    _select_executor_resources,
+    _resolve_udps,
+)
+from openeo_argoworkflows_api.workload import estimate_job_bytes
 
 BASE = {
     "GATEWAY_URL": "http://gateway",
@@ -74,6 +82,142 @@ def test_select_profile_base_fields_preserved():
     assert result["CLUSTER_IDLE_TIMEOUT"] == "3600"
 
 
+GIB = 2**30
+
+
+def test_select_workload_profile_picks_smallest_fitting():
+    power = _select_dask_profile(["early_adopter"], ROLE_MAPPING, PROFILES, BASE)
+    # standard holds 16GiB, power 160GiB.
+    result = _select_workload_profile(5 * GIB, power, PROFILES, BASE)
+    assert result["WORKER_MEMORY"] == "4"
+
+    result = _select_workload_profile(20 * GIB, power, PROFILES, BASE)
+    assert result["WORKER_MEMORY"] == "16"
+
+
+def test_select_workload_profile_never_exceeds_role_profile():
+    standard = _select_dask_profile([], ROLE_MAPPING, PROFILES, BASE)
+    result = _select_workload_profile(500 * GIB, standard, PROFILES, BASE)
+    assert result == standard
+
+
+def test_select_workload_profile_without_estimate_keeps_role_profile():
+    power = _select_dask_profile(["early_adopter"], ROLE_MAPPING, PROFILES, BASE)
+    assert _select_workload_profile(None, power, PROFILES, BASE) == power
+
+
+TIERS = {
+    "large": {"MAX_BYTES": None, "MEMORY_REQUEST": "32Gi", "MEMORY_LIMIT": "48Gi"},
+    "small": {"MAX_BYTES": 2 * GIB, "MEMORY_REQUEST": "2Gi", "MEMORY_LIMIT": "4Gi"},
+    "medium": {
+        "MAX_BYTES": 20 * GIB,
+        "MEMORY_REQUEST": "8Gi",
+        "MEMORY_LIMIT": "16Gi",
+        "NODE_SELECTOR": {"node-size": "medium"},
+    },
+}
+
+TIER_MAPPING = {"early_adopter": "large", "default": "medium"}
+
+BASE_RESOURCES = {"CPU_REQUEST": "1", "CPU_LIMIT": "4"}
+
+
+def test_select_executor_resources_smallest_fitting_tier():
+    result = _select_executor_resources(
+        GIB, ["early_adopter"], TIERS, TIER_MAPPING, BASE_RESOURCES
+    )
+    assert result == {**BASE_RESOURCES, "MEMORY_REQUEST": "2Gi", "MEMORY_LIMIT": "4Gi"}
+
+    result = _select_executor_resources(
+        100 * GIB, ["early_adopter"], TIERS, TIER_MAPPING, BASE_RESOURCES
+    )
+    assert result["MEMORY_REQUEST"] == "32Gi"
+
+
+def test_select_executor_resources_capped_by_role():
+    result = _select_executor_resources(
+        100 * GIB, ["unknown"], TIERS, TIER_MAPPING, BASE_RESOURCES
+    )
+    assert result["MEMORY_REQUEST"] == "8Gi"
+    assert result["NODE_SELECTOR"] == {"node-size": "medium"}
+
+
+def test_select_executor_resources_without_estimate_uses_ceiling():
+    result = _select_executor_resources(None, [], TIERS, TIER_MAPPING, BASE_RESOURCES)
+    assert result["MEMORY_REQUEST"] == "8Gi"
+
+    result = _select_executor_resources(None, [], TIERS, {}, BASE_RESOURCES)
+    assert result["MEMORY_REQUEST"] == "32Gi"
+
+
+COLLECTION = {
+    "summaries": {
+        "gsd": [10, 20, 60],
+        "raster:bands": [{"data_type": "uint16"}, {"data_type": "uint16"}],
+    },
+    "cube:dimensions": {"t": {"step": "P5D"}},
+    "extent": {"temporal": {"interval": [["2017-01-01T00:00:00Z", None]]}},
+}
+
+
+@patch("openeo_argoworkflows_api.workload.get_collection", return_value=COLLECTION)
+def test_estimate_job_bytes(mock_collection):
+    process_graph = {
+        "load1": {
+            "process_id": "load_collection",
+            "arguments": {
+                "id": "sentinel-2-l2a",
+                "spatial_extent": {
+                    "west": 500000,
+                    "east": 510000,
+                    "south": 5000000,
+                    "north": 5010000,
+                    "crs": 32633,
+                },
+                "temporal_extent": ["2022-01-01", "2022-01-11"],
+                "bands": ["B02", "B03", "B04"],
+            },
+        },
+        "save1": {"process_id": "save_result", "arguments": {}},
+    }
+    # 1000 x 1000 pixels x 3 bands x 2 timesteps x 2 bytes
+    assert estimate_job_bytes(process_graph) == 12_000_000
+
+
+@patch("openeo_argoworkflows_api.workload.get_collection")
+def test_estimate_job_bytes_without_collection_interval(mock_collection):
+    mock_collection.return_value = {
+        **COLLECTION,
+        "extent": {"temporal": {"interval": []}},
+    }
+    process_graph = {
+        "load1": {
+            "process_id": "load_collection",
+            "arguments": {
+                "id": "sentinel-2-l2a",
+                "spatial_extent": {
+                    "west": 500000,
+                    "east": 510000,
+                    "south": 5000000,
+                    "north": 5010000,
+                    "crs": 32633,
+                },
+                "temporal_extent": ["2022-01-01", None],
+                "bands": ["B02"],
+            },
+        },
+    }
+    assert estimate_job_bytes(process_graph) > 0
+
+
+@patch("openeo_argoworkflows_api.workload.get_collection", return_value=COLLECTION)
+def test_estimate_job_bytes_unknown_for_other_loads(mock_collection):
+    process_graph = {
+        "load1": {"process_id": "load_stac", "arguments": {"url": "http://a.stac"}},
+    }
+    assert estimate_job_bytes(process_graph) is None
+
+
 @patch("openeo_argoworkflows_api.tasks.Redis")
 def test_submit_job(mock_redis, redis_conn, a_mock_job):
     assert True
@@ -0,0 +1,29 @@
+from hera.workflows import WorkflowsService
+
+from openeo_argoworkflows_api.workflows import (
+    EXECUTOR_RETRY_EXPRESSION,
+    executor_workflow,
+)
+
+USER_PROFILE = {
+    "OPENEO_JOB_ID": "job",
+    "OPENEO_USER_ID": "user",
+    "OPENEO_USER_WORKSPACE": "/eodc/user/job",
+}
+
+
+def test_executor_workflow_retries_transient_failures_only(monkeypatch):
+    monkeypatch.setenv("OPENEO_WORKSPACE_CLAIMNAME", "workspaces")
+    workflow = executor_workflow(
+        WorkflowsService(host="http://argo", namespace="openeo"),
+        process_graph={},
+        dask_profile={},
+        user_profile=USER_PROFILE,
+    ).build()
+
+    template = next(t for t in workflow.spec.templates if t.name == "executor")
+    assert template.retry_strategy.retry_policy == "Always"
+    assert template.retry_strategy.expression == EXECUTOR_RETRY_EXPRESSION
+
+    env = {variable.name: variable.value for variable in template.container.env}
+    assert env["OPENEO_RUN_ID"] == "{{workflow.uid}}"
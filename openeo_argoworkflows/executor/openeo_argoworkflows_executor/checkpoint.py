@@ -0,0 +1,132 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# The outputs written by the tile that is currently executing. save_result
+# records into this, so each completion marker lists exactly its own files.
+_tile_outputs: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar(
+    "tile_outputs", default=None
+)
+
+
+def record_output(path: Path):
+    """Record an output file against the tile that is currently executing."""
+    outputs = _tile_outputs.get()
+    if outputs is not None:
+        outputs.append(Path(path).name)
+
+
+class TileCheckpoints:
+    """Durable per-tile completion markers in the job workspace.
+
+    Each completed tile gets a ``<tile_key>.json`` marker listing the outputs it
+    wrote to the results directory. When the executor is restarted (e.g. by the
+    Argo retry strategy after an OOM kill), tiles with a valid marker are
+    skipped instead of recomputed.
+
+    Markers are kept per run of the job, ``run_id`` (the Argo workflow), so
+    they only carry over between the retries of one run. A job the user starts
+    again runs in a new workflow and recomputes every tile.
+    """
+
+    def __init__(
+        self, checkpoint_path: Path, results_path: Path, run_id: str
+    ) -> None:
+        self.root = Path(checkpoint_path)
+        self.checkpoint_path = self.root / run_id
+        self.results_path = Path(results_path)
+
+        self.checkpoint_path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def tile_key(pg_data: dict) -> str:
+        """Identify a tile by the content of its sub graph."""
+        canonical = json.dumps(pg_data, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _marker(self, tile_key: str) -> Path:
+        return self.checkpoint_path / f"{tile_key}.json"
+
+    def _read_marker(self, marker: Path) -> Optional[dict]:
+        try:
+            with open(marker) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable checkpoint marker %s", marker)
+            return None
+
+    def is_complete(self, tile_key: str) -> bool:
+        """A tile is complete when its marker exists and all its outputs do too."""
+        marker = self._marker(tile_key)
+        if not marker.exists():
+            return False
+
+        manifest = self._read_marker(marker)
+        if manifest is None:
+            return False
+        return all(
+            (self.results_path / output).exists() for output in manifest["outputs"]
+        )
+
+    @contextlib.contextmanager
+    def track(self, tile_key: str) -> Iterator[list]:
+        """Collect the outputs of a tile, and mark it complete if it succeeds."""
+        outputs = []
+        token = _tile_outputs.set(outputs)
+        try:
+            yield outputs
+        finally:
+            _tile_outputs.reset(token)
+        self.mark_complete(tile_key, outputs)
+
+    def mark_complete(self, tile_key: str, outputs: list):
+        """Atomically write the completion marker of a tile."""
+        marker = self._marker(tile_key)
+        tmp_marker = marker.with_suffix(".json.tmp")
+
+        with open(tmp_marker, "w") as f:
+            json.dump({"tile": tile_key, "outputs": outputs}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_marker, marker)
+
+    def remove_stale_runs(self):
+        """Remove the markers of earlier runs of the job."""
+        for path in self.root.iterdir():
+            if path.is_dir() and path != self.checkpoint_path:
+                logger.info("Removing the checkpoints of an earlier run %s", path)
+                shutil.rmtree(path, ignore_errors=True)
+
+    def remove_orphaned_outputs(self):
+        """Remove results that no completion marker of this run accounts for.
+
+        These are leftovers of a tile that was interrupted part way through, or
+        the results of an earlier run, and would otherwise be duplicated when
+        the tiles are recomputed.
+        """
+        if not self.results_path.exists():
+            return
+
+        known_outputs = set()
+        for marker in self.checkpoint_path.glob("*.json"):
+            manifest = self._read_marker(marker)
+            if manifest is not None:
+                known_outputs.update(manifest["outputs"])
+
+        for output in self.results_path.iterdir():
+            if output.name in known_outputs:
+                continue
+            logger.info("Removing output of an interrupted tile %s", output)
+            if output.is_dir():
+                shutil.rmtree(output, ignore_errors=True)
+            else:
+                output.unlink(missing_ok=True)
@@ -0,0 +1,75 @@
+import logging
+import math
+import os
+
+import numpy as np
+
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Bounds of the memory a chunk of loaded data (all requested bands together)
+# may take. Below the lower bound the scheduler overhead of the tasks
+# dominates, above the upper bound chunks crowd the worker memory.
+MIN_CHUNK_BYTES = 32 * 2**20
+MAX_CHUNK_BYTES = 256 * 2**20
+
+# Chunks of data held at the same time per worker thread, e.g. inputs and
+# results of a band math step and the chunks queued behind it.
+CHUNKS_IN_MEMORY = 8
+
+# Spatial chunk edges are multiples of the source block size, so no block is
+# read by more than one task. Sources without a known block size use this.
+DEFAULT_BLOCK_SIZE = 512
+MAX_CHUNK_EDGE = 2048
+
+
+def target_chunk_bytes() -> int:
+    """The size a chunk should have on the workers of the job's dask profile."""
+    worker_memory = float(os.environ.get("OPENEO_WORKER_MEMORY", 8)) * 2**30
+    worker_cores = max(int(os.environ.get("OPENEO_WORKER_CORES", 4)), 1)
+    target = worker_memory / worker_cores / CHUNKS_IN_MEMORY
+    return int(min(max(target, MIN_CHUNK_BYTES), MAX_CHUNK_BYTES))
+
+
+def auto_chunks(
+    dtype: Optional[str],
+    n_bands: int,
+    n_times: int,
+    extent_pixels: Optional[tuple[int, int]] = None,
+    block_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    max_edge: Optional[int] = None,
+    target_bytes: Optional[int] = None,
+) -> dict:
+    """Chunk shape of loaded data, as stac_load chunks.
+
+    The spatial edge follows the source blocks and doesn't exceed the
+    requested extent, so tiny AOIs aren't padded into oversized chunks. The
+    time dimension takes as many timesteps as fit into the target size, so
+    long time series neither make chunks huge nor multiply the task count.
+    An explicit chunk_size fixes the spatial edge, max_edge bounds it.
+    """
+    target_bytes = target_bytes or target_chunk_bytes()
+    itemsize = np.dtype(dtype).itemsize if dtype else np.dtype("float32").itemsize
+    pixel_bytes = itemsize * max(n_bands, 1)
+    block = block_size or DEFAULT_BLOCK_SIZE
+
+    if chunk_size:
+        edge = int(chunk_size)
+    else:
+        # Keep a single timestep within the target, at least one block.
+        edge = min(
+            max_edge or MAX_CHUNK_EDGE, int(math.sqrt(target_bytes / pixel_bytes))
+        )
+        edge = max(block, edge // block * block)
+        if extent_pixels is not None:
+            edge = min(edge, math.ceil(max(extent_pixels) / block) * block)
+
+    time_chunk = int(target_bytes // (pixel_bytes * edge * edge))
+    time_chunk = min(max(time_chunk, 1), max(n_times, 1))
+
+    logger.info(
+        "Loading in chunks of %s timesteps x %s x %s pixels.", time_chunk, edge, edge
+    )
+    return {"time": time_chunk, "y": edge, "x": edge}
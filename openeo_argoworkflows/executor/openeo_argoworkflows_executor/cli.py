@@ -2,8 +2,13 @@ import click
 import fsspec
 import logging
 
+from openeo_argoworkflows_executor.profiling import profiler
+
 logger = logging.getLogger(__name__)
 
+# Threads creating and writing the STAC items of the results.
+STAC_WORKERS = 16
+
 
 @click.group()
 def cli():
@@ -36,17 +41,28 @@ def execute(process_graph, user_profile, dask_profile):
     import os
     import json
     import shutil
-
-    from dask_gateway import Gateway
-    import openeo_processes_dask_slim
-    from openeo_pg_parser_networkx.graph import OpenEOProcessGraph
-
-    from openeo_argoworkflows_executor.executor import execute
+    from importlib.metadata import version
+
+    # Heavy modules (dask_gateway, odc.stac, stactools, ...) are only imported
+    # once the run actually needs them, through the profiler so that their
+    # import cost shows up in the start-up profile.
+    with profiler.phase("imports"):
+        OpenEOProcessGraph = profiler.import_module(
+            "openeo_pg_parser_networkx.graph"
+        ).OpenEOProcessGraph
+        execute = profiler.import_module(
+            "openeo_argoworkflows_executor.executor"
+        ).execute
+
+    from openeo_argoworkflows_executor.cluster import ClusterHandle
+    from openeo_argoworkflows_executor.download_cache import (
+        get_download_cache,
+        link_download_directory,
+    )
     from openeo_argoworkflows_executor.models import ExecutorParameters
-    from openeo_argoworkflows_executor.stac import create_stac_item
 
     logger.info(
-        f"Using processes from openeo-processes-dask-slim v{openeo_processes_dask_slim.__version__}"
+        f"Using processes from openeo-processes-dask-slim v{version('openeo-processes-dask-slim')}"
     )
 
     openeo_parameters = ExecutorParameters(
@@ -71,108 +87,123 @@ def execute(process_graph, user_profile, dask_profile):
     )
     os.environ["OPENEO_STAC_PATH"] = str(openeo_parameters.user_profile.stac_path)
     os.environ["OPENEO_RESULTS_PATH"] = str(openeo_parameters.user_profile.results_path)
-
-    if openeo_parameters.dask_profile.LOCAL:
-        from dask.distributed import worker_client
-
-        dask_cluster = None
-        client = worker_client()
-        pass
-    else:
-        gateway = Gateway(openeo_parameters.dask_profile.GATEWAY_URL)
-        options = gateway.cluster_options()
-
-        options.OPENEO_JOB_ID = openeo_parameters.user_profile.OPENEO_JOB_ID
-        options.OPENEO_USER_ID = openeo_parameters.user_profile.OPENEO_USER_ID
-
-        options.IMAGE = openeo_parameters.dask_profile.OPENEO_EXECUTOR_IMAGE
-
-        options.WORKER_CORES = int(openeo_parameters.dask_profile.WORKER_CORES)
-        options.WORKER_MEMORY = int(openeo_parameters.dask_profile.WORKER_MEMORY)
-        options.CLUSTER_IDLE_TIMEOUT = int(
-            openeo_parameters.dask_profile.CLUSTER_IDLE_TIMEOUT
-        )
-
-        dask_cluster = gateway.new_cluster(options, shutdown_on_close=True)
-
-        # We need to initiate a cluster with at least one worker, otherwise .scatter that's used in xgboost will timeout waiting for workers
-        # See https://github.com/dask/distributed/issues/2941
-        dask_cluster.adapt(
-            minimum=1, maximum=int(openeo_parameters.dask_profile.WORKER_LIMIT)
-        )
-        client = dask_cluster.get_client()
-
-    parsed_graph = OpenEOProcessGraph(pg_data=openeo_parameters.process_graph)
-
+    os.environ["OPENEO_CHECKPOINT_PATH"] = str(
+        openeo_parameters.user_profile.checkpoint_path
+    )
+    os.environ["OPENEO_METADATA_PATH"] = str(
+        openeo_parameters.user_profile.metadata_path
+    )
+    if openeo_parameters.dask_profile.DISTRIBUTED_IO:
+        os.environ["OPENEO_DISTRIBUTED_IO"] = "1"
+    os.environ["OPENEO_WORKER_MEMORY"] = str(openeo_parameters.dask_profile.WORKER_MEMORY)
+    os.environ["OPENEO_WORKER_CORES"] = str(openeo_parameters.dask_profile.WORKER_CORES)
+    if openeo_parameters.dask_profile.CHUNK_SIZE:
+        os.environ["OPENEO_CHUNK_SIZE"] = str(openeo_parameters.dask_profile.CHUNK_SIZE)
+
+    profile_path = openeo_parameters.user_profile.OPENEO_USER_WORKSPACE / "startup_profile.json"
+
+    # The dedl load_stac downloads native assets into
+    # `OPENEO_USER_WORKSPACE / "eodag_download"`. With a shared download cache
+    # that directory links to it, so products other jobs downloaded are reused.
+    job_id = openeo_parameters.user_profile.OPENEO_JOB_ID
+    download_cache = (
+        openeo_parameters.user_profile.OPENEO_USER_WORKSPACE / "eodag_download"
+    )
+    shared_download_cache = get_download_cache()
+    if shared_download_cache is not None:
+        shared_download_cache.acquire(job_id)
+        link_download_directory(download_cache, shared_download_cache)
+
+    # Provision the cluster in the background, execution only blocks on it
+    # right before the first tile runs.
+    cluster = ClusterHandle(
+        openeo_parameters.dask_profile, openeo_parameters.user_profile
+    ).start()
+
+    failed = True
     try:
-        execute(parsed_graph=parsed_graph)
+        with profiler.phase("parse_graph"):
+            parsed_graph = OpenEOProcessGraph(pg_data=openeo_parameters.process_graph)
+
+        execute(
+            parsed_graph=parsed_graph,
+            wait_for_cluster=cluster.client,
+            tile_size=openeo_parameters.dask_profile.TILE_SIZE,
+            parallel_tiles=openeo_parameters.dask_profile.PARALLEL_TILES,
+        )
+        failed = False
+    except Exception:
+        profiler.write(profile_path)
+        raise
     finally:
         # Always tear down the dask cluster, even if process-graph execution
         # (e.g. save_result) raised. Otherwise the gateway cluster keeps at least
         # one worker pod alive until CLUSTER_IDLE_TIMEOUT and the job appears stuck.
-        # Can't assume the same cluster is running post process graph execution due
-        # to sub workflows processing. If the previous cluster was closed, check for
-        # a new one!
-        if dask_cluster:
-            if dask_cluster.status == "closed":
-                cluster_list = gateway.list_clusters()
-                if cluster_list:
-                    dask_cluster = gateway.connect(cluster_list[0].name)
-
-            # Can call shutdown on previously closed clusters.
-            dask_cluster.shutdown()
-
-        # Remove the dedl load_stac native-download cache. It is an intermediate,
-        # re-fetchable cache that can be many GB per job; left behind it fills the
-        # workspace volume. Path mirrors openeo-processes-dedl-cube-load's
-        # `OPENEO_USER_WORKSPACE / "eodag_download"`.
-        download_cache = (
-            openeo_parameters.user_profile.OPENEO_USER_WORKSPACE / "eodag_download"
-        )
-        if download_cache.is_dir():
+        # Only the clusters of successful jobs return to a warm pool.
+        cluster.shutdown(failed=failed)
+
+        if shared_download_cache is not None:
+            # The shared cache is kept within its size limit instead.
+            download_cache.unlink(missing_ok=True)
+            shared_download_cache.release(job_id)
+        elif download_cache.is_dir():
+            # Remove the per-job download cache. It is an intermediate,
+            # re-fetchable cache that can be many GB per job; left behind it
+            # fills the workspace volume.
             logger.info("Removing dedl download cache %s", download_cache)
             shutil.rmtree(download_cache, ignore_errors=True)
 
-    # TODO Time to generate STAC
-    from pystac import Asset, Collection, Extent, SpatialExtent, TemporalExtent, layout
+    with profiler.phase("stac_generation"):
+        from concurrent.futures import ThreadPoolExecutor
+        from pystac import Asset, Collection, Extent, SpatialExtent, TemporalExtent, layout
+        from openeo_argoworkflows_executor.stac import create_result_items
 
-    fs = fsspec.filesystem(protocol="file")
+        fs = fsspec.filesystem(protocol="file")
 
-    output_collection = Collection(
-        id=openeo_parameters.user_profile.OPENEO_JOB_ID,
-        description=f"The STAC Collection representing the output of job {openeo_parameters.user_profile.OPENEO_JOB_ID}",
-        extent=Extent(
-            SpatialExtent([None, None, None, None]), TemporalExtent([None, None])
-        ),
-    )
+        output_collection = Collection(
+            id=openeo_parameters.user_profile.OPENEO_JOB_ID,
+            description=f"The STAC Collection representing the output of job {openeo_parameters.user_profile.OPENEO_JOB_ID}",
+            extent=Extent(
+                SpatialExtent([None, None, None, None]), TemporalExtent([None, None])
+            ),
+        )
 
-    collection_href = str(
-        openeo_parameters.user_profile.stac_path
-        / f"{output_collection.id}_collection.json"
-    )
-    output_collection.set_self_href(collection_href)
+        collection_href = str(
+            openeo_parameters.user_profile.stac_path
+            / f"{output_collection.id}_collection.json"
+        )
+        output_collection.set_self_href(collection_href)
 
-    from openeo_argoworkflows_executor.stac import create_stac_item
+        filepaths = [
+            file["name"]
+            for file in fs.listdir(str(openeo_parameters.user_profile.results_path))
+        ]
 
-    for file in fs.listdir(str(openeo_parameters.user_profile.results_path)):
-        filepath = file["name"]
+        # From the metadata save_result wrote next to the results.
+        items = create_result_items(
+            filepaths, openeo_parameters.user_profile.metadata_path, STAC_WORKERS
+        )
 
-        item = create_stac_item(filepath)
+        for filepath, item in zip(filepaths, items):
+            item.set_parent(output_collection)
+            item_href = str(openeo_parameters.user_profile.stac_path / f"{item.id}.json")
+            item.set_self_href(item_href)
 
-        item.set_parent(output_collection)
-        item_href = str(openeo_parameters.user_profile.stac_path / f"{item.id}.json")
-        item.set_self_href(item_href)
+            tmp_asset = Asset(title=item.id, href=str(filepath), roles=["data"])
 
-        tmp_asset = Asset(title=item.id, href=str(filepath), roles=["data"])
+            output_collection.add_asset(item.id, tmp_asset)
 
-        output_collection.add_asset(item.id, tmp_asset)
+            output_collection.add_item(item, strategy=layout.AsIsLayoutStrategy())
 
-        output_collection.add_item(item, strategy=layout.AsIsLayoutStrategy())
+        # The items are written together once they are all linked, the latency
+        # of the workspace volume overlaps instead of adding up per item.
+        with ThreadPoolExecutor(max_workers=STAC_WORKERS) as pool:
+            list(pool.map(lambda item: item.save_object(), items))
 
-        item.save_object()
+        output_collection.update_extent_from_items()
+        output_collection.save_object()
 
-    output_collection.update_extent_from_items()
-    output_collection.save_object()
+    profiler.write(profile_path)
 
 
 cli.add_command(execute)
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from openeo_argoworkflows_executor.models import ClusterProfile, UserProfile
+from openeo_argoworkflows_executor.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class WarmClusterPool:
+    """Idle gateway clusters kept ready for the next job with the same profile.
+
+    The pool state lives on the shared workspace volume: every idle cluster is
+    a ``<cluster name>.idle`` record in the directory of its pool. Leasing a
+    cluster renames its record away, which is atomic, so two executors can
+    never lease the same cluster. Clusters are created with the pool's idle
+    timeout, so the gateway reaps clusters that sit in the pool for too long.
+    """
+
+    def __init__(self, gateway, dask_profile: ClusterProfile, user_profile: UserProfile) -> None:
+        self.gateway = gateway
+        self.dask_profile = dask_profile
+        self.user_profile = user_profile
+
+        self.path = Path(dask_profile.WARM_POOL_PATH) / self.key
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def key(self) -> str:
+        """Clusters are only interchangeable within the same profile (and user)."""
+        identity = [
+            self.dask_profile.GATEWAY_URL,
+            self.dask_profile.OPENEO_EXECUTOR_IMAGE,
+            self.dask_profile.WORKER_CORES,
+            self.dask_profile.WORKER_MEMORY,
+            self.dask_profile.WORKER_LIMIT,
+        ]
+        if self.dask_profile.WARM_POOL_ISOLATION == "user":
+            identity.append(self.user_profile.OPENEO_USER_ID)
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()[:16]
+
+    def cluster_identity(self) -> tuple[str, str]:
+        """The job and user id a pooled cluster is provisioned for.
+
+        Pooled clusters outlive the job that creates them, so they are labelled
+        for the pool. Shared pools serve the jobs of every user, their clusters
+        aren't provisioned for any user.
+        """
+        job_id = f"warm-pool-{self.key}"
+        if self.dask_profile.WARM_POOL_ISOLATION == "shared":
+            return job_id, "warm-pool"
+        return job_id, self.user_profile.OPENEO_USER_ID
+
+    def _leased_record(self, name: str) -> Path:
+        return self.path / f"{name}.{self.user_profile.OPENEO_JOB_ID}.leased"
+
+    def lease(self):
+        """Lease an idle cluster from the pool, or return None when there is none."""
+        for record in sorted(self.path.glob("*.idle")):
+            name = record.name[: -len(".idle")]
+            leased = self._leased_record(name)
+            try:
+                os.rename(record, leased)
+            except FileNotFoundError:
+                # Leased by another executor in the meantime.
+                continue
+
+            cluster = None
+            try:
+                released = json.loads(leased.read_text())["released"]
+                if time.time() - released > self.dask_profile.WARM_POOL_IDLE_TIMEOUT:
+                    raise TimeoutError(f"Cluster {name} idled out.")
+
+                cluster = self.gateway.connect(name, shutdown_on_close=False)
+                if cluster.status != "running":
+                    raise RuntimeError(f"Cluster {name} is {cluster.status}.")
+                self._reset(cluster)
+            except Exception:
+                logger.info("Discarding pooled cluster %s.", name, exc_info=True)
+                leased.unlink(missing_ok=True)
+                if cluster is not None:
+                    # Otherwise it lingers until the gateway idles it out.
+                    try:
+                        cluster.shutdown()
+                    except Exception:
+                        logger.warning("Could not shut down cluster %s.", name)
+                continue
+
+            logger.info("Leased pooled dask cluster %s.", name)
+            return cluster
+        return None
+
+    def _reset(self, cluster):
+        """Clear the state left behind by the previous job."""
+        client = cluster.get_client(set_as_default=False)
+        try:
+            if (
+                self.dask_profile.WARM_POOL_RESTART_WORKERS
+                or self.dask_profile.WARM_POOL_ISOLATION == "shared"
+            ):
+                client.restart()
+            else:
+                import gc
+
+                client.run(gc.collect)
+        finally:
+            client.close()
+
+    def release(self, cluster) -> bool:
+        """Return a cluster to the pool, unless the pool is full.
+
+        Returns whether the cluster was kept. Concurrent releases may overfill
+        the pool by a cluster or two, which the idle timeout evens out.
+        """
+        if (
+            cluster.status != "running"
+            or len(list(self.path.glob("*.idle"))) >= self.dask_profile.WARM_POOL_SIZE
+        ):
+            self.discard(cluster)
+            return False
+
+        leased = self._leased_record(cluster.name)
+        tmp_record = self.path / f"{cluster.name}.tmp"
+        tmp_record.write_text(json.dumps({"released": time.time()}))
+        os.replace(tmp_record, self.path / f"{cluster.name}.idle")
+        leased.unlink(missing_ok=True)
+
+        logger.info("Returned dask cluster %s to the warm pool.", cluster.name)
+        return True
+
+    def discard(self, cluster):
+        """Drop the lease of a cluster that won't return to the pool."""
+        self._leased_record(cluster.name).unlink(missing_ok=True)
+
+
+class ClusterHandle:
+    """A dask cluster that is provisioned in the background.
+
+    Creating a gateway cluster and waiting for its first worker often takes a
+    minute (pods, image pulls). ``start`` kicks that off on a background thread,
+    so graph parsing, tiling and STAC searches can run in the meantime, and
+    ``client`` only blocks once execution actually needs the cluster.
+    """
+
+    def __init__(self, dask_profile: ClusterProfile, user_profile: UserProfile) -> None:
+        self.dask_profile = dask_profile
+        self.user_profile = user_profile
+
+        self.gateway = None
+        self.cluster = None
+        self.pool: Optional[WarmClusterPool] = None
+
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._future: Optional[Future] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cluster")
+
+    def start(self) -> "ClusterHandle":
+        if not self.dask_profile.LOCAL:
+            self._future = self._pool.submit(self._new_cluster)
+        return self
+
+    def _new_cluster(self):
+        with profiler.phase("cluster_start"):
+            Gateway = profiler.import_module("dask_gateway").Gateway
+
+            self.gateway = Gateway(self.dask_profile.GATEWAY_URL)
+
+            if self.dask_profile.warm_pool_enabled:
+                self.pool = WarmClusterPool(
+                    self.gateway, self.dask_profile, self.user_profile
+                )
+                self.cluster = self.pool.lease()
+                if self.cluster is not None:
+                    return self.cluster
+
+            options = self.gateway.cluster_options()
+
+            options.OPENEO_JOB_ID = self.user_profile.OPENEO_JOB_ID
+            options.OPENEO_USER_ID = self.user_profile.OPENEO_USER_ID
+            if self.pool is not None:
+                options.OPENEO_JOB_ID, options.OPENEO_USER_ID = (
+                    self.pool.cluster_identity()
+                )
+
+            options.IMAGE = self.dask_profile.OPENEO_EXECUTOR_IMAGE
+
+            options.WORKER_CORES = int(self.dask_profile.WORKER_CORES)
+            options.WORKER_MEMORY = int(self.dask_profile.WORKER_MEMORY)
+            options.CLUSTER_IDLE_TIMEOUT = int(self.dask_profile.CLUSTER_IDLE_TIMEOUT)
+
+            if self.pool is not None:
+                # Pooled clusters outlive the job, the gateway reaps them once
+                # they've idled for the pool's timeout.
+                options.CLUSTER_IDLE_TIMEOUT = int(
+                    self.dask_profile.WARM_POOL_IDLE_TIMEOUT
+                )
+
+            self.cluster = self.gateway.new_cluster(
+                options, shutdown_on_close=self.pool is None
+            )
+
+            # We need to initiate a cluster with at least one worker, otherwise .scatter that's used in xgboost will timeout waiting for workers
+            # See https://github.com/dask/distributed/issues/2941
+            self.cluster.adapt(minimum=1, maximum=int(self.dask_profile.WORKER_LIMIT))
+
+        logger.info("Dask cluster %s is up.", self.cluster.name)
+        return self.cluster
+
+    def client(self):
+        """Block until the cluster is up and return a client connected to it.
+
+        The client is created on the calling thread, which makes it the default
+        client for the dask computations of the process graph.
+        """
+        with self._client_lock:
+            if self._client is not None:
+                return self._client
+
+            if self.dask_profile.LOCAL:
+                from dask.distributed import worker_client
+
+                self._client = worker_client()
+                return self._client
+
+            with profiler.phase("cluster_wait"):
+                cluster = self._future.result()
+            self._client = cluster.get_client()
+            return self._client
+
+    def shutdown(self, failed: bool = False):
+        """Tear the cluster down, waiting for it first if it is still starting.
+
+        Pooled clusters go back to the pool instead, unless the job failed and
+        may have left the cluster in a bad state (e.g. workers out of memory).
+        """
+        if self._future is None:
+            return
+
+        try:
+            self._future.result()
+        except Exception:
+            logger.exception("Dask cluster failed to start.")
+        finally:
+            self._pool.shutdown(wait=False)
+
+        if self.cluster is None:
+            return
+
+        if self.pool is not None:
+            if self._client is not None:
+                self._client.close()
+            if not failed and self.pool.release(self.cluster):
+                return
+            self.pool.discard(self.cluster)
+            self.cluster.shutdown()
+            return
+
+        # Can't assume the same cluster is running post process graph execution due
+        # to sub workflows processing. If the previous cluster was closed, check for
+        # a new one!
+        if self.cluster.status == "closed":
+            cluster_list = self.gateway.list_clusters()
+            if cluster_list:
+                self.cluster = self.gateway.connect(cluster_list[0].name)
+
+        # Can call shutdown on previously closed clusters.
+        self.cluster.shutdown()
@@ -0,0 +1,376 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import pyproj
+
+from pathlib import Path
+from pydantic import BaseModel
+from typing import Literal, Optional, Union
+
+from openeo_argoworkflows_executor.profiling import profiler
+from openeo_argoworkflows_executor.stac_api import open_catalog
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached profile is used before it is derived again, so that changes
+# to a collection's metadata are picked up eventually.
+PROFILE_TTL = 24 * 3600
+
+# Upper bound of the chunking hint, the default chunk size of loaded data.
+MAX_CHUNK_HINT = 2048
+
+# The item properties a CRS is read from, in the order they are tried.
+CRS_STRATEGIES = ("proj:wkt2", "proj:code", "proj:epsg", "grid:code")
+
+_MGRS_PATTERN = re.compile(r"MGRS-(\d{1,2})([C-X])", re.IGNORECASE)
+_RESOLUTION_PATTERN = re.compile(r"_(\d+)m\.")
+
+
+class CollectionProfile(BaseModel):
+    """The raster metadata load_collection needs about a collection.
+
+    Derived once from an item of the collection and cached. The CRS is cached
+    as the strategy to read it from an item, as items of one collection can
+    sit in different (e.g. UTM) zones.
+    """
+
+    crs_strategy: Literal["proj:wkt2", "proj:code", "proj:epsg", "grid:code", "fixed"]
+    crs: Optional[str] = None
+    """The CRS of the collection, only for the fixed strategy."""
+    collection_crs: Optional[str] = None
+    """The CRS the collection publishes, for items that don't have their own."""
+    resolution: Union[int, float]
+    dtype: Optional[str] = None
+    nodata: Optional[Union[int, float]] = None
+    bands: list[str] = []
+    data_bands: list[str] = []
+    """The assets holding raster data, without e.g. thumbnails and metadata."""
+    chunk_size: Optional[int] = None
+    """Chunking hint, the edge of an item's raster when it is below the default."""
+    block_size: Optional[int] = None
+    """Internal block (tile) edge of the source COGs, when known."""
+
+    def item_crs(self, item) -> pyproj.CRS:
+        """The CRS of an item of the collection.
+
+        Items that lack the property of the collection's strategy are tried
+        with the other strategies, then get the CRS of the collection.
+        """
+        if self.crs_strategy == "fixed":
+            return pyproj.CRS.from_user_input(self.crs)
+
+        strategies = [self.crs_strategy] + [
+            strategy for strategy in CRS_STRATEGIES if strategy != self.crs_strategy
+        ]
+        for strategy in strategies:
+            crs = _item_crs(strategy, item)
+            if crs is not None:
+                return crs
+
+        if self.collection_crs is not None:
+            return pyproj.CRS.from_user_input(self.collection_crs)
+        raise ValueError(
+            f"Could not determine the CRS of item {item.id}: it has none of "
+            f"{', '.join(CRS_STRATEGIES)} and its collection publishes no CRS."
+        )
+
+
+def _item_crs(crs_strategy: str, item) -> Optional[pyproj.CRS]:
+    """The CRS of an item read with a strategy, None when it doesn't apply."""
+    if crs_strategy == "grid:code":
+        return _mgrs_crs(item.properties.get("grid:code") or "")
+
+    value = item.properties.get(crs_strategy)
+    if value is None:
+        return None
+    try:
+        if crs_strategy == "proj:wkt2":
+            return pyproj.CRS.from_wkt(value)
+        if crs_strategy == "proj:epsg":
+            return pyproj.CRS.from_epsg(value)
+        # Projection extension v2, pystac migrates proj:epsg to it.
+        return pyproj.CRS.from_user_input(value)
+    except pyproj.exceptions.CRSError:
+        logger.warning("Ignoring the invalid %s of item %s", crs_strategy, item.id)
+        return None
+
+
+def _single(values) -> Optional[object]:
+    if isinstance(values, (list, tuple)):
+        return values[0] if len(values) == 1 else None
+    return values
+
+
+def collection_crs(collection) -> Optional[pyproj.CRS]:
+    """The CRS a collection publishes for all its items, if any.
+
+    Read from its proj:* fields or single valued summaries, the reference
+    system of its x dimension, or its (single) crs.
+    """
+    fields = collection.extra_fields
+    summaries = collection.summaries.to_dict() if collection.summaries else {}
+    candidates = [
+        _single(source.get(key))
+        for key in ("proj:wkt2", "proj:code", "proj:epsg")
+        for source in (fields, summaries)
+    ]
+    candidates.append(
+        fields.get("cube:dimensions", {}).get("x", {}).get("reference_system")
+    )
+    candidates.extend(_single(fields.get(key)) for key in ("storageCrs", "crs"))
+
+    for candidate in candidates:
+        if candidate is None:
+            continue
+        try:
+            return pyproj.CRS.from_user_input(candidate)
+        except pyproj.exceptions.CRSError:
+            logger.warning(
+                "Ignoring the invalid CRS %r of collection %s", candidate, collection.id
+            )
+    return None
+
+
+def _mgrs_crs(grid_code: str) -> Optional[pyproj.CRS]:
+    """The UTM CRS of an MGRS grid code, e.g. MGRS-33UWP."""
+    mgrs_match = _MGRS_PATTERN.match(grid_code)
+    if not mgrs_match:
+        return None
+    zone = int(mgrs_match.group(1))
+    band_letter = mgrs_match.group(2).upper()
+    epsg = 32600 + zone if band_letter >= "N" else 32700 + zone
+    return pyproj.CRS.from_epsg(epsg)
+
+
+def _href_resolution(item) -> Optional[int]:
+    """Parse the resolution from an asset href suffix (e.g. B04_10m.jp2)."""
+    for asset in item.get_assets().values():
+        m = _RESOLUTION_PATTERN.search(asset.href or "")
+        if m:
+            return int(m.group(1))
+    # Check alternate origin hrefs
+    for asset in item.get_assets().values():
+        alt_href = (
+            asset.extra_fields.get("alternate", {}).get("origin", {}).get("href", "")
+        )
+        m = _RESOLUTION_PATTERN.search(alt_href)
+        if m:
+            return int(m.group(1))
+    return None
+
+
+def _cog_block_size(item) -> Optional[int]:
+    """The internal block edge of an item's first GeoTIFF asset.
+
+    Reads the header of a single file, which is cached with the profile.
+    """
+    href = next(
+        (
+            asset.href
+            for asset in item.get_assets().values()
+            if (asset.href or "").lower().endswith((".tif", ".tiff"))
+        ),
+        None,
+    )
+    if href is None:
+        return None
+
+    try:
+        rasterio = profiler.import_module("rasterio")
+        with rasterio.open(href) as src:
+            if not src.is_tiled:
+                return None
+            return int(src.block_shapes[0][0])
+    except Exception:
+        logger.info("Could not read the block size of %s", href)
+        return None
+
+
+def _data_bands(item) -> list[str]:
+    """The assets of an item that hold raster data."""
+    return [
+        key
+        for key, asset in item.get_assets().items()
+        if "raster:bands" in asset.extra_fields or "data" in (asset.roles or [])
+    ]
+
+
+def derive_collection_profile(item, collection=None) -> CollectionProfile:
+    """Derive the profile of a collection from one of its items.
+
+    The collection itself, when given, provides the CRS of items without one.
+    """
+    raster = profiler.import_module("pystac.extensions.raster")
+    fallback_crs = collection_crs(collection) if collection is not None else None
+
+    crs = None
+    crs_strategy = "fixed"
+    resolution = None
+    nodata = None
+    dtype = None
+
+    if "proj:wkt2" in item.properties.keys():
+        crs_strategy = "proj:wkt2"
+    elif item.properties.get("proj:code"):
+        crs_strategy = "proj:code"
+    elif "proj:epsg" in item.properties.keys():
+        crs_strategy = "proj:epsg"
+
+    if crs_strategy != "fixed":
+        crs = _item_crs(crs_strategy, item)
+
+    if raster.RasterExtension.has_extension(item):
+        for asset in item.get_assets().values():
+            if "raster:bands" in asset.extra_fields.keys():
+                for band in asset.extra_fields["raster:bands"]:
+                    if "spatial_resolution" in band:
+                        resolution = band["spatial_resolution"]
+                    if "nodata" in band:
+                        nodata = band["nodata"]
+                    if "data_type" in band:
+                        dtype = band["data_type"]
+            if resolution and nodata and dtype:
+                break
+    elif crs is not None:
+        crs_measurement = crs.axis_info[0].unit_name
+
+        if crs_measurement == "metre":
+            resolution = 10
+        elif crs_measurement == "degree":
+            resolution = 0.0009
+
+    # Fallback for catalogues that publish no proj/raster extensions (e.g. HDA).
+    # Try grid:code MGRS → UTM EPSG, then the collection's CRS, then parse
+    # resolution from asset href suffix.
+    if crs is None:
+        crs = _mgrs_crs(item.properties.get("grid:code") or "")
+        if crs is not None:
+            crs_strategy = "grid:code"
+        else:
+            crs_strategy = "fixed"
+            crs = fallback_crs or pyproj.CRS.from_epsg(4326)
+
+    if resolution is None:
+        resolution = _href_resolution(item)
+        if resolution is None:
+            crs_unit = crs.axis_info[0].unit_name if crs else "degree"
+            resolution = 10 if crs_unit == "metre" else 0.0001
+
+    # TODO Need to ensure nodata belongs to the dtype
+    if dtype and "int" in dtype and isinstance(nodata, float):
+        nodata = int(nodata)
+
+    shapes = [
+        asset.extra_fields["proj:shape"]
+        for asset in item.get_assets().values()
+        if "proj:shape" in asset.extra_fields
+    ] or ([item.properties["proj:shape"]] if "proj:shape" in item.properties else [])
+    chunk_size = None
+    if shapes:
+        edge = max(max(shape) for shape in shapes)
+        if edge < MAX_CHUNK_HINT:
+            chunk_size = int(edge)
+
+    return CollectionProfile(
+        crs_strategy=crs_strategy,
+        crs=crs.to_wkt() if crs_strategy == "fixed" else None,
+        collection_crs=fallback_crs.to_wkt() if fallback_crs is not None else None,
+        resolution=resolution,
+        dtype=dtype,
+        nodata=nodata,
+        bands=list(item.get_assets().keys()),
+        data_bands=_data_bands(item),
+        chunk_size=chunk_size,
+        block_size=_cog_block_size(item),
+    )
+
+
+def _get_collection(collection_id: str):
+    """The collection from the STAC API, None when it can't be fetched."""
+    try:
+        return open_catalog().get_collection(collection_id)
+    except Exception:
+        logger.info("Could not fetch collection %s", collection_id)
+        return None
+
+
+class CollectionProfileCache:
+    """Collection profiles cached in memory and, optionally, on disk.
+
+    The disk cache lives under OPENEO_CACHE_ROOT, which is shared by the
+    executors of all jobs, so a collection is only profiled once per TTL.
+    """
+
+    def __init__(self, cache_root: Optional[Path], ttl: int = PROFILE_TTL) -> None:
+        self.path = Path(cache_root) / "collection_profiles" if cache_root else None
+        self.ttl = ttl
+        self._profiles: dict[str, tuple[float, CollectionProfile]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stac_api_url: str, collection_id: str) -> str:
+        return hashlib.sha256(f"{stac_api_url}|{collection_id}".encode()).hexdigest()
+
+    def _fresh(self, created: float) -> bool:
+        return time.time() - created < self.ttl
+
+    def _read(self, key: str) -> Optional[tuple[float, CollectionProfile]]:
+        if self.path is None:
+            return None
+        try:
+            with open(self.path / f"{key}.json") as f:
+                cached = json.load(f)
+            return cached["created"], CollectionProfile(**cached["profile"])
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable collection profile %s", key)
+            return None
+
+    def _write(self, key: str, created: float, profile: CollectionProfile):
+        if self.path is None:
+            return
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            # Written aside and renamed, so concurrent executors never read a
+            # partial profile.
+            tmp_path = self.path / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"created": created, "profile": profile.model_dump()}, f)
+            os.replace(tmp_path, self.path / f"{key}.json")
+        except OSError:
+            logger.warning("Could not cache the collection profile %s", key)
+
+    def get(self, stac_api_url: str, collection_id: str, item) -> CollectionProfile:
+        """The profile of a collection, derived from item when none is cached."""
+        key = self.key(stac_api_url, collection_id)
+
+        with self._lock:
+            cached = self._profiles.get(key)
+        if cached is None or not self._fresh(cached[0]):
+            cached = self._read(key)
+
+        if cached is not None and self._fresh(cached[0]):
+            created, profile = cached
+        else:
+            logger.info("Deriving the raster profile of collection %s", collection_id)
+            created = time.time()
+            profile = derive_collection_profile(item, _get_collection(collection_id))
+            self._write(key, created, profile)
+
+        with self._lock:
+            self._profiles[key] = (created, profile)
+        return profile
+
+
+@functools.lru_cache(maxsize=None)
+def get_profile_cache() -> CollectionProfileCache:
+    """The profile cache of this executor, on disk when OPENEO_CACHE_ROOT is set."""
+    cache_root = os.environ.get("OPENEO_CACHE_ROOT")
+    return CollectionProfileCache(Path(cache_root) if cache_root else None)
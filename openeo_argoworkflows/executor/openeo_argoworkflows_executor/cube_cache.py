@@ -0,0 +1,375 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from typing import Any, NamedTuple, Optional
+
+from openeo_argoworkflows_executor.distributed_io import distributed_io_enabled
+from openeo_argoworkflows_executor.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached cube is served after it was written.
+CUBE_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Cubes above this share of the cache size aren't cached, as they would evict
+# most of the cache.
+MAX_ENTRY_SHARE = 0.25
+
+# Seconds after its last access an entry is kept through size based eviction,
+# as jobs that opened it may still be reading its chunks.
+EVICTION_GRACE = 3600
+
+# Seconds after which the staging directory of a write that never finished is
+# removed.
+STAGING_TTL = 24 * 3600
+
+META_FILE = "meta.json"
+CUBE_STORE = "cube.zarr"
+STAGING_SUFFIX = ".staging"
+
+
+def cube_key(**parts) -> str:
+    """Content address of a loaded cube, from everything that determines it."""
+    serialised = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialised.encode()).hexdigest()
+
+
+class PendingWrite(NamedTuple):
+    """A cube staged for the cache, written when the job computes its results."""
+
+    key: str
+    staging: str
+    bands: list
+    write: Any
+    """The delayed Zarr write of the cube's chunks into staging."""
+
+
+class CubeCache:
+    """Loaded data cubes shared by the jobs of all users, stored as Zarr.
+
+    Every entry is a directory holding the cube as a Zarr store and a metadata
+    file, which is written last, so entries without one are incomplete and
+    ignored. Cubes are written into a staging directory of their own and moved
+    into place when complete, so readers never see chunks being written or
+    replaced. Entries are evicted when older than max_age, and least recently
+    used first once the cache outgrows max_bytes.
+
+    Missed cubes aren't computed when they are loaded: their writes are staged
+    per thread (a tile runs in one thread) and computed by save_result along
+    with the results, so their chunks are only read once.
+    """
+
+    def __init__(
+        self, url: str, max_bytes: int, max_age: int = CUBE_CACHE_MAX_AGE
+    ) -> None:
+        fsspec = profiler.import_module("fsspec")
+        self.fs, root = fsspec.core.url_to_fs(url)
+        if "file" in self.fs.protocol:
+            # Zarr writes its chunks into nested directories.
+            self.fs = fsspec.filesystem("file", auto_mkdir=True)
+        self.root = root.rstrip("/")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._pending = threading.local()
+
+    @property
+    def _local(self) -> bool:
+        return "file" in self.fs.protocol
+
+    def _path(self, key: str, name: Optional[str] = None) -> str:
+        return f"{self.root}/{key}/{name}" if name else f"{self.root}/{key}"
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads(self.fs.cat_file(self._path(key, META_FILE)))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable cube cache entry %s", key)
+            return None
+
+    def _write_meta(self, key: str, meta: dict):
+        self.fs.pipe_file(self._path(key, META_FILE), json.dumps(meta).encode())
+
+    def _fresh(self, meta: Optional[dict]) -> bool:
+        return meta is not None and time.time() - meta["created"] <= self.max_age
+
+    def _remove_path(self, path: str):
+        try:
+            self.fs.rm(path, recursive=True)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not remove %s from the cube cache", path)
+
+    def _remove(self, key: str):
+        try:
+            # Without its metadata the entry is no longer opened.
+            self.fs.rm(self._path(key, META_FILE))
+        except FileNotFoundError:
+            pass
+        self._remove_path(self._path(key))
+
+    def _staging_path(self, key: str) -> str:
+        # The creation time lets evict clean up after writers that died.
+        return (
+            f"{self.root}/{key}.{int(time.time())}.{uuid.uuid4().hex}{STAGING_SUFFIX}"
+        )
+
+    def _publish(self, staging: str, key: str, meta: dict) -> bool:
+        """Move a staged entry into place, False when another writer won.
+
+        Local entries are renamed with their metadata, which is atomic and
+        fails onto an existing entry. Object stores have no rename, their
+        chunks are copied before the metadata is written. Entries are content
+        addressed, so concurrent writers copy the same chunks.
+        """
+        if self._local:
+            self.fs.pipe_file(f"{staging}/{META_FILE}", json.dumps(meta).encode())
+            try:
+                os.rename(staging, self._path(key))
+            except OSError:
+                return False
+            return True
+
+        self.fs.mv(staging, self._path(key), recursive=True)
+        self._write_meta(key, meta)
+        return True
+
+    def _modified(self, path: str) -> Optional[float]:
+        try:
+            modified = self.fs.info(path).get("mtime")
+        except (FileNotFoundError, OSError):
+            return None
+        return float(modified) if modified is not None else None
+
+    def usable(self) -> bool:
+        """Whether whoever computes the cube's chunks can reach the cache.
+
+        Local paths are only reachable by the dask workers when they mount
+        the workspace, which profiles with distributed IO guarantee.
+        """
+        if not self._local:
+            return True
+        try:
+            from dask.distributed import get_client
+
+            get_client()
+        except (ImportError, ValueError):
+            return True
+        return distributed_io_enabled()
+
+    def _open(self, key: str, meta: dict, chunks: dict):
+        xr = profiler.import_module("xarray")
+        ds = xr.open_zarr(
+            self.fs.get_mapper(self._path(key, CUBE_STORE)),
+            chunks=chunks,
+            consolidated=True,
+        )
+        return ds[meta["bands"]].to_array(dim="bands")
+
+    def open(self, key: str, chunks: dict):
+        """The cached cube of key, or None on a miss.
+
+        Hits and misses are recorded in the run profile, for the hit rate.
+        """
+        start = time.perf_counter()
+        meta = self._read_meta(key)
+        if not self._fresh(meta):
+            profiler.record("cube_cache_miss", time.perf_counter() - start)
+            return None
+
+        try:
+            cube = self._open(key, meta, chunks)
+            self._write_meta(key, {**meta, "last_access": time.time()})
+        except Exception:
+            logger.warning("Could not open cube cache entry %s", key, exc_info=True)
+            profiler.record("cube_cache_miss", time.perf_counter() - start, True)
+            return None
+
+        logger.info("Loading the cube from the cube cache entry %s", key)
+        profiler.record("cube_cache_hit", time.perf_counter() - start)
+        return cube
+
+    def _open_stored(self, key: str, cube, chunks: dict):
+        """The entry another job stored for key, else cube itself."""
+        meta = self._read_meta(key)
+        if not self._fresh(meta):
+            return cube
+        try:
+            return self._open(key, meta, chunks)
+        except Exception:
+            logger.warning("Could not open cube cache entry %s", key, exc_info=True)
+            return cube
+
+    def _pending_writes(self) -> list[PendingWrite]:
+        if not hasattr(self._pending, "writes"):
+            self._pending.writes = []
+        return self._pending.writes
+
+    def store(self, key: str, cube, chunks: dict):
+        """Stage cube to be written into the cache and return it, still lazy.
+
+        The write is computed together with the job's results, see
+        take_pending and publish. When another job stored the same key, its
+        entry is returned instead.
+        """
+        if cube.nbytes > self.max_bytes * MAX_ENTRY_SHARE:
+            logger.info("Not caching a cube of %s bytes, it is too large.", cube.nbytes)
+            return cube
+        if self._fresh(self._read_meta(key)):
+            return self._open_stored(key, cube, chunks)
+        pending = self._pending_writes()
+        if any(write.key == key for write in pending):
+            return cube
+
+        bands = [str(band) for band in cube["bands"].values]
+        staging = self._staging_path(key)
+        try:
+            # Only the Zarr metadata is written here, the chunks when the
+            # write is computed.
+            write = cube.to_dataset(dim="bands").to_zarr(
+                self.fs.get_mapper(f"{staging}/{CUBE_STORE}"),
+                mode="w",
+                consolidated=True,
+                compute=False,
+            )
+        except Exception:
+            logger.warning("Could not cache the cube as %s", key, exc_info=True)
+            self._remove_path(staging)
+            return cube
+
+        pending.append(PendingWrite(key, staging, bands, write))
+        return cube
+
+    def take_pending(self) -> list[PendingWrite]:
+        """The writes staged by this thread, which are no longer pending."""
+        pending = self._pending_writes()
+        self._pending.writes = []
+        return pending
+
+    def discard(self, pending: list[PendingWrite]):
+        """Drop staged writes that won't be computed."""
+        for write in pending:
+            self._remove_path(write.staging)
+
+    def publish(self, pending: list[PendingWrite]):
+        """Move the computed writes into place as cache entries.
+
+        Writes of keys another job stored meanwhile are dropped.
+        """
+        for write in pending:
+            start = time.perf_counter()
+            try:
+                now = time.time()
+                meta = {
+                    "created": now,
+                    "last_access": now,
+                    "bytes": self.fs.du(write.staging),
+                    "bands": write.bands,
+                }
+
+                existing = self._read_meta(write.key)
+                if self._fresh(existing):
+                    self._remove_path(write.staging)
+                    continue
+                if existing is not None:
+                    self._remove(write.key)
+                if not self._publish(write.staging, write.key, meta):
+                    logger.info(
+                        "Another job stored cube cache entry %s first", write.key
+                    )
+                    self._remove_path(write.staging)
+                    continue
+            except Exception:
+                logger.warning(
+                    "Could not cache the cube as %s", write.key, exc_info=True
+                )
+                self._remove_path(write.staging)
+                continue
+            profiler.record("cube_cache_store", time.perf_counter() - start)
+
+        if pending:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries, then the least recently used over max_bytes."""
+        now = time.time()
+        try:
+            names = [
+                path.rstrip("/").rsplit("/", 1)[-1]
+                for path in self.fs.ls(self.root, detail=False)
+            ]
+        except FileNotFoundError:
+            return
+
+        keys = []
+        for name in names:
+            if not name.endswith(STAGING_SUFFIX):
+                keys.append(name)
+                continue
+            try:
+                started = int(name.split(".")[1])
+            except (IndexError, ValueError):
+                continue
+            if now - started > STAGING_TTL:
+                logger.info("Removing the abandoned cube cache write %s", name)
+                self._remove_path(f"{self.root}/{name}")
+
+        entries = []
+        for key in keys:
+            meta = self._read_meta(key)
+            if meta is not None:
+                entries.append((key, meta))
+                continue
+            # Elsewhere entries without metadata are still being written, local
+            # ones are published with theirs and left by interrupted removals.
+            modified = self._modified(self._path(key)) if self._local else None
+            if modified is not None and now - modified > STAGING_TTL:
+                logger.info("Removing the incomplete cube cache entry %s", key)
+                self._remove_path(self._path(key))
+
+        evicted = [key for key, meta in entries if not self._fresh(meta)]
+        live = sorted(
+            (entry for entry in entries if entry[0] not in evicted),
+            key=lambda entry: entry[1]["last_access"],
+        )
+        total = sum(meta["bytes"] for _, meta in live)
+        for key, meta in live:
+            if total <= self.max_bytes:
+                break
+            if now - meta["last_access"] < EVICTION_GRACE:
+                continue
+            evicted.append(key)
+            total -= meta["bytes"]
+
+        for key in evicted:
+            logger.info("Evicting cube cache entry %s", key)
+            self._remove(key)
+
+
+@functools.lru_cache(maxsize=None)
+def get_cube_cache() -> Optional[CubeCache]:
+    """The shared cube cache, when OPENEO_CUBE_CACHE_MAX_GB enables it.
+
+    It lives at OPENEO_CUBE_CACHE_URL (a path or e.g. an s3:// URL), by
+    default under OPENEO_CACHE_ROOT.
+    """
+    max_gb = os.environ.get("OPENEO_CUBE_CACHE_MAX_GB")
+    url = os.environ.get("OPENEO_CUBE_CACHE_URL")
+    if url is None and os.environ.get("OPENEO_CACHE_ROOT"):
+        url = os.path.join(os.environ["OPENEO_CACHE_ROOT"], "cubes")
+    if not max_gb or url is None:
+        return None
+
+    return CubeCache(
+        url,
+        max_bytes=int(float(max_gb) * 2**30),
+        max_age=int(os.environ.get("OPENEO_CUBE_CACHE_MAX_AGE", CUBE_CACHE_MAX_AGE)),
+    )
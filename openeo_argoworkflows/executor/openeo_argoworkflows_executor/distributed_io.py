@@ -0,0 +1,96 @@
+import logging
+import os
+
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Environment the IO processes read (STAC, S3/icechunk and EODAG credentials,
+# the job workspace). Forwarded to the worker that runs a function, as the
+# gateway workers are started without the executor's environment.
+FORWARDED_ENV_PREFIXES = ("OPENEO_", "STAC_API_", "AWS_", "EODAG__", "ICECHUNK_")
+
+
+def distributed_io_enabled() -> bool:
+    """Whether the dask profile opted into running IO on the cluster."""
+    return os.environ.get("OPENEO_DISTRIBUTED_IO", "").lower() in ("1", "true")
+
+
+def get_client():
+    """The dask client of the job, or None when distributed IO is disabled.
+
+    Distributed IO needs the workers to mount the job workspace at the same
+    path as the executor, so it is opt-in through the DISTRIBUTED_IO key of the
+    dask profile.
+    """
+    if not distributed_io_enabled():
+        return None
+
+    from dask.distributed import get_client as _get_client
+
+    try:
+        return _get_client()
+    except ValueError:
+        logger.warning("Distributed IO is enabled, but there is no dask client.")
+        return None
+
+
+def _call_with_env(env: dict, func: Callable, args: tuple, kwargs: dict) -> Any:
+    # Workers run the tasks of other jobs and users after this one, so the
+    # forwarded credentials must not outlive the call.
+    previous = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def run_on_cluster(func: Callable, *args, **kwargs) -> Any:
+    """Run func on a dask worker and return its result.
+
+    The result is pickled back to the caller, so this only saves executor
+    memory for functions that return lazy (dask backed) objects. Falls back to
+    calling func locally when distributed IO is disabled.
+    """
+    client = get_client()
+    if client is None:
+        return func(*args, **kwargs)
+
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key.startswith(FORWARDED_ENV_PREFIXES)
+    }
+    future = client.submit(_call_with_env, env, func, args, kwargs, pure=False)
+    try:
+        return future.result()
+    finally:
+        future.release()
+
+
+def compute_on_cluster(*collections, client: Optional[Any] = None) -> tuple:
+    """Compute dask collections through the job's client.
+
+    Unlike relying on the default scheduler, this also works from threads that
+    didn't create the client (e.g. when tiles run in parallel). Without an
+    explicit client and with distributed IO disabled, dask.compute runs them on
+    the default scheduler, which is still the job's cluster when the executor
+    connected to one.
+    """
+    client = client or get_client()
+    if client is None:
+        import dask
+
+        return dask.compute(*collections)
+
+    futures = client.compute(list(collections))
+    try:
+        return tuple(client.gather(futures))
+    finally:
+        for future in futures:
+            future.release()
@@ -0,0 +1,262 @@
+import contextlib
+import fcntl
+import functools
+import json
+import logging
+import os
+import shutil
+import time
+
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Leases of executors that died without releasing them expire after this many
+# seconds.
+LEASE_TTL = 48 * 3600
+
+LEASES_DIR = ".leases"
+LOCK_FILE = ".lock"
+INDEX_FILE = ".index.json"
+
+# Evicted products are renamed with this prefix under the lock and deleted
+# after it is released.
+EVICTING_PREFIX = ".evicting-"
+
+
+def _product_size(path: Path) -> int:
+    """Size in bytes of a downloaded product."""
+    if not path.is_dir() or path.is_symlink():
+        try:
+            return path.lstat().st_size
+        except FileNotFoundError:
+            return 0
+
+    size = 0
+    for file in path.rglob("*"):
+        try:
+            if file.is_file():
+                size += file.lstat().st_size
+        except FileNotFoundError:
+            continue
+    return size
+
+
+def _remove_product(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+class DownloadCache:
+    """Products downloaded by the dedl loader, shared by the jobs of all users.
+
+    The loader downloads into the eodag_download directory of the job
+    workspace, which links here, and EODAG skips products it finds already
+    downloaded. An index records the size, time added and time of last use of
+    every product, so the cache is never rescanned as a whole.
+
+    Running jobs hold a lease, which pins the products present when the job
+    started, as the job may find and read any of them. Products added while a
+    job runs are pinned too, the job may have found or downloaded them. Once
+    the cache outgrows max_bytes, unpinned products are evicted least recently
+    used first when a job takes or releases its lease.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialise leases and eviction across executors."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _lease_path(self, job_id: str) -> Path:
+        return self.root / LEASES_DIR / f"{job_id}.json"
+
+    def _products(self) -> list[str]:
+        return [
+            path.name for path in self.root.iterdir() if not path.name.startswith(".")
+        ]
+
+    def _read_index(self) -> dict:
+        try:
+            return json.loads((self.root / INDEX_FILE).read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning("Rebuilding the unreadable download cache index.")
+            return {}
+
+    def _write_index(self, index: dict):
+        # Written aside and renamed, a crash never leaves a partial index.
+        tmp_path = self.root / f"{INDEX_FILE}.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(index))
+        os.replace(tmp_path, self.root / INDEX_FILE)
+
+    def _read_lease(self, lease_path: Path) -> Optional[dict]:
+        try:
+            return json.loads(lease_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _live_leases(self) -> list[dict]:
+        leases = []
+        for lease_path in (self.root / LEASES_DIR).glob("*.json"):
+            lease = self._read_lease(lease_path)
+            if lease is None or "acquired" not in lease:
+                continue
+            if time.time() - lease["acquired"] > LEASE_TTL:
+                logger.info("Removing the expired lease %s", lease_path.name)
+                lease_path.unlink(missing_ok=True)
+                continue
+            leases.append(lease)
+        return leases
+
+    def acquire(self, job_id: str):
+        """Take a lease for a job, for as long as it may read products.
+
+        Makes room for the job's downloads first.
+        """
+        with self._locked():
+            products = self._products()
+            index = self._read_index()
+            evicting = self._evict(index, products, self._live_leases())
+            self._write_index(index)
+
+            lease_path = self._lease_path(job_id)
+            lease_path.parent.mkdir(parents=True, exist_ok=True)
+            lease_path.write_text(
+                json.dumps(
+                    {
+                        "acquired": time.time(),
+                        "products": [
+                            product for product in products if product not in evicting
+                        ],
+                    }
+                )
+            )
+        self._delete_evicted()
+
+    def release(self, job_id: str):
+        """Release the lease of a job, index its downloads and evict."""
+        lease_path = self._lease_path(job_id)
+        with self._locked():
+            lease = self._read_lease(lease_path) or {}
+            acquired = lease.get("acquired", time.time())
+            index = self._read_index()
+            # Products added during the lease may have been sized while they
+            # were still being downloaded, they are sized again.
+            unsized = [
+                product
+                for product in self._products()
+                if product not in index or index[product]["added"] >= acquired
+            ]
+
+        sizes = {product: _product_size(self.root / product) for product in unsized}
+
+        with self._locked():
+            now = time.time()
+            products = self._products()
+            index = self._read_index()
+            for product, size in sizes.items():
+                entry = index.get(product, {"added": now})
+                index[product] = {**entry, "bytes": size, "last_used": now}
+            for product in lease.get("products", []):
+                if product in index:
+                    index[product]["last_used"] = now
+
+            lease_path.unlink(missing_ok=True)
+            self._evict(index, products, self._live_leases())
+            self._write_index(index)
+        self._delete_evicted()
+
+    def _evict(self, index: dict, products: list, leases: list) -> list[str]:
+        """Evict from index what no longer fits, returning the evicted products.
+
+        Products are only renamed here, they are deleted by _delete_evicted
+        once the lock is released.
+        """
+        present = set(products)
+        for product in list(index):
+            if product not in present:
+                del index[product]
+
+        total = sum(entry["bytes"] for entry in index.values())
+        if total <= self.max_bytes:
+            return []
+
+        oldest_lease = min((lease["acquired"] for lease in leases), default=None)
+        pinned = {product for lease in leases for product in lease.get("products", [])}
+        candidates = sorted(
+            (
+                (product, entry)
+                for product, entry in index.items()
+                if product not in pinned
+                and (oldest_lease is None or entry["added"] < oldest_lease)
+            ),
+            key=lambda candidate: candidate[1]["last_used"],
+        )
+
+        evicting = []
+        for product, entry in candidates:
+            if total <= self.max_bytes:
+                break
+            logger.info(
+                "Evicting downloaded product %s (%s bytes)", product, entry["bytes"]
+            )
+            target = self.root / f"{EVICTING_PREFIX}{product}"
+            try:
+                os.rename(self.root / product, target)
+            except FileNotFoundError:
+                pass
+            else:
+                evicting.append(product)
+            del index[product]
+            total -= entry["bytes"]
+
+        if total > self.max_bytes:
+            logger.warning(
+                "The download cache holds %s bytes, products in use keep it above "
+                "its limit of %s bytes.",
+                total,
+                self.max_bytes,
+            )
+        return evicting
+
+    def _delete_evicted(self):
+        """Delete evicted products, also those of executors that died first."""
+        for path in self.root.glob(f"{EVICTING_PREFIX}*"):
+            _remove_product(path)
+
+
+def link_download_directory(download_directory: Path, cache: DownloadCache):
+    """Point a job's download directory at the shared cache."""
+    if download_directory.is_symlink():
+        download_directory.unlink()
+    elif download_directory.is_dir():
+        # Left behind by an earlier attempt of the job.
+        shutil.rmtree(download_directory, ignore_errors=True)
+    download_directory.parent.mkdir(parents=True, exist_ok=True)
+    download_directory.symlink_to(cache.root, target_is_directory=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_download_cache() -> Optional[DownloadCache]:
+    """The shared download cache, when OPENEO_DOWNLOAD_CACHE_MAX_GB enables it."""
+    max_gb = os.environ.get("OPENEO_DOWNLOAD_CACHE_MAX_GB")
+    cache_root = os.environ.get("OPENEO_CACHE_ROOT")
+    if not max_gb or not cache_root:
+        return None
+    return DownloadCache(
+        Path(cache_root) / "eodag_download", max_bytes=int(float(max_gb) * 2**30)
+    )
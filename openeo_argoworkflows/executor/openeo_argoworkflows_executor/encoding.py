@@ -0,0 +1,305 @@
+import numpy as np
+import xarray as xr
+
+from typing import Optional
+
+from openeo_argoworkflows_executor.profiling import profiler
+
+# Compression defaults per class of dtype. Byte data compresses well and
+# cheaply, wider integers gain most from byte shuffling, and floats barely
+# shrink further at higher levels, so they get a fast one.
+DEFAULT_COMPRESSION = {
+    "byte": {"complevel": 6, "shuffle": False},
+    "int": {"complevel": 4, "shuffle": True},
+    "float": {"complevel": 2, "shuffle": True},
+}
+
+# Attributes that describe the on-disk encoding, they move into the encoding.
+ENCODING_ATTRS = ("_FillValue", "missing_value", "nodata", "scale_factor", "add_offset")
+
+TIME_DIMS = ("t", "time")
+
+SPATIAL_DIMS = (("y", "x"), ("lat", "lon"), ("latitude", "longitude"))
+
+# Target chunk shape of the layouts a result can be stored in, selected through
+# the layout option. Clients read results back with HTTP range requests, so a
+# chunk should hold what a typical read needs and little else:
+# "time" (time-major) keeps a single timestep in wide spatial chunks, for maps
+# of a date; "space" (space-major) keeps many timesteps in narrow spatial
+# chunks, for time series of a location.
+LAYOUTS = {
+    "time": {"time": 1, "space": 512},
+    "space": {"time": 64, "space": 128},
+}
+DEFAULT_LAYOUT = "time"
+
+
+def dtype_class(dtype) -> str:
+    dtype = np.dtype(dtype)
+    if dtype.itemsize == 1:
+        return "byte"
+    return "float" if dtype.kind == "f" else "int"
+
+
+def output_dtype(var: xr.DataArray, options: dict) -> np.dtype:
+    """The requested dtype, or the variable's own."""
+    if options.get("dtype"):
+        return np.dtype(options["dtype"])
+    if var.dtype == bool:
+        return np.dtype("uint8")
+    return var.dtype
+
+
+def _fits(value, dtype: np.dtype) -> bool:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return False
+    if dtype.kind == "f":
+        return True
+    if not np.isfinite(value) or value != int(value):
+        return False
+    info = np.iinfo(dtype)
+    return info.min <= value <= info.max
+
+
+def nodata_value(var: xr.DataArray, dtype: np.dtype, options: dict):
+    """The nodata value of a variable written as dtype.
+
+    Taken from the options, else from the variable's encoding or attributes.
+    Floats cast to integers need one for their NaNs, so they get the extreme
+    value of the integer type when none fits.
+    """
+    candidates = [options.get("nodata")] + [
+        source.get(key)
+        for source in (var.encoding, var.attrs)
+        for key in ("_FillValue", "nodata", "missing_value")
+    ]
+    for candidate in candidates:
+        if candidate is not None and _fits(candidate, dtype):
+            return candidate
+
+    if dtype.kind in "iu" and var.dtype.kind == "f":
+        info = np.iinfo(dtype)
+        return info.max if dtype.kind == "u" else info.min
+    return None
+
+
+def _scaling(var: xr.DataArray, dtype: np.dtype, options: dict) -> dict:
+    """CF packing parameters, from the options or kept from the source encoding."""
+    if "scale_factor" in options or "add_offset" in options:
+        return {
+            key: float(options[key])
+            for key in ("scale_factor", "add_offset")
+            if key in options
+        }
+    if dtype.kind in "iu" and var.encoding.get("dtype") == dtype:
+        return {
+            key: var.encoding[key]
+            for key in ("scale_factor", "add_offset")
+            if key in var.encoding
+        }
+    return {}
+
+
+def _aligned(target: int, dask_chunk: int) -> int:
+    """The largest chunk of at most target that evenly divides the dask chunk.
+
+    Aligned chunks are each written by a single dask task. Sizes without a
+    reasonably large divisor keep the dask chunk instead, as do dask chunks
+    smaller than target, so layout_rechunk should grow those first.
+    """
+    if dask_chunk <= target:
+        return dask_chunk
+    for size in range(target, max(target // 4, 1) - 1, -1):
+        if dask_chunk % size == 0:
+            return size
+    return dask_chunk
+
+
+def _layout(options: dict) -> dict:
+    layout_name = str(options.get("layout", DEFAULT_LAYOUT)).lower()
+    if layout_name not in LAYOUTS:
+        raise ValueError(
+            f"Layout {layout_name} is not supported, use one of {sorted(LAYOUTS)}."
+        )
+    return LAYOUTS[layout_name]
+
+
+def _layout_target(dim: str, layout: dict) -> int:
+    if dim in TIME_DIMS:
+        return layout["time"]
+    if any(dim in dims for dims in SPATIAL_DIMS):
+        return layout["space"]
+    return 1
+
+
+def layout_rechunk(ds: xr.Dataset, options: dict) -> xr.Dataset:
+    """Grow dask chunks that are smaller than the chunks of the layout.
+
+    On-disk chunks are aligned to the dask chunks, so a result computed with
+    e.g. one timestep per dask chunk would otherwise be stored with one
+    timestep per chunk whatever layout was selected.
+    """
+    if not ds.chunks or isinstance(options.get("chunksizes"), dict):
+        return ds
+
+    layout = _layout(options)
+    rechunk = {}
+    for dim, chunks in ds.chunks.items():
+        target = min(_layout_target(dim, layout), ds.sizes[dim])
+        if chunks[0] < target:
+            rechunk[dim] = target
+    return ds.chunk(rechunk) if rechunk else ds
+
+
+def layout_chunks(var: xr.DataArray, options: dict) -> Optional[tuple]:
+    """The on-disk chunk shape of a variable.
+
+    Explicit chunksizes in the options win, otherwise the chunks follow the
+    selected layout, aligned to the variable's dask chunks.
+    """
+    if var.ndim == 0:
+        return None
+
+    chunksizes = options.get("chunksizes")
+    if isinstance(chunksizes, dict):
+        return tuple(
+            min(int(chunksizes.get(dim, size)), size)
+            for dim, size in zip(var.dims, var.shape)
+        )
+
+    layout = _layout(options)
+
+    chunks = []
+    for index, (dim, size) in enumerate(zip(var.dims, var.shape)):
+        chunk = max(min(_layout_target(dim, layout), size), 1)
+        if var.chunks is not None:
+            chunk = _aligned(chunk, var.chunks[index][0])
+        chunks.append(chunk)
+    return tuple(chunks)
+
+
+def strip_encoding_attrs(ds: xr.Dataset) -> xr.Dataset:
+    """Drop encoding attributes, xarray refuses them next to an explicit encoding."""
+    for var in ds.data_vars:
+        for key in ENCODING_ATTRS:
+            ds[var].attrs.pop(key, None)
+    return ds
+
+
+def netcdf_encoding(var: xr.DataArray, options: dict) -> dict:
+    """netCDF4 encoding of a variable, from options with per-dtype defaults.
+
+    netCDF4 also offers zstd and the multithreaded blosc codecs through the
+    compression option.
+    """
+    dtype = output_dtype(var, options)
+    defaults = DEFAULT_COMPRESSION[dtype_class(dtype)]
+
+    encoding = {
+        "dtype": dtype,
+        "compression": options.get("compression", "zlib"),
+        "complevel": int(options.get("complevel", defaults["complevel"])),
+        "shuffle": bool(options.get("shuffle", defaults["shuffle"])),
+        **_scaling(var, dtype, options),
+    }
+
+    nodata = nodata_value(var, dtype, options)
+    if nodata is not None:
+        encoding["_FillValue"] = nodata
+
+    chunksizes = layout_chunks(var, options)
+    if chunksizes is not None:
+        encoding["chunksizes"] = chunksizes
+    return encoding
+
+
+def zarr_encoding(var: xr.DataArray, options: dict) -> dict:
+    """Zarr encoding of a variable, blosc compressed with per-dtype defaults."""
+    dtype = output_dtype(var, options)
+    dclass = dtype_class(dtype)
+    defaults = DEFAULT_COMPRESSION[dclass]
+
+    cname = options.get("compression", "zstd")
+    clevel = int(options.get("complevel", defaults["complevel"]))
+    if not options.get("shuffle", defaults["shuffle"]) and dclass != "byte":
+        shuffle = "noshuffle"
+    else:
+        # Bit shuffling is what makes byte data compress.
+        shuffle = "bitshuffle" if dclass == "byte" else "shuffle"
+
+    encoding = {"dtype": dtype, **_scaling(var, dtype, options)}
+
+    zarr = profiler.import_module("zarr")
+    if int(zarr.__version__.split(".")[0]) >= 3:
+        from zarr.codecs import BloscCodec
+
+        encoding["compressors"] = (
+            BloscCodec(cname=cname, clevel=clevel, shuffle=shuffle),
+        )
+    else:
+        from numcodecs import Blosc
+
+        encoding["compressor"] = Blosc(
+            cname=cname,
+            clevel=clevel,
+            shuffle={
+                "noshuffle": Blosc.NOSHUFFLE,
+                "shuffle": Blosc.SHUFFLE,
+                "bitshuffle": Blosc.BITSHUFFLE,
+            }[shuffle],
+        )
+
+    nodata = nodata_value(var, dtype, options)
+    if nodata is not None:
+        encoding["_FillValue"] = nodata
+
+    chunks = layout_chunks(var, options)
+    if chunks is not None:
+        encoding["chunks"] = chunks
+    return encoding
+
+
+def coordinate_encoding(ds: xr.Dataset) -> dict:
+    """netCDF4 encoding of the 1D coordinates, stored contiguously.
+
+    A contiguous coordinate is a single block instead of a chunk index and
+    chunks, so a client opening the file over HTTP reads it in one range
+    request. HDF5 doesn't promise where in the file that block ends up.
+    """
+    return {
+        name: {"contiguous": True, "chunksizes": None}
+        for name, coord in ds.coords.items()
+        if coord.ndim == 1
+    }
+
+
+def geotiff_profile(ds: xr.Dataset, options: dict) -> tuple[np.dtype, object, dict]:
+    """The dtype, nodata and creation options of the GeoTIFFs of a result.
+
+    A GeoTIFF has a single dtype for all its bands, so the bands share the
+    widest of their dtypes unless one is requested.
+    """
+    if options.get("dtype"):
+        dtype = np.dtype(options["dtype"])
+    else:
+        dtype = np.result_type(*(output_dtype(ds[var], {}) for var in ds.data_vars))
+
+    nodata = None
+    for var in ds.data_vars:
+        nodata = nodata_value(ds[var], dtype, options)
+        if nodata is not None:
+            break
+
+    dclass = dtype_class(dtype)
+    creation_options = {
+        "compress": options.get("compress", "DEFLATE"),
+        "predictor": options.get("predictor", "NO" if dclass == "byte" else "YES"),
+        "level": int(
+            options.get("complevel", DEFAULT_COMPRESSION[dclass]["complevel"])
+        ),
+        "blocksize": int(options.get("blocksize", 512)),
+        "overview_resampling": options.get("overview_resampling", "nearest"),
+    }
+    return dtype, nodata, creation_options
@@ -1,58 +1,200 @@
+import contextlib
+import functools
 import importlib
 import inspect
 import logging
-from typing import Optional
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from copy import deepcopy
+from pathlib import Path
+from typing import Callable, Optional
 import sys
-import importlib
 
 from openeo_pg_parser_networkx import Process, ProcessRegistry, OpenEOProcessGraph
+from openeo_pg_parser_networkx.process_registry import DEFAULT_NAMESPACE
 from openeo_processes_dask_slim.process_implementations.core import process
 
-from openeo_argoworkflows_executor.stac import StacGrid
-from openeo_argoworkflows_executor.utils import derive_sub_graph, get_pg_bounding_box
+from openeo_argoworkflows_executor.checkpoint import TileCheckpoints
+from openeo_argoworkflows_executor.cube_cache import get_cube_cache
+from openeo_argoworkflows_executor.optimizer import optimize_process_graph
+from openeo_argoworkflows_executor.profiling import profiler
+from openeo_argoworkflows_executor.results_cache import RefCountedResults
+from openeo_argoworkflows_executor.stac import (
+    StacGrid,
+    StacItemIndex,
+    register_item_index,
+    search_items,
+)
+from openeo_argoworkflows_executor.utils import (
+    derive_sub_graph,
+    get_pg_bounding_box,
+    get_pg_load_collection_arguments,
+)
 
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 logger = logging.getLogger(__name__)
 
 
-def _register_processes_from_module(
-    process_registry,
+def _module_process_source(
     source,
     implementations_dir="process_implementations",
     specs_dir="specs",
 ):
-    """Grab all the process implementations from openeo_executor
-    and register to the process registry."""
-
-    processes_from_module = [
-        func
-        for _, func in inspect.getmembers(
-            importlib.import_module(f"{source}.{implementations_dir}"),
-            inspect.isfunction,
-        )
-    ]
+    """Look up process implementations and specs from a
+    `<source>.process_implementations` + `<source>.specs` package pair."""
+
+    def resolve(process_id: str) -> Optional[Process]:
+        implementations = importlib.import_module(f"{source}.{implementations_dir}")
+        specs_module = importlib.import_module(f"{source}.{specs_dir}")
+
+        # Processes that clash with python builtins/keywords (e.g. `and`) are
+        # published with a leading underscore.
+        for name in (process_id, f"_{process_id}"):
+            func = getattr(implementations, name, None)
+            spec = getattr(specs_module, name, None)
+            if inspect.isfunction(func) and spec is not None:
+                return Process(spec=spec, implementation=func)
+        return None
+
+    return resolve
+
+
+def _dedl_process_source(process_id: str) -> Optional[Process]:
+    """Look up load_stac from the dedl package, when it is installed.
+
+    The dedl package doesn't follow the `<pkg>.process_implementations` +
+    `<pkg>.specs` layout: load_stac lives at the package top level with its spec
+    in `<pkg>.specs`. Bind it directly.
+    """
+    if process_id != "load_stac":
+        return None
+
+    try:
+        import openeo_processes_dedl_cube_load as dedl_cube_load
+        from openeo_processes_dedl_cube_load import specs as dedl_specs
+    except ImportError:
+        return None
+
+    return Process(spec=dedl_specs.load_stac, implementation=dedl_cube_load.load_stac)
+
+
+class LazyProcessRegistry(ProcessRegistry):
+    """A ProcessRegistry that materialises processes on their first lookup.
+
+    Sources are tried in order, the first one that knows a process id wins.
+    Only the processes a graph actually uses are ever resolved and wrapped.
+    """
+
+    def __init__(self, sources: list, wrap_funcs: Optional[list] = None) -> None:
+        super().__init__(wrap_funcs=wrap_funcs)
+        self._sources = sources
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        try:
+            return super().__getitem__(key)
+        except KeyError:
+            namespace, process_id = self._keytransform(key)
+            if namespace != DEFAULT_NAMESPACE or process_id is None:
+                raise
+
+        with self._lock:
+            if process_id not in self.store.get(DEFAULT_NAMESPACE, {}):
+                for source in self._sources:
+                    process = source(process_id)
+                    if process is not None:
+                        self[process_id] = process
+                        break
+        return super().__getitem__(key)
+
+
+@functools.lru_cache(maxsize=None)
+def get_process_registry() -> LazyProcessRegistry:
+    """The process registry of this executor, built once per process."""
+    return LazyProcessRegistry(
+        sources=[
+            _module_process_source("openeo_argoworkflows_executor.extra_processes"),
+            _dedl_process_source,
+            _module_process_source("openeo_processes_dask_slim"),
+        ],
+        wrap_funcs=[process],
+    )
+
+
+def _temporal_extent_as_datetime(temporal_extent) -> Optional[str]:
+    """Turn a raw ``[start, end]`` temporal extent into a STAC search datetime."""
+    if not isinstance(temporal_extent, (list, tuple)) or len(temporal_extent) != 2:
+        return None
+    if not all(time is None or isinstance(time, str) for time in temporal_extent):
+        return None
+    start, end = temporal_extent
+    return f"{start or '..'}/{end or '..'}"
 
-    specs_module = importlib.import_module(f"{source}.{specs_dir}")
-    specs = {
-        func.__name__: getattr(specs_module, func.__name__)
-        for func in processes_from_module
-    }
 
-    for func in processes_from_module:
-        process_registry[func.__name__] = Process(
-            spec=specs[func.__name__], implementation=func
+def _drop_uncovered_cells(grid: StacGrid, process_graph: dict, bbox: list):
+    """Drop the grid cells that none of the loaded collections have items for.
+
+    One STAC search is run per loaded collection over the full bbox and time
+    range. Its items are kept in an index the tiles' load_collection calls
+    take their items from. Collections that can't be searched up front, or that return no items
+    at all (e.g. collections read natively by the dedl loader), leave the grid
+    untouched, as do graphs that load data through anything other than
+    load_collection.
+    """
+    load_nodes = [
+        value for value in process_graph.values() if "load_" in value["process_id"]
+    ]
+    load_arguments = get_pg_load_collection_arguments(process_graph)
+    if not load_arguments or len(load_arguments) != len(load_nodes):
+        return
+
+    footprints = []
+    for arguments in load_arguments:
+        datetime_range = _temporal_extent_as_datetime(
+            arguments.get("temporal_extent")
         )
+        if not isinstance(arguments.get("id"), str) or datetime_range is None:
+            return
+
+        try:
+            items = search_items(arguments["id"], bbox, datetime_range)
+        except Exception:
+            logger.warning(
+                "Footprint pre-query failed for collection %s, executing all tiles.",
+                arguments["id"],
+                exc_info=True,
+            )
+            return
 
-    return process_registry
+        if not items:
+            logger.info(
+                "Footprint pre-query found no items for collection %s, executing all tiles.",
+                arguments["id"],
+            )
+            return
+
+        index = StacItemIndex(bbox, items)
+        register_item_index(arguments["id"], *arguments["temporal_extent"], index)
+        footprints.extend(index.footprints)
+
+    n_cells = len(grid.cells)
+    skipped = grid.drop_uncovered_cells(footprints)
+    if skipped:
+        logger.info(
+            "Skipping %s of %s tiles without STAC item coverage: %s",
+            len(skipped),
+            n_cells,
+            [list(cell[2].bounds) for cell in skipped],
+        )
 
 
-def prepare_graphs(process_graph: OpenEOProcessGraph):
+def prepare_graphs(process_graph: OpenEOProcessGraph, tilesize: int = 100000):
     # We get the total bounding box from the process graph
     _box = get_pg_bounding_box(process_graph.pg_data)
 
     bbox = [_box.west, _box.south, _box.east, _box.north]
 
-    tilesize = 100000
     crs = 4326
 
     grid = StacGrid(bbox, tilesize, crs)
@@ -60,45 +202,115 @@ def prepare_graphs(process_graph: OpenEOProcessGraph):
     # We get the cells for this given process graph
     grid.set_grid_cells()
 
+    # Empty cells (ocean, outside the orbit swath) would still run the whole
+    # process graph, so drop them before deriving the sub graphs.
+    _drop_uncovered_cells(grid, process_graph.pg_data, bbox)
+
     sub_graphs = []
     # Derive a list of "sub_graphs"
     for cell in grid.cells:
+        # derive_sub_graph edits the graph in place, so every cell needs its own
+        # copy, otherwise all sub graphs end up sharing the last cell's extent.
         sub_graphs.append(
-            OpenEOProcessGraph(pg_data=derive_sub_graph(cell, process_graph.pg_data))
+            OpenEOProcessGraph(
+                pg_data=derive_sub_graph(cell, deepcopy(process_graph.pg_data))
+            )
         )
 
     return sub_graphs
 
 
-def execute(parsed_graph: OpenEOProcessGraph):
-    process_registry = ProcessRegistry(wrap_funcs=[process])
-
-    _register_processes_from_module(process_registry, "openeo_processes_dask_slim")
+def _run_tile(graph: OpenEOProcessGraph, process_registry, track, phase: str):
+    # Intermediate results are dropped once their last consumer ran.
+    pg_callable = graph.to_callable(
+        process_registry=process_registry, results_cache=RefCountedResults(graph)
+    )
 
     try:
-        import openeo_processes_dedl_cube_load as dedl_cube_load
-        from openeo_processes_dedl_cube_load import specs as dedl_specs
+        with profiler.phase(phase), track:
+            pg_callable()
+    finally:
+        # Cube cache writes are computed by save_result, those of a tile that
+        # failed before or saved nothing are dropped.
+        cube_cache = get_cube_cache()
+        if cube_cache is not None:
+            cube_cache.discard(cube_cache.take_pending())
 
-        # The dedl package doesn't follow the
-        # `<pkg>.process_implementations` + `<pkg>.specs` layout that
-        # _register_processes_from_module expects: load_stac lives at the
-        # package top level with its spec in `<pkg>.specs`. Bind it directly.
-        process_registry["load_stac"] = Process(
-            spec=dedl_specs.load_stac,
-            implementation=dedl_cube_load.load_stac,
-        )
-    except ImportError:
-        pass
-    
-    _register_processes_from_module(
-        process_registry, "openeo_argoworkflows_executor.extra_processes"
-    )
 
-    sub_graphs = prepare_graphs(parsed_graph)
+def execute(
+    parsed_graph: OpenEOProcessGraph,
+    wait_for_cluster: Optional[Callable] = None,
+    tile_size: int = 100000,
+    parallel_tiles: int = 1,
+):
+    """Execute the process graph tile by tile.
+
+    The graph is optimised first, see optimize_process_graph.
+    ``wait_for_cluster`` is called right before the first tile runs, so that
+    registry setup, tiling and the STAC pre-query overlap with provisioning
+    of the dask cluster. With ``parallel_tiles`` above one, that many tiles
+    submit their computations to the cluster at the same time.
+    """
+    process_registry = get_process_registry()
+
+    with profiler.phase("optimize_graph"):
+        optimized = optimize_process_graph(parsed_graph.pg_data)
+        if optimized is not parsed_graph.pg_data:
+            parsed_graph = OpenEOProcessGraph(pg_data=optimized)
+
+    with profiler.phase("prepare_graphs"):
+        sub_graphs = prepare_graphs(parsed_graph, tile_size)
 
-    for graph in sub_graphs:
-        pg_callable = graph.to_callable(
-            process_registry=process_registry, results_cache={}
+    # Tiles are only resumed within a run, executors started without one (e.g.
+    # by an older API) recompute every tile.
+    checkpoints = None
+    if "OPENEO_CHECKPOINT_PATH" in os.environ and os.environ.get("OPENEO_RUN_ID"):
+        checkpoints = TileCheckpoints(
+            Path(os.environ["OPENEO_CHECKPOINT_PATH"]),
+            Path(os.environ["OPENEO_RESULTS_PATH"]),
+            run_id=os.environ["OPENEO_RUN_ID"],
         )
+        checkpoints.remove_stale_runs()
+        checkpoints.remove_orphaned_outputs()
 
-        pg_callable()
+    pending = []
+    for index, graph in enumerate(sub_graphs):
+        track = contextlib.nullcontext()
+        if checkpoints is not None:
+            tile_key = TileCheckpoints.tile_key(graph.pg_data)
+            if checkpoints.is_complete(tile_key):
+                logger.info(
+                    "Skipping tile %s of %s, completed by a previous run.",
+                    index + 1,
+                    len(sub_graphs),
+                )
+                continue
+            track = checkpoints.track(tile_key)
+
+        # The first tile carries the start-to-first-read latency.
+        pending.append((graph, track, "first_tile" if not pending else "tiles"))
+
+    if not pending:
+        return
+
+    if wait_for_cluster is not None:
+        wait_for_cluster()
+
+    if parallel_tiles <= 1:
+        for graph, track, phase in pending:
+            _run_tile(graph, process_registry, track, phase)
+        return
+
+    logger.info("Running %s tiles, %s at a time.", len(pending), parallel_tiles)
+    pool = ThreadPoolExecutor(max_workers=parallel_tiles, thread_name_prefix="tile")
+    try:
+        futures = [
+            pool.submit(_run_tile, graph, process_registry, track, phase)
+            for graph, track, phase in pending
+        ]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            # Raises the first failure, the remaining tiles are cancelled below.
+            future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,32 +1,38 @@
-import base64
 import json
 import logging
 import numpy as np
 import os
 import pyproj
-import pystac_client
-import re
-import rioxarray
 import xarray as xr
 
-from odc.stac import stac_load
 from pathlib import Path
-from pystac.extensions import raster
 from typing import Optional, Union
 from openeo_processes_dask_slim.process_implementations.data_model import RasterCube
-from openeo_processes_dask_slim.process_implementations.cubes._filter import filter_bbox
 from openeo_pg_parser_networkx.pg_schema import BoundingBox, GeoJson, TemporalInterval
 
-__all__ = ["load_collection", "save_result"]
-
+from openeo_argoworkflows_executor.checkpoint import record_output
+from openeo_argoworkflows_executor.chunking import auto_chunks
+from openeo_argoworkflows_executor.collection_profiles import get_profile_cache
+from openeo_argoworkflows_executor.cube_cache import cube_key, get_cube_cache
+from openeo_argoworkflows_executor.encoding import (
+    SPATIAL_DIMS,
+    TIME_DIMS,
+    coordinate_encoding,
+    geotiff_profile,
+    layout_rechunk,
+    netcdf_encoding,
+    strip_encoding_attrs,
+    zarr_encoding,
+)
+from openeo_argoworkflows_executor.distributed_io import (
+    compute_on_cluster,
+    run_on_cluster,
+)
+from openeo_argoworkflows_executor.profiling import profiler
+from openeo_argoworkflows_executor.stac import get_item_index, result_metadata
+from openeo_argoworkflows_executor.stac_api import open_catalog, stac_api_settings
 
-def _stac_auth_headers() -> dict:
-    username = os.environ.get("STAC_API_USERNAME")
-    password = os.environ.get("STAC_API_PASSWORD")
-    if username and password:
-        credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
-        return {"Authorization": f"Basic {credentials}"}
-    return {}
+__all__ = ["load_collection", "save_result"]
 
 
 def _subset_to_bands(cube, bands: Optional[list[str]]):
@@ -50,6 +56,35 @@ def _subset_to_bands(cube, bands: Optional[list[str]]):
     return cube
 
 
+def _extent_pixels(bbox: tuple, crs: pyproj.CRS, resolution) -> Optional[tuple]:
+    """The size in pixels of a lon/lat bbox loaded in crs at resolution."""
+    try:
+        transformer = pyproj.Transformer.from_crs(4326, crs, always_xy=True)
+        west, south, east, north = transformer.transform_bounds(*bbox)
+    except Exception:
+        return None
+    return (
+        int(abs(north - south) / resolution) + 1,
+        int(abs(east - west) / resolution) + 1,
+    )
+
+
+def _search_items(id: str, query_dict: dict, temporal_extent) -> list:
+    """The items of a load, searched for unless a job-level search covers it.
+
+    Tiles take their items from the job-level search over the full extent,
+    which also saves refetching the items straddling tile borders.
+    """
+    index = get_item_index(
+        id, *(getattr(time, "root", None) for time in temporal_extent)
+    )
+    if index is not None and index.covers(query_dict["bbox"]):
+        return index.query(query_dict["bbox"])
+
+    results = open_catalog().search(**query_dict, limit=1000)
+    return list(results.items())
+
+
 def load_collection(
     id: str,
     spatial_extent: Optional[Union[BoundingBox, dict, str, GeoJson]] = None,
@@ -67,7 +102,8 @@ def load_collection(
             "No temporal extent was provided, will not load the entire temporal axis of the datacube."
         )
 
-    if "STAC_API_URL" not in os.environ:
+    stac_api_url = stac_api_settings().url
+    if stac_api_url is None:
         raise Exception("STAC URL Not available in executor config.")
 
     # Prefer the dedl load_stac for DEDL-native / icechunk collections: it reads
@@ -79,8 +115,12 @@ def load_collection(
         load_stac = None
 
     if load_stac is not None:
-        stac_url = os.environ["STAC_API_URL"].rstrip("/") + f"/collections/{id}"
-        cube = load_stac(
+        stac_url = stac_api_url.rstrip("/") + f"/collections/{id}"
+        # load_stac searches, downloads and opens the native assets itself.
+        # With distributed IO that happens on a worker and only the (lazy)
+        # cube comes back to the executor pod.
+        cube = run_on_cluster(
+            load_stac,
             url=stac_url,
             spatial_extent=spatial_extent,
             temporal_extent=temporal_extent,
@@ -90,17 +130,29 @@ def load_collection(
         return _subset_to_bands(cube, bands)
 
     # Fallback: odc.stac_load (e.g. base executor image without the dedl package).
+    # These are only needed here, so a dedl-loaded graph never imports them.
+    # Only the STAC search runs here, stac_load is lazy and its chunks are read
+    # by whichever scheduler computes the result.
+    stac_load = profiler.import_module("odc.stac").stac_load
+    odc_geom = profiler.import_module("odc.geo.geom")
+    profiler.import_module("rioxarray")
+
     query_dict = {}
 
     query_dict["collections"] = [id]
 
     if isinstance(spatial_extent, BoundingBox):
-        query_dict["bbox"] = (
+        # The requested extent in its own CRS, passed on to stac_load so that
+        # only the blocks intersecting it are ever planned and read. The
+        # search takes it in lon/lat.
+        geopolygon = odc_geom.box(
             spatial_extent.west,
             spatial_extent.south,
             spatial_extent.east,
             spatial_extent.north,
+            crs=spatial_extent.crs or "EPSG:4326",
         )
+        query_dict["bbox"] = tuple(geopolygon.to_crs("EPSG:4326").boundingbox)
     else:
         raise ValueError("Provided spatial extent could not be interpreted.")
 
@@ -108,111 +160,85 @@ def load_collection(
         [time.root.isoformat() for time in temporal_extent if time != "None"]
     )
 
-    catalog = pystac_client.Client.open(
-        os.environ["STAC_API_URL"],
-        headers=_stac_auth_headers(),
-    )
-    results = catalog.search(**query_dict, limit=10)
+    result_items = _search_items(id, query_dict, temporal_extent)
 
-    result_items = list(results.items())
+    if not result_items:
+        raise Exception(f"No items were found for collection {id} in the extent.")
 
+    # The raster metadata is derived once per collection and cached across
+    # tiles, jobs and executors.
     example_item = result_items[0]
+    collection_profile = get_profile_cache().get(stac_api_url, id, example_item)
+    crs = collection_profile.item_crs(example_item)
 
-    crs = None
-    resolution = None
-    nodata = None
-    dtype = None
-
-    if "proj:wkt2" in example_item.properties.keys():
-        crs = pyproj.CRS.from_wkt(example_item.properties["proj:wkt2"])
-    elif "proj:epsg" in example_item.properties.keys():
-        crs = pyproj.CRS.from_epsg(example_item.properties["proj:epsg"])
-
-    if raster.RasterExtension.has_extension(example_item):
-        for asset in example_item.get_assets().values():
-            if "raster:bands" in asset.extra_fields.keys():
-                for band in asset.extra_fields["raster:bands"]:
-                    if "spatial_resolution" in band:
-                        resolution = band["spatial_resolution"]
-                    if "nodata" in band:
-                        nodata = band["nodata"]
-                    if "data_type" in band:
-                        dtype = band["data_type"]
-            if resolution and nodata and dtype:
-                break
-    elif crs is not None:
-        crs_measurement = crs.axis_info[0].unit_name
-
-        if crs_measurement == "metre":
-            resolution = 10
-        elif crs_measurement == "degree":
-            resolution = 0.0009
-
-    # Fallback for catalogues that publish no proj/raster extensions (e.g. HDA).
-    # Try grid:code MGRS → UTM EPSG, then parse resolution from asset href suffix.
-    if crs is None:
-        grid_code = example_item.properties.get("grid:code", "")
-        mgrs_match = re.match(r"MGRS-(\d{1,2})([C-X])", grid_code, re.IGNORECASE)
-        if mgrs_match:
-            zone = int(mgrs_match.group(1))
-            band_letter = mgrs_match.group(2).upper()
-            epsg = 32600 + zone if band_letter >= "N" else 32700 + zone
-            crs = pyproj.CRS.from_epsg(epsg)
-        else:
-            crs = pyproj.CRS.from_epsg(4326)
-
-    if resolution is None:
-        for asset in example_item.get_assets().values():
-            href = asset.href or ""
-            m = re.search(r"_(\d+)m\.", href)
-            if m:
-                resolution = int(m.group(1))
-                break
-        if resolution is None:
-            # Check alternate origin hrefs
-            for asset in example_item.get_assets().values():
-                alt_href = (
-                    asset.extra_fields.get("alternate", {})
-                    .get("origin", {})
-                    .get("href", "")
-                )
-                m = re.search(r"_(\d+)m\.", alt_href)
-                if m:
-                    resolution = int(m.group(1))
-                    break
-        if resolution is None:
-            crs_unit = crs.axis_info[0].unit_name if crs else "degree"
-            resolution = 10 if crs_unit == "metre" else 0.0001
-
-    # TODO Need to tidy up the logic above.
     kwargs = {}
-    # TODO Need to ensure nodata belongs to the dtype
-    if dtype:
-        kwargs["dtype"] = dtype
+    if collection_profile.dtype:
+        kwargs["dtype"] = collection_profile.dtype
 
-        if "int" in dtype and isinstance(nodata, float):
-            nodata = int(nodata)
-
-    if nodata:
-        kwargs["nodata"] = nodata
+    if collection_profile.nodata:
+        kwargs["nodata"] = collection_profile.nodata
 
     # Only load the requested bands instead of every asset in the items.
     if bands:
         kwargs["bands"] = bands
 
+    # Chunks are sized for the workers of the job, the chunk_size job option
+    # fixes their spatial edge. Without a band selection only the raster data
+    # assets are loaded, profiles cached before those were known count all.
+    chunks = auto_chunks(
+        dtype=collection_profile.dtype,
+        n_bands=len(
+            bands or collection_profile.data_bands or collection_profile.bands
+        ),
+        n_times=len({item.datetime for item in result_items}),
+        extent_pixels=_extent_pixels(
+            query_dict["bbox"], crs, collection_profile.resolution
+        ),
+        block_size=collection_profile.block_size,
+        chunk_size=os.environ.get("OPENEO_CHUNK_SIZE"),
+        max_edge=collection_profile.chunk_size,
+    )
+
+    # Loads of the same data by other jobs are served from the shared cube
+    # cache. The key includes the items, so new or updated items are a miss.
+    cube_cache = get_cube_cache()
+    cache_key = None
+    if cube_cache is not None and cube_cache.usable():
+        cache_key = cube_key(
+            stac_api_url=stac_api_url,
+            collection=id,
+            extent=[round(value, 9) for value in geopolygon.boundingbox],
+            extent_crs=str(geopolygon.crs),
+            datetime=query_dict["datetime"],
+            bands=bands,
+            crs=crs.to_wkt(),
+            resolution=collection_profile.resolution,
+            dtype=collection_profile.dtype,
+            nodata=collection_profile.nodata,
+            items=sorted(
+                (item.id, item.properties.get("updated")) for item in result_items
+            ),
+        )
+        cached = cube_cache.open(cache_key, chunks)
+        if cached is not None:
+            return cached.rio.write_crs(crs)
+
     lazy_xarray = stac_load(
         result_items,
         crs=crs,
-        resolution=resolution,
-        # TODO Add some way to decide chunks
-        chunks={"x": 2048, "y": 2048},
+        resolution=collection_profile.resolution,
+        chunks=chunks,
+        geopolygon=geopolygon,
         **kwargs,
     ).to_array(dim="bands")
 
     lazy_xarray.rio.write_crs(crs)
 
-    # Add some sort of clipping here to the original bounding box that was requested.
-    return filter_bbox(lazy_xarray, extent=spatial_extent)
+    if cache_key is not None:
+        lazy_xarray = cube_cache.store(cache_key, lazy_xarray, chunks)
+        lazy_xarray = lazy_xarray.rio.write_crs(crs)
+
+    return lazy_xarray
 
 
 def _derive_crs(data) -> Optional[pyproj.CRS]:
@@ -224,6 +250,9 @@ def _derive_crs(data) -> Optional[pyproj.CRS]:
     from the geostationary ``projection`` attr (a JSON PROJ dict) instead, and
     only fall back to rioxarray when that attr is absent.
     """
+    # Registers the `.rio` accessor.
+    profiler.import_module("rioxarray")
+
     projection = data.attrs.get("projection")
     if projection:
         try:
@@ -258,6 +287,175 @@ def _netcdf_safe_attrs(attrs: dict) -> dict:
     return {k: (v if isinstance(v, safe_types) else str(v)) for k, v in attrs.items()}
 
 
+# openEO format names (case-insensitive) -> the writer used for them.
+OUTPUT_FORMATS = {
+    "netcdf": "netcdf",
+    "nc": "netcdf",
+    "gtiff": "gtiff",
+    "geotiff": "gtiff",
+    "cog": "gtiff",
+    "zarr": "zarr",
+}
+
+
+def _piece_slices(chunks: tuple, piece_size: int) -> list[slice]:
+    """Group consecutive dask chunks of a dimension into pieces of about piece_size."""
+    slices = []
+    start = length = 0
+    for chunk in chunks:
+        if length and length + chunk > piece_size:
+            slices.append(slice(start, start + length))
+            start, length = start + length, 0
+        length += chunk
+    slices.append(slice(start, start + length))
+    return slices
+
+
+def _split_into_pieces(ds: xr.Dataset, piece_size: int) -> list[tuple[str, xr.Dataset]]:
+    """Split a dataset into chunk-aligned spatial pieces.
+
+    Returns (suffix, piece) pairs. Datasets that aren't dask-backed, have no
+    x/y dimensions or fit into a single piece are returned whole.
+    """
+    dims = next((d for d in SPATIAL_DIMS if set(d).issubset(ds.dims)), None)
+    if dims is None or not ds.chunks:
+        return [("", ds)]
+
+    ds = ds.unify_chunks()
+    y_dim, x_dim = dims
+    y_slices = _piece_slices(ds.chunks[y_dim], piece_size)
+    x_slices = _piece_slices(ds.chunks[x_dim], piece_size)
+    if len(y_slices) == len(x_slices) == 1:
+        return [("", ds)]
+
+    return [
+        (f"_{row}_{col}", ds.isel({y_dim: y_slice, x_dim: x_slice}))
+        for row, y_slice in enumerate(y_slices)
+        for col, x_slice in enumerate(x_slices)
+    ]
+
+
+def _piece_manifest(name: str, piece, crs: Optional[pyproj.CRS]) -> dict:
+    """Describe an output file, including the metadata of its STAC item."""
+    entry = {"file": name, "shape": dict(piece.sizes)}
+    dims = next((d for d in SPATIAL_DIMS if set(d).issubset(piece.dims)), None)
+    if dims is not None:
+        y, x = piece[dims[0]].values, piece[dims[1]].values
+        entry["bounds"] = [
+            float(x.min()),
+            float(y.min()),
+            float(x.max()),
+            float(y.max()),
+        ]
+    entry["stac"] = result_metadata(piece, crs)
+    return entry
+
+
+def _geotiff_stacks(piece: xr.Dataset) -> list[tuple[str, xr.DataArray]]:
+    """Split a piece into (suffix, band stack) pairs, one per timestep.
+
+    GeoTIFFs hold a single 2D band stack, so every timestep gets its own file.
+    The timestep stays on the stack as a scalar coordinate.
+    """
+    dims = next((d for d in SPATIAL_DIMS if set(d).issubset(piece.dims)), None)
+    if dims is None:
+        raise ValueError("GTiff needs x and y dimensions, use netCDF or Zarr.")
+    y_dim, x_dim = dims
+    stack = piece.to_array(dim="bands")
+
+    time_dim = next((d for d in TIME_DIMS if d in stack.dims), None)
+    extra_dims = set(stack.dims) - {"bands", y_dim, x_dim, time_dim}
+    if extra_dims:
+        raise ValueError(
+            f"GTiff can't hold the dimensions {sorted(extra_dims)}, use netCDF or Zarr."
+        )
+
+    if time_dim is None:
+        steps = [("", stack)]
+    else:
+        steps = []
+        for index in range(stack.sizes[time_dim]):
+            step = stack.isel({time_dim: index})
+            value = step[time_dim].values
+            if np.issubdtype(np.asarray(value).dtype, np.datetime64):
+                label = np.datetime_as_string(value, unit="s")
+                suffix = "_" + label.replace("-", "").replace(":", "")
+            else:
+                suffix = f"_{index}"
+            steps.append((suffix, step))
+
+    return [
+        (
+            suffix,
+            step.transpose("bands", y_dim, x_dim).rio.set_spatial_dims(
+                x_dim=x_dim, y_dim=y_dim
+            ),
+        )
+        for suffix, step in steps
+    ]
+
+
+def _write_geotiff(
+    data: xr.DataArray,
+    path: Path,
+    crs: Optional[pyproj.CRS],
+    nodata,
+    creation_options: dict,
+):
+    """Write a band stack as a cloud optimised GeoTIFF with internal overviews."""
+    profiler.import_module("rioxarray")
+
+    data = data.drop_vars([dim for dim in TIME_DIMS if dim in data.coords])
+    if crs is not None:
+        data = data.rio.write_crs(crs)
+    if nodata is not None:
+        data = data.rio.write_nodata(nodata)
+    data.rio.to_raster(path, driver="COG", BIGTIFF="IF_SAFER", **creation_options)
+
+
+def _piece_encoding(encoding: dict, piece: xr.Dataset) -> dict:
+    """Cap the netCDF chunk shapes to a piece, edge pieces can be smaller."""
+    fitted = {}
+    for name, var_encoding in encoding.items():
+        if var_encoding.get("chunksizes") and name in piece.data_vars:
+            var_encoding = {
+                **var_encoding,
+                "chunksizes": tuple(
+                    min(chunk, size)
+                    for chunk, size in zip(
+                        var_encoding["chunksizes"], piece[name].shape
+                    )
+                ),
+            }
+        fitted[name] = var_encoding
+    return fitted
+
+
+def _uniform_chunks(ds: xr.Dataset) -> xr.Dataset:
+    """Zarr needs equal chunks along each dimension (but the last)."""
+    if not ds.chunks:
+        return ds
+    ds = ds.unify_chunks()
+    return ds.chunk({dim: max(chunks) for dim, chunks in ds.chunks.items()})
+
+
+def _write_manifest(_id: str, crs: Optional[pyproj.CRS], pieces: list[dict]):
+    """Describe how a result was split into files, next to (not in) the results."""
+    if "OPENEO_METADATA_PATH" not in os.environ:
+        return
+
+    metadata_path = Path(os.environ["OPENEO_METADATA_PATH"])
+    metadata_path.mkdir(parents=True, exist_ok=True)
+
+    manifest = {
+        "id": _id,
+        "crs": crs.to_string() if crs is not None else None,
+        "pieces": pieces,
+    }
+    with open(metadata_path / f"{_id}.manifest.json", "w") as f:
+        json.dump(manifest, f)
+
+
 def save_result(
     data: RasterCube,
     format: str = "netcdf",
@@ -284,10 +482,17 @@ def save_result(
     logging.info("DATA %s", data)
     logging.info("DATA ATTRS %s", data.attrs)
 
+    options = options or {}
+
+    output_format = OUTPUT_FORMATS.get(format.lower())
+    if output_format is None:
+        raise ValueError(
+            f"Output format {format} is not supported, use one of netCDF, GTiff or Zarr."
+        )
+
     _id = str(uuid.uuid4())
-    # TODO A nice abstraction to split the xarray into the respective output datasets
     # TODO Some nicer way to handle the user workspace
-    destination = Path(os.environ["OPENEO_RESULTS_PATH"]) / f"{_id}.nc"
+    results_path = Path(os.environ["OPENEO_RESULTS_PATH"])
     crs = _derive_crs(data)
 
     # The dedl load_stac path yields an xarray.Dataset (one variable per band),
@@ -314,14 +519,32 @@ def save_result(
     # (e.g. in create_stac_item) instead of cleanly reporting "no CRS".
     out_data.attrs = {"crs": crs.to_string()} if crs is not None else {}
 
-    dtype = None
-    if not dtype:
-        dtype = "float32"
-
-    comp = dict(zlib=True, complevel=5, dtype=dtype)
+    # Results keep their own dtype (or the requested one), with per-dtype
+    # compression defaults, instead of being widened to float32. Their chunks
+    # follow the requested layout, aligned to the dask chunks.
+    if output_format in ("netcdf", "zarr"):
+        out_data = layout_rechunk(out_data, options)
+
+    if output_format == "netcdf":
+        encoding = {
+            var: netcdf_encoding(out_data[var], options) for var in out_data.data_vars
+        }
+        encoding.update(coordinate_encoding(out_data))
+    elif output_format == "zarr":
+        if isinstance(options.get("chunksizes"), dict):
+            out_data = out_data.chunk(options["chunksizes"])
+        out_data = _uniform_chunks(out_data)
+        encoding = {
+            var: zarr_encoding(out_data[var], options) for var in out_data.data_vars
+        }
+    else:
+        dtype, nodata, creation_options = geotiff_profile(out_data, options)
+        if nodata is not None and dtype.kind in "iu":
+            # NaNs can't be cast to integers, they become nodata first.
+            out_data = out_data.fillna(nodata)
+        out_data = out_data.astype(dtype)
 
-    encoding = {var: comp for var in out_data.data_vars}
-    out_data = clean_unused_coordinates(out_data)
+    out_data = strip_encoding_attrs(clean_unused_coordinates(out_data))
 
     # Strip non-serializable attrs (e.g. reader-added dict metadata) from the
     # dataset and every variable/coordinate, otherwise to_netcdf raises TypeError.
@@ -329,4 +552,82 @@ def save_result(
     for var in out_data.variables:
         out_data[var].attrs = _netcdf_safe_attrs(out_data[var].attrs)
 
-    out_data.to_netcdf(path=destination, encoding=encoding)
+    # Build the writes lazily and compute them in one go. The chunks are
+    # written by whoever computes them, the dask workers whenever the executor
+    # is connected to a cluster, so those workers must mount the workspace.
+    writes = []
+    manifest = []
+
+    if output_format == "zarr":
+        # Zarr stores every chunk as its own object, so the chunks are written
+        # in parallel without splitting the result into pieces. The metadata
+        # is consolidated into a single object clients read first.
+        destination = results_path / f"{_id}.zarr"
+        writes.append(
+            out_data.to_zarr(
+                destination,
+                mode="w",
+                consolidated=True,
+                encoding=encoding,
+                compute=False,
+            )
+        )
+        manifest.append(_piece_manifest(destination.name, out_data, crs))
+    else:
+        # With the piece_size option (an edge length in pixels), large results
+        # are written as chunk-aligned pieces, one file each, so the pieces are
+        # computed, compressed and written in parallel instead of funnelling
+        # every chunk through a single file writer. By default a result is a
+        # single file.
+        pieces = [("", out_data)]
+        if options.get("piece_size"):
+            pieces = _split_into_pieces(out_data, int(options["piece_size"]))
+
+        for suffix, piece in pieces:
+            if output_format == "netcdf":
+                destination = results_path / f"{_id}{suffix}.nc"
+                writes.append(
+                    piece.to_netcdf(
+                        path=destination,
+                        encoding=_piece_encoding(encoding, piece),
+                        compute=False,
+                    )
+                )
+                manifest.append(_piece_manifest(destination.name, piece, crs))
+                continue
+
+            profiler.import_module("rioxarray")
+            dask = profiler.import_module("dask")
+            for step_suffix, stack in _geotiff_stacks(piece):
+                destination = results_path / f"{_id}{suffix}{step_suffix}.tif"
+                writes.append(
+                    dask.delayed(_write_geotiff)(
+                        stack, destination, crs, nodata, creation_options
+                    )
+                )
+                manifest.append(_piece_manifest(destination.name, stack, crs))
+
+    # Cubes this tile loaded past the cube cache are written into it by the
+    # same computation, which reads their chunks once for both. A failing
+    # cache write doesn't fail the job, the results are computed without it.
+    cube_cache = get_cube_cache()
+    cache_writes = cube_cache.take_pending() if cube_cache is not None else []
+    try:
+        compute_on_cluster(*writes, *(pending.write for pending in cache_writes))
+    except Exception:
+        if not cache_writes:
+            raise
+        logging.warning(
+            "save_result: computing with the cube cache writes failed, retrying "
+            "without them",
+            exc_info=True,
+        )
+        cube_cache.discard(cache_writes)
+        cache_writes = []
+        compute_on_cluster(*writes)
+    if cache_writes:
+        cube_cache.publish(cache_writes)
+
+    for entry in manifest:
+        record_output(results_path / entry["file"])
+    _write_manifest(_id, crs, manifest)
@@ -13,7 +13,7 @@ __all__ = []
 
 for spec_path in process_json_paths:
 
-    spec_json = json.load(open(spec_path))
+    spec_json = json.loads(spec_path.read_text())
 
     process_name = spec_json["id"]
     
@@ -1,6 +1,6 @@
 from pathlib import Path
 from pydantic import BaseModel, model_validator
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 from openeo_pg_parser_networkx.graph import OpenEOProcessGraph
 
 
@@ -18,6 +18,14 @@ class UserProfile(BaseModel):
     def stac_path(self) -> Path:
         return self.OPENEO_USER_WORKSPACE / "STAC"
 
+    @property
+    def checkpoint_path(self) -> Path:
+        return self.OPENEO_USER_WORKSPACE / "CHECKPOINTS"
+
+    @property
+    def metadata_path(self) -> Path:
+        return self.OPENEO_USER_WORKSPACE / "METADATA"
+
 
 class ClusterProfile(BaseModel):
 
@@ -33,6 +41,32 @@ class ClusterProfile(BaseModel):
     WORKER_MEMORY: int = 8
     WORKER_LIMIT: int = 4
 
+    # Tuning of the run itself, set from the job options. CHUNK_SIZE is the
+    # spatial chunk size of loaded data in pixels, TILE_SIZE the tile edge in
+    # metres and PARALLEL_TILES the number of tiles computed at the same time.
+    CHUNK_SIZE: Optional[int] = None
+    TILE_SIZE: int = 100000
+    PARALLEL_TILES: int = 1
+
+    # The workers mount the job workspace at the same path as the executor, so
+    # the dedl loader runs on a worker and a local cube cache can be used.
+    DISTRIBUTED_IO: bool = False
+
+    # Warm pool of reusable clusters for this profile, disabled while the size is 0.
+    # ISOLATION "user" only hands a cluster back to the same user, "shared" to
+    # anyone using the same profile (and always restarts its workers first).
+    # Shared clusters are provisioned without a user. Only the clusters of
+    # successful jobs return to the pool.
+    WARM_POOL_SIZE: int = 0
+    WARM_POOL_IDLE_TIMEOUT: int = 900
+    WARM_POOL_ISOLATION: Literal["user", "shared"] = "user"
+    WARM_POOL_RESTART_WORKERS: bool = False
+    WARM_POOL_PATH: Optional[Path] = None
+
+    @property
+    def warm_pool_enabled(self) -> bool:
+        return self.WARM_POOL_SIZE > 0 and self.WARM_POOL_PATH is not None
+
     @model_validator(mode='before')
     @classmethod
     def when_local_omit_all(cls, data: Any) -> Any:
@@ -42,6 +76,17 @@ class ClusterProfile(BaseModel):
         ), "Cannot initialise a local cluster and also a remote cluster"
         return data
 
+    @model_validator(mode="after")
+    def warm_pool_without_distributed_io(self) -> "ClusterProfile":
+        # Pooled clusters are provisioned for the pool rather than a job, so
+        # their workers don't mount the workspace of the current job.
+        if self.warm_pool_enabled and self.DISTRIBUTED_IO:
+            raise ValueError(
+                "A warm pool can't be combined with DISTRIBUTED_IO, pooled "
+                "clusters don't mount the workspace of the current job."
+            )
+        return self
+
 
 
 class ExecutorParameters(BaseModel):
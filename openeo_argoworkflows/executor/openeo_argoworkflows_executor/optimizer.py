@@ -0,0 +1,332 @@
+import datetime
+import json
+import logging
+
+from copy import deepcopy
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Processes whose nodes are never merged, as they have side effects.
+SIDE_EFFECT_PROCESSES = {"save_result", "export_workspace"}
+
+TIME_DIMENSIONS = (None, "t", "time")
+
+
+def _references(value: Any) -> set:
+    """The node ids a value references, without descending into callbacks."""
+    if isinstance(value, dict):
+        if "from_node" in value:
+            return {value["from_node"]}
+        if "process_graph" in value:
+            return set()
+        return set().union(*(_references(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_references(v) for v in value))
+    return set()
+
+
+def _has_parameters(value: Any) -> bool:
+    if isinstance(value, dict):
+        if "from_parameter" in value:
+            return True
+        if "process_graph" in value:
+            return False
+        return any(_has_parameters(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_has_parameters(v) for v in value)
+    return False
+
+
+def _replace_references(value: Any, replacements: dict) -> Any:
+    if isinstance(value, dict):
+        if "from_node" in value:
+            node_id = value["from_node"]
+            return {**value, "from_node": replacements.get(node_id, node_id)}
+        if "process_graph" in value:
+            return value
+        return {k: _replace_references(v, replacements) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_references(v, replacements) for v in value]
+    return value
+
+
+def _consumers(nodes: dict) -> dict[str, list[str]]:
+    consumers = {node_id: [] for node_id in nodes}
+    for node_id, node in nodes.items():
+        for reference in _references(node.get("arguments", {})):
+            if reference in consumers:
+                consumers[reference].append(node_id)
+    return consumers
+
+
+def _topological_order(nodes: dict) -> list[str]:
+    order, visited = [], set()
+
+    def visit(node_id):
+        if node_id in visited:
+            return
+        visited.add(node_id)
+        for reference in sorted(_references(nodes[node_id].get("arguments", {}))):
+            if reference in nodes:
+                visit(reference)
+        order.append(node_id)
+
+    for node_id in sorted(nodes):
+        visit(node_id)
+    return order
+
+
+def _remove_node(nodes: dict, node_id: str, replacement: str):
+    """Remove a node, pointing its consumers (and result flag) at replacement."""
+    node = nodes.pop(node_id)
+    for other in nodes.values():
+        other["arguments"] = _replace_references(
+            other.get("arguments", {}), {node_id: replacement}
+        )
+    if node.get("result"):
+        nodes[replacement]["result"] = True
+
+
+def _parse_time(value: str) -> datetime.datetime:
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def _fold_bands(load_arguments: dict, filter_arguments: dict) -> Optional[dict]:
+    bands = filter_arguments.get("bands")
+    if not bands or filter_arguments.get("wavelengths"):
+        return None
+
+    loaded = load_arguments.get("bands")
+    if loaded and not set(bands).issubset(loaded):
+        return None
+    return {**load_arguments, "bands": list(bands)}
+
+
+def _fold_temporal(load_arguments: dict, filter_arguments: dict) -> Optional[dict]:
+    extent = filter_arguments.get("extent")
+    loaded = load_arguments.get("temporal_extent")
+    if filter_arguments.get("dimension") not in TIME_DIMENSIONS:
+        return None
+    if not (isinstance(extent, list) and len(extent) == 2):
+        return None
+    if not (isinstance(loaded, list) and len(loaded) == 2):
+        loaded = [None, None]
+
+    try:
+        starts = [value for value in (loaded[0], extent[0]) if value is not None]
+        ends = [value for value in (loaded[1], extent[1]) if value is not None]
+        start = max(starts, key=_parse_time) if starts else None
+        end = min(ends, key=_parse_time) if ends else None
+    except (TypeError, ValueError):
+        return None
+    return {**load_arguments, "temporal_extent": [start, end]}
+
+
+def _fold_bbox(load_arguments: dict, filter_arguments: dict) -> Optional[dict]:
+    extent = filter_arguments.get("extent")
+    loaded = load_arguments.get("spatial_extent")
+    keys = ("west", "south", "east", "north")
+    if not isinstance(extent, dict) or not all(key in extent for key in keys):
+        return None
+    if not isinstance(loaded, dict) or not all(key in loaded for key in keys):
+        return None
+    # Extents in different CRS can't be intersected without reprojecting.
+    if str(extent.get("crs", 4326)) != str(loaded.get("crs", 4326)):
+        return None
+
+    intersection = {
+        "west": max(loaded["west"], extent["west"]),
+        "south": max(loaded["south"], extent["south"]),
+        "east": min(loaded["east"], extent["east"]),
+        "north": min(loaded["north"], extent["north"]),
+    }
+    if intersection["west"] >= intersection["east"] or (
+        intersection["south"] >= intersection["north"]
+    ):
+        return None
+    return {**load_arguments, "spatial_extent": {**loaded, **intersection}}
+
+
+# filter process -> function folding its arguments into load_collection's.
+FOLDABLE_FILTERS: dict[str, Callable[[dict, dict], Optional[dict]]] = {
+    "filter_bands": _fold_bands,
+    "filter_temporal": _fold_temporal,
+    "filter_bbox": _fold_bbox,
+}
+
+
+def push_down_filters(nodes: dict) -> list[str]:
+    """Fold filters that directly follow a load_collection into its arguments.
+
+    Only loads consumed by nothing but the filter are changed, other consumers
+    still need the unfiltered data.
+    """
+    folded = []
+    changed = True
+    while changed:
+        changed = False
+        consumers = _consumers(nodes)
+        for node_id, node in list(nodes.items()):
+            fold = FOLDABLE_FILTERS.get(node["process_id"])
+            arguments = node.get("arguments", {})
+            data = arguments.get("data")
+            if fold is None or not isinstance(data, dict) or "from_node" not in data:
+                continue
+
+            load_id = data["from_node"]
+            load = nodes.get(load_id)
+            if load is None or load["process_id"] != "load_collection":
+                continue
+            if consumers[load_id] != [node_id] or _has_parameters(arguments):
+                continue
+
+            load_arguments = fold(load.get("arguments", {}), arguments)
+            if load_arguments is None:
+                continue
+
+            load["arguments"] = load_arguments
+            _remove_node(nodes, node_id, load_id)
+            folded.append(f"{node_id} ({node['process_id']}) into {load_id}")
+            changed = True
+            break
+    return folded
+
+
+def merge_loads(nodes: dict) -> list[str]:
+    """Merge loads of the same collection and extents that differ in bands.
+
+    The merged load reads the union of the bands once, and each former load
+    becomes a filter_bands over it.
+    """
+    merged = []
+    groups: dict[str, list[str]] = {}
+    for node_id in _topological_order(nodes):
+        node = nodes[node_id]
+        arguments = node.get("arguments", {})
+        if node["process_id"] != "load_collection" or not arguments.get("bands"):
+            continue
+        if _has_parameters(arguments):
+            continue
+        key = json.dumps(
+            {k: v for k, v in arguments.items() if k != "bands"},
+            sort_keys=True,
+            default=str,
+        )
+        groups.setdefault(key, []).append(node_id)
+
+    for node_ids in groups.values():
+        band_sets = [nodes[node_id]["arguments"]["bands"] for node_id in node_ids]
+        if len(node_ids) < 2 or all(bands == band_sets[0] for bands in band_sets):
+            # Identical loads are merged by the sub-expression elimination.
+            continue
+
+        union = []
+        for bands in band_sets:
+            union.extend(band for band in bands if band not in union)
+
+        target = node_ids[0]
+        nodes[target]["arguments"] = {**nodes[target]["arguments"], "bands": union}
+        for node_id, bands in zip(node_ids, band_sets):
+            if node_id == target:
+                replacement = f"{target}_bands"
+                nodes[replacement] = {
+                    "process_id": "filter_bands",
+                    "arguments": {"data": {"from_node": target}, "bands": bands},
+                }
+                for other_id, other in nodes.items():
+                    if other_id != replacement:
+                        other["arguments"] = _replace_references(
+                            other.get("arguments", {}), {target: replacement}
+                        )
+                if nodes[target].pop("result", False):
+                    nodes[replacement]["result"] = True
+            else:
+                nodes[node_id] = {
+                    "process_id": "filter_bands",
+                    "arguments": {"data": {"from_node": target}, "bands": bands},
+                    **({"result": True} if nodes[node_id].get("result") else {}),
+                }
+        merged.append(f"{', '.join(node_ids)} into {target} with bands {union}")
+    return merged
+
+
+def eliminate_common_subexpressions(nodes: dict) -> list[str]:
+    """Merge nodes that run the same process on the same arguments."""
+    eliminated = []
+    seen: dict[str, str] = {}
+    for node_id in _topological_order(nodes):
+        node = nodes.get(node_id)
+        if node is None or node["process_id"] in SIDE_EFFECT_PROCESSES:
+            continue
+        key = json.dumps(
+            [node["process_id"], node.get("arguments", {})],
+            sort_keys=True,
+            default=str,
+        )
+        if key in seen:
+            _remove_node(nodes, node_id, seen[key])
+            eliminated.append(f"{node_id} into {seen[key]}")
+        else:
+            seen[key] = node_id
+    return eliminated
+
+
+def explain(nodes: dict) -> str:
+    """A plan of a flat process graph, one node per line in execution order."""
+    lines = []
+    for node_id in _topological_order(nodes):
+        node = nodes[node_id]
+        arguments = {
+            name: (
+                f"<{value['from_node']}>"
+                if isinstance(value, dict) and "from_node" in value
+                else "<callback>"
+                if isinstance(value, dict) and "process_graph" in value
+                else value
+            )
+            for name, value in node.get("arguments", {}).items()
+        }
+        marker = " (result)" if node.get("result") else ""
+        arguments = json.dumps(arguments, default=str)
+        lines.append(f"  {node_id}: {node['process_id']}({arguments}){marker}")
+    return "\n".join(lines)
+
+
+def optimize_process_graph(pg_data: dict) -> dict:
+    """Return an optimised copy of a flat process graph.
+
+    Filters are pushed into load_collection, loads of the same collection are
+    merged and common sub-expressions eliminated. The plan before and after is
+    logged. Any failure leaves the graph as it was.
+    """
+    try:
+        nodes = deepcopy(pg_data)
+        changes = {
+            "pushed down": push_down_filters(nodes),
+            "merged loads": merge_loads(nodes),
+            "eliminated": eliminate_common_subexpressions(nodes),
+        }
+    except Exception:
+        logger.warning(
+            "Process graph optimisation failed, running it as is.", exc_info=True
+        )
+        return pg_data
+
+    if not any(changes.values()):
+        logger.info(
+            "Process graph plan (no optimisations apply):\n%s", explain(pg_data)
+        )
+        return pg_data
+
+    logger.info(
+        "Process graph plan before optimisation:\n%s\n"
+        "after optimisation:\n%s\nchanges: %s",
+        explain(pg_data),
+        explain(nodes),
+        {name: change for name, change in changes.items() if change},
+    )
+    return nodes
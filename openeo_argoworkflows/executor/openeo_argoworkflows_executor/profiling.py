@@ -0,0 +1,92 @@
+import contextlib
+import importlib
+import json
+import logging
+import sys
+import threading
+import time
+
+from pathlib import Path
+from types import ModuleType
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Records import and phase timings of an executor run.
+
+    Heavy modules are imported through ``import_module`` so their first-import
+    cost shows up in the breakdown, and the executor wraps each stage of a run
+    in ``phase``. The report is logged, so it ends up in the job log, and
+    written as JSON into the job workspace.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.imports: dict[str, float] = {}
+        self.phases: dict[str, float] = {}
+        self.operations: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def import_module(self, name: str) -> ModuleType:
+        """Import a module, recording how long its first import took."""
+        if name in sys.modules:
+            return sys.modules[name]
+
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.imports.setdefault(name, time.perf_counter() - start)
+        return module
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the run, accumulating when a phase is entered repeatedly."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = (
+                    self.phases.get(name, 0.0) + time.perf_counter() - start
+                )
+
+    def record(self, name: str, seconds: float, failed: bool = False):
+        """Record one timed operation, e.g. a request to an external service."""
+        with self._lock:
+            stats = self.operations.setdefault(
+                name, {"count": 0, "failed": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["failed"] += int(failed)
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def report(self) -> dict:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "phases_seconds": {k: round(v, 3) for k, v in self.phases.items()},
+            "imports_seconds": {k: round(v, 3) for k, v in self.imports.items()},
+            "operations": {
+                name: {
+                    k: round(v, 3) if isinstance(v, float) else v
+                    for k, v in stats.items()
+                }
+                for name, stats in self.operations.items()
+            },
+        }
+
+    def write(self, path: Path):
+        """Log the report and write it to ``path``."""
+        report = self.report()
+
+        logger.info("Executor start-up profile: %s", json.dumps(report))
+        try:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        except OSError:
+            logger.warning("Could not write start-up profile to %s", path)
+
+
+profiler = StartupProfiler()
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+
+from openeo_pg_parser_networkx import OpenEOProcessGraph
+from openeo_pg_parser_networkx.graph import PGEdgeType
+
+logger = logging.getLogger(__name__)
+
+# The graph parser re-runs the inputs of these processes every time they are
+# called, which reads the results of the inputs' parents again, so those are
+# never evicted.
+RECOMPUTED_CONSUMERS = {"aggregate_temporal_period", "aggregate_spatial"}
+
+# Shared results are only persisted when they fit in this share of the memory
+# of the cluster, larger ones are computed again by each consumer.
+PERSIST_MEMORY_FRACTION = 0.5
+
+
+class _Evicted:
+    """Stands in for an evicted result.
+
+    The parser calls every parent of a node before looking the node itself up,
+    so a node's cache entry is still looked up after its last consumer ran.
+    Finding this keeps it from being recomputed, its value is never used.
+    """
+
+    def __repr__(self) -> str:
+        return "<evicted>"
+
+
+EVICTED = _Evicted()
+
+
+def _cluster_memory(client) -> float:
+    """The memory of the cluster's workers, at least that of one worker."""
+    workers = client.scheduler_info()["workers"].values()
+    memory = sum(worker.get("memory_limit") or 0 for worker in workers)
+    return memory or float(os.environ.get("OPENEO_WORKER_MEMORY", 8)) * 2**30
+
+
+def _persist(result):
+    """Persist a dask-backed result on the job's cluster, if there is one.
+
+    Results too large for the cluster's memory are left lazy, persisting them
+    would spill or kill the workers.
+    """
+    if getattr(result, "chunks", None) is None or not hasattr(result, "persist"):
+        return result
+    try:
+        from dask.distributed import get_client
+
+        client = get_client()
+    except (ImportError, ValueError):
+        return result
+
+    if result.nbytes > PERSIST_MEMORY_FRACTION * _cluster_memory(client):
+        logger.debug("Not persisting a result of %d bytes", result.nbytes)
+        return result
+    return result.persist()
+
+
+class RefCountedResults(dict):
+    """A results cache for OpenEOProcessGraph.to_callable that frees results.
+
+    Counts the consumers of every node of the top-level graph. Once the last
+    consumer of a node has stored its own result, the node's result is evicted,
+    so large intermediate cubes (and their dask graphs) don't stay alive until
+    the whole graph is done. Results of nodes with several consumers are
+    persisted on the cluster, so the consumers share them instead of each
+    computing them again. Loads are never persisted: they are cheap to read
+    again, and each consumer of a merged load only reads the bands it selects.
+    """
+
+    def __init__(self, graph: OpenEOProcessGraph, persist_shared: bool = True) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._graph = graph
+        self._persist_shared = persist_shared
+
+        top_level = graph.G.nodes[graph.result_node]["process_graph_uid"]
+        nodes = graph.G.nodes(data=True)
+
+        # node -> its parents, and parent -> the consumers it still waits for.
+        self._parents: dict[str, list] = {}
+        self._remaining: dict[str, set] = {}
+        for node, parent, data in graph.G.edges(data=True):
+            if data["reference_type"] != PGEdgeType.ResultReference:
+                continue
+            if nodes[node]["process_graph_uid"] != top_level:
+                continue
+            self._parents.setdefault(node, []).append((parent, data))
+            self._remaining.setdefault(parent, set()).add(node)
+
+        recomputed = {
+            parent
+            for parent, consumers in self._remaining.items()
+            if any(
+                nodes[consumer]["process_id"] in RECOMPUTED_CONSUMERS
+                for consumer in consumers
+            )
+        }
+        self._pinned = {
+            parent
+            for node in recomputed
+            for parent, _ in self._parents.get(node, [])
+        }
+        self._done: set = set()
+        self._loads = {
+            node for node, data in nodes if data["process_id"].startswith("load_")
+        }
+
+    def __setitem__(self, node, result):
+        with self._lock:
+            if (
+                self._persist_shared
+                and len(self._remaining.get(node, ())) > 1
+                and node not in self._done
+                and node not in self._loads
+            ):
+                result = _persist(result)
+            super().__setitem__(node, result)
+
+            if node in self._done:
+                return
+            self._done.add(node)
+            for parent, data in self._parents.get(node, []):
+                # The parser substitutes the parent's result into the node's
+                # arguments on the graph, which would keep it alive too.
+                for arg_sub in data.get("arg_substitutions", []):
+                    arg_sub.access_func(new_value=None, set_bool=True)
+
+                remaining = self._remaining[parent]
+                remaining.discard(node)
+                if not remaining and parent not in self._pinned and parent in self:
+                    logger.debug("Evicting the result of %s", parent)
+                    super().__setitem__(parent, EVICTED)
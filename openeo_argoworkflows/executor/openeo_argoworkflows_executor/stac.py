@@ -1,18 +1,24 @@
 import datetime
+import json
+import logging
 import os
 
 import numpy as np
 import shapely
-import stactools.core.projection
-import xarray as xr
 
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from pydantic import BaseModel
 from pyproj import Geod, CRS
 from pystac import Asset, Item
 from pystac.extensions.projection import ProjectionExtension
-from shapely import geometry, Polygon, box
+from shapely import geometry, Polygon, STRtree, box
 from typing import Optional, Tuple, Union
 
+from openeo_argoworkflows_executor.stac_api import open_catalog
+
+logger = logging.getLogger(__name__)
+
 class GridCorners(BaseModel):
 
     lower_left: Tuple[Union[int, float], Union[int, float]]
@@ -39,11 +45,7 @@ def create_stac_item(href: str) -> Item:
         pystac.Item: A PySTAC Item.
     """
 
-    id = os.path.splitext(os.path.basename(href))[0]
-
-    crs = None
-    proj_bbox = proj_transform = proj_shape = None
-    bbox = None
+    import xarray as xr
 
     with xr.open_dataset(href) as dataset:
         try:
@@ -54,15 +56,64 @@ def create_stac_item(href: str) -> Item:
             # as CRS-less and fall back to a lat/lon bbox below.
             crs = None
 
-        if crs is not None:
-            proj_bbox = dataset.rio.bounds()
-            proj_transform = list(dataset.rio.transform())[0:6]
-            proj_shape = dataset.rio.shape
-        else:
-            bbox = _wgs84_bbox_from_dataset(dataset)
+        metadata = result_metadata(dataset, crs)
+
+    return create_stac_item_from_metadata(href, metadata)
+
+
+def result_metadata(data, crs: Optional[CRS]) -> dict:
+    """The metadata a STAC item of a result needs, from its coordinates only.
+
+    save_result writes this next to every output, so the items can be created
+    without opening the results again.
+    """
+    metadata = {
+        "crs": crs.to_wkt() if crs is not None else None,
+        "proj_bbox": None,
+        "proj_transform": None,
+        "proj_shape": None,
+        "bbox": None,
+        "start_datetime": None,
+        "end_datetime": None,
+    }
 
     if crs is not None:
-        proj_geometry = shapely.geometry.mapping(shapely.geometry.box(*proj_bbox))
+        try:
+            metadata["proj_bbox"] = list(data.rio.bounds())
+            metadata["proj_transform"] = list(data.rio.transform())[0:6]
+            metadata["proj_shape"] = list(data.rio.shape)
+        except Exception:
+            logger.warning("Couldn't derive the projected extent of a result.")
+            metadata["crs"] = None
+
+    if metadata["proj_bbox"] is None:
+        metadata["bbox"] = _wgs84_bbox_from_dataset(data)
+
+    time = next((data.coords[dim] for dim in ("t", "time") if dim in data.coords), None)
+    if time is not None and time.size and np.issubdtype(time.dtype, np.datetime64):
+        for key, value in (
+            ("start_datetime", time.values.min()),
+            ("end_datetime", time.values.max()),
+        ):
+            metadata[key] = f"{np.datetime_as_string(value, unit='s')}Z"
+
+    return metadata
+
+
+def create_stac_item_from_metadata(href: str, metadata: dict) -> Item:
+    """Creates a STAC Item from the metadata of a result, see result_metadata."""
+
+    import stactools.core.projection
+
+    id = os.path.splitext(os.path.basename(href))[0]
+
+    crs = CRS.from_wkt(metadata["crs"]) if metadata.get("crs") else None
+    bbox = metadata.get("bbox")
+
+    if crs is not None:
+        proj_geometry = shapely.geometry.mapping(
+            shapely.geometry.box(*metadata["proj_bbox"])
+        )
         geometry = stactools.core.projection.reproject_geom(
             crs, "EPSG:4326", proj_geometry, precision=6
         )
@@ -72,13 +123,29 @@ def create_stac_item(href: str) -> Item:
     else:
         geometry = None
 
+    # Results covering a time range get it as start/end datetimes, others the
+    # time they were created.
+    properties = {}
+    item_datetime = datetime.datetime.now()
+    if metadata.get("start_datetime"):
+        start = datetime.datetime.fromisoformat(metadata["start_datetime"].rstrip("Z"))
+        end = datetime.datetime.fromisoformat(metadata["end_datetime"].rstrip("Z"))
+        if start == end:
+            item_datetime = start
+        else:
+            item_datetime = None
+            properties = {
+                "start_datetime": metadata["start_datetime"],
+                "end_datetime": metadata["end_datetime"],
+            }
+
     item = Item(
         id=id,
         geometry=geometry,
         bbox=bbox,
-        datetime=datetime.datetime.now(),
+        datetime=item_datetime,
         assets={"raster-result": Asset(href=href, title="raster-data", roles=["data"])},
-        properties={},
+        properties=properties,
     )
 
     # Only attach the projection extension when there is a real CRS; CRS-less
@@ -91,12 +158,48 @@ def create_stac_item(href: str) -> Item:
         else:
             projection.wkt2 = crs.to_wkt("WKT2_2015")
 
-        projection.transform = proj_transform
-        projection.shape = proj_shape
+        projection.transform = metadata["proj_transform"]
+        projection.shape = metadata["proj_shape"]
 
     return item
 
 
+def read_result_metadata(metadata_path: Path) -> dict[str, dict]:
+    """The metadata save_result wrote for the results of a job, by file name."""
+    metadata = {}
+    for manifest_path in Path(metadata_path).glob("*.manifest.json"):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable result manifest %s", manifest_path)
+            continue
+        for piece in manifest.get("pieces", []):
+            if piece.get("stac"):
+                metadata[piece["file"]] = piece["stac"]
+    return metadata
+
+
+def create_result_items(
+    filepaths: list[str], metadata_path: Path, workers: int = 1
+) -> list[Item]:
+    """The STAC items of the results of a job, created on ``workers`` threads.
+
+    Results save_result wrote metadata for are described from it, others (e.g.
+    from an older executor) are opened.
+    """
+    result_metadata = read_result_metadata(metadata_path)
+
+    def create_item(filepath: str) -> Item:
+        metadata = result_metadata.get(Path(filepath).name)
+        if metadata is not None:
+            return create_stac_item_from_metadata(filepath, metadata)
+        return create_stac_item(filepath)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(create_item, filepaths))
+
+
 def _wgs84_bbox_from_dataset(dataset) -> Optional[list]:
     """Best-effort WGS84 bbox from ``lat``/``lon`` (or ``y``/``x``) coordinates.
 
@@ -118,6 +221,88 @@ def _wgs84_bbox_from_dataset(dataset) -> Optional[list]:
         return None
 
 
+def search_items(collection_id: str, bbox: list, datetime_range: str) -> list[dict]:
+    """Return all items of a collection within bbox/datetime, as dicts.
+
+    Runs a single search over the full job extent with a large page size, so
+    that grid cells can be checked for coverage and the tiles can take their
+    items from a StacItemIndex instead of searching again.
+    """
+    results = open_catalog().search(
+        collections=[collection_id],
+        bbox=bbox,
+        datetime=datetime_range,
+        limit=1000,
+    )
+    return list(results.items_as_dicts())
+
+
+def item_footprint(item: dict) -> Optional[Polygon]:
+    """The footprint of an item dict, from its geometry or else its bbox."""
+    if item.get("geometry"):
+        return shapely.geometry.shape(item["geometry"])
+    if item.get("bbox"):
+        # 2D bboxes have four values, 3D bboxes six; the max corner starts halfway.
+        item_bbox = item["bbox"]
+        half = len(item_bbox) // 2
+        return box(item_bbox[0], item_bbox[1], item_bbox[half], item_bbox[half + 1])
+    return None
+
+
+def normalise_datetime(value) -> Optional[str]:
+    """An ISO datetime in UTC, so raw and parsed temporal extents compare equal."""
+    if value is None or str(value) in ("", "..", "None"):
+        return None
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromisoformat(str(value))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).isoformat()
+
+
+class StacItemIndex:
+    """The items of one job-level search, indexed by their footprints.
+
+    Tiles query it for the items intersecting their extent without going back
+    to the STAC API. It only answers for the extent it was searched over.
+    """
+
+    # Tile bounds are derived geodesically and may overshoot the job bbox by
+    # rounding errors, in degrees.
+    TOLERANCE = 1e-6
+
+    def __init__(self, bbox: list, items: list[dict]) -> None:
+        self.extent = box(*bbox)
+        self.items = [item for item in items if item_footprint(item) is not None]
+        self.footprints = [item_footprint(item) for item in self.items]
+        self._tree = STRtree(self.footprints)
+
+    def covers(self, bbox) -> bool:
+        return self.extent.buffer(self.TOLERANCE).covers(box(*bbox))
+
+    def query(self, bbox) -> list[Item]:
+        """The items intersecting bbox, in search order."""
+        indices = sorted(self._tree.query(box(*bbox), predicate="intersects"))
+        return [Item.from_dict(self.items[index]) for index in indices]
+
+
+# Item indices of the job-level searches, by (collection id, start, end).
+_item_indices: dict[tuple, StacItemIndex] = {}
+
+
+def register_item_index(collection_id: str, start, end, index: StacItemIndex):
+    _item_indices[
+        (collection_id, normalise_datetime(start), normalise_datetime(end))
+    ] = index
+
+
+def get_item_index(collection_id: str, start, end) -> Optional[StacItemIndex]:
+    """The index of a job-level search for a collection and time range, if any."""
+    return _item_indices.get(
+        (collection_id, normalise_datetime(start), normalise_datetime(end))
+    )
+
+
 class StacGrid:
 
     def __init__(self, bbox, tilesize, crs) -> None:
@@ -216,3 +401,17 @@ class StacGrid:
                 ])
 
         self.cells = cells
+
+    def drop_uncovered_cells(self, footprints: list[Polygon]) -> list:
+        """Remove the cells that no footprint intersects, returning the dropped cells."""
+        tree = STRtree(footprints)
+
+        covered, dropped = [], []
+        for cell in self.cells:
+            if len(tree.query(cell[2], predicate="intersects")):
+                covered.append(cell)
+            else:
+                dropped.append(cell)
+
+        self.cells = covered
+        return dropped
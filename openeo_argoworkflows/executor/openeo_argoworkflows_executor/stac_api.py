@@ -0,0 +1,111 @@
+import base64
+import functools
+import logging
+import os
+import threading
+import time
+
+from typing import NamedTuple, Optional
+
+from openeo_argoworkflows_executor.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open to the STAC API, shared by all tiles of the executor.
+POOL_SIZE = 16
+
+# Requests in flight at the same time, bursts of tiles queue here instead of
+# piling onto the API.
+MAX_CONCURRENT_REQUESTS = 8
+
+# Connect and read timeouts, in seconds.
+TIMEOUT = (10, 120)
+
+# Rate limiting and transient server errors are retried with exponential
+# backoff (1s, 2s, 4s, ...), honouring Retry-After.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1.0
+
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+class StacApiSettings(NamedTuple):
+    url: Optional[str]
+    headers: dict
+
+
+@functools.lru_cache(maxsize=None)
+def stac_api_settings() -> StacApiSettings:
+    """The STAC API URL and credentials, read from the environment once."""
+    headers = {}
+    username = os.environ.get("STAC_API_USERNAME")
+    password = os.environ.get("STAC_API_PASSWORD")
+    if username and password:
+        credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+        headers["Authorization"] = f"Basic {credentials}"
+    return StacApiSettings(url=os.environ.get("STAC_API_URL"), headers=headers)
+
+
+@functools.lru_cache(maxsize=None)
+def get_stac_io():
+    """The StacApiIO shared by every STAC API request of the executor.
+
+    Its session keeps a pool of connections alive, retries rate limited and
+    failed requests, and every request is bounded by the concurrency limit
+    and timed into the run profile.
+    """
+    stac_api_io = profiler.import_module("pystac_client.stac_api_io")
+
+    from requests.adapters import HTTPAdapter
+    from urllib3 import Retry
+
+    class PooledStacApiIO(stac_api_io.StacApiIO):
+        def request(self, *args, **kwargs) -> str:
+            with _request_slots:
+                start = time.perf_counter()
+                failed = True
+                try:
+                    response = super().request(*args, **kwargs)
+                    failed = False
+                    return response
+                finally:
+                    profiler.record(
+                        "stac_api_request", time.perf_counter() - start, failed
+                    )
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        # Searches are POSTs, and read-only.
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry
+    )
+
+    stac_io = PooledStacApiIO(
+        headers=stac_api_settings().headers, timeout=TIMEOUT, max_retries=None
+    )
+    stac_io.session.mount("http://", adapter)
+    stac_io.session.mount("https://", adapter)
+    return stac_io
+
+
+@functools.lru_cache(maxsize=None)
+def open_catalog():
+    """The STAC API client of the executor, opened once."""
+    settings = stac_api_settings()
+    if settings.url is None:
+        raise Exception("STAC URL Not available in executor config.")
+
+    pystac_client = profiler.import_module("pystac_client")
+    return pystac_client.Client.open(
+        settings.url,
+        headers=settings.headers,
+        stac_io=get_stac_io(),
+        timeout=TIMEOUT,
+    )
@@ -11,6 +11,15 @@ def get_pg_bounding_box(process_graph: dict):
             return call["resolved_kwargs"]["spatial_extent"]
 
 
+def get_pg_load_collection_arguments(process_graph: dict) -> list:
+    """Return the raw arguments of every ``load_collection`` node in the graph."""
+    return [
+        value["arguments"]
+        for value in process_graph.values()
+        if value["process_id"] == "load_collection"
+    ]
+
+
 def derive_sub_graph(cell, process_graph: dict):
 
     west, south, east, north = cell[2].bounds
@@ -0,0 +1,157 @@
+import os
+
+import pytest
+
+from openeo_pg_parser_networkx import OpenEOProcessGraph
+
+from openeo_argoworkflows_executor import executor
+from openeo_argoworkflows_executor.checkpoint import TileCheckpoints, record_output
+
+
+def _tile(west):
+    return {
+        "load": {
+            "process_id": "load_collection",
+            "arguments": {
+                "id": "sentinel-2-l2a",
+                "spatial_extent": {"west": west, "south": 0, "east": west + 1},
+                "temporal_extent": ["2026-01-01", "2026-02-01"],
+            },
+        },
+        "save": {
+            "process_id": "save_result",
+            "arguments": {"data": {"from_node": "load"}, "format": "netCDF"},
+            "result": True,
+        },
+    }
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / "RESULTS").mkdir()
+    return tmp_path
+
+
+def _checkpoints(workspace, run_id="run1"):
+    return TileCheckpoints(workspace / "CHECKPOINTS", workspace / "RESULTS", run_id)
+
+
+def _write_output(workspace, name):
+    (workspace / "RESULTS" / name).write_text("result")
+    record_output(workspace / "RESULTS" / name)
+
+
+def test_tile_key_is_stable():
+    reordered = dict(reversed(list(_tile(10).items())))
+    assert TileCheckpoints.tile_key(_tile(10)) == TileCheckpoints.tile_key(reordered)
+    assert TileCheckpoints.tile_key(_tile(10)) != TileCheckpoints.tile_key(_tile(11))
+
+
+def test_track_marks_successful_tiles_complete(workspace):
+    checkpoints = _checkpoints(workspace)
+    key = TileCheckpoints.tile_key(_tile(10))
+
+    with checkpoints.track(key) as outputs:
+        _write_output(workspace, "a.nc")
+    assert outputs == ["a.nc"]
+    assert checkpoints.is_complete(key)
+    assert os.listdir(checkpoints.checkpoint_path) == [f"{key}.json"]
+
+    # Outputs written outside a tile aren't recorded anywhere.
+    _write_output(workspace, "b.nc")
+    assert outputs == ["a.nc"]
+
+
+def test_track_leaves_failed_tiles_incomplete(workspace):
+    checkpoints = _checkpoints(workspace)
+    key = TileCheckpoints.tile_key(_tile(10))
+
+    with pytest.raises(RuntimeError):
+        with checkpoints.track(key):
+            _write_output(workspace, "a.nc")
+            raise RuntimeError("OOM")
+    assert not checkpoints.is_complete(key)
+
+
+def test_mark_complete_never_leaves_a_partial_marker(workspace, monkeypatch):
+    checkpoints = _checkpoints(workspace)
+    key = TileCheckpoints.tile_key(_tile(10))
+
+    def interrupted(*args):
+        raise OSError("Killed before the rename.")
+
+    monkeypatch.setattr(os, "replace", interrupted)
+    with pytest.raises(OSError):
+        checkpoints.mark_complete(key, [])
+    monkeypatch.undo()
+
+    assert not checkpoints.is_complete(key)
+    (checkpoints.checkpoint_path / f"{key}.json").write_text('{"tile": ')
+    assert not checkpoints.is_complete(key)
+
+
+def test_tiles_with_missing_outputs_are_incomplete(workspace):
+    checkpoints = _checkpoints(workspace)
+    key = TileCheckpoints.tile_key(_tile(10))
+    checkpoints.mark_complete(key, ["a.nc"])
+
+    assert not checkpoints.is_complete(key)
+    _write_output(workspace, "a.nc")
+    assert checkpoints.is_complete(key)
+
+
+def test_remove_orphaned_outputs(workspace):
+    checkpoints = _checkpoints(workspace)
+    checkpoints.mark_complete(TileCheckpoints.tile_key(_tile(10)), ["a.nc"])
+    _write_output(workspace, "a.nc")
+    _write_output(workspace, "interrupted.nc")
+    (workspace / "RESULTS" / "interrupted.zarr").mkdir()
+
+    checkpoints.remove_orphaned_outputs()
+    assert os.listdir(workspace / "RESULTS") == ["a.nc"]
+
+
+def test_remove_stale_runs(workspace):
+    earlier = _checkpoints(workspace, "run1")
+    earlier.mark_complete(TileCheckpoints.tile_key(_tile(10)), ["a.nc"])
+    _write_output(workspace, "a.nc")
+
+    checkpoints = _checkpoints(workspace, "run2")
+    checkpoints.remove_stale_runs()
+    checkpoints.remove_orphaned_outputs()
+
+    assert os.listdir(workspace / "CHECKPOINTS") == ["run2"]
+    assert os.listdir(workspace / "RESULTS") == []
+
+
+def test_execute_resumes_tiles_within_a_run_only(workspace, monkeypatch):
+    tiles = [OpenEOProcessGraph(pg_data=_tile(west)) for west in (10, 11)]
+    ran, fail_once = [], {11}
+
+    def run_tile(graph, process_registry, track, phase):
+        west = graph.pg_data["load"]["arguments"]["spatial_extent"]["west"]
+        ran.append(west)
+        with track:
+            _write_output(workspace, f"{west}.nc")
+            if west in fail_once:
+                fail_once.remove(west)
+                raise RuntimeError("OOM")
+
+    monkeypatch.setattr(executor, "optimize_process_graph", lambda pg_data: pg_data)
+    monkeypatch.setattr(executor, "prepare_graphs", lambda graph, tile_size: tiles)
+    monkeypatch.setattr(executor, "_run_tile", run_tile)
+    monkeypatch.setenv("OPENEO_CHECKPOINT_PATH", str(workspace / "CHECKPOINTS"))
+    monkeypatch.setenv("OPENEO_RESULTS_PATH", str(workspace / "RESULTS"))
+    monkeypatch.setenv("OPENEO_RUN_ID", "run1")
+
+    with pytest.raises(RuntimeError):
+        executor.execute(tiles[0])
+    # An Argo retry of the run only recomputes the failed tile.
+    executor.execute(tiles[0])
+    assert ran == [10, 11, 11]
+
+    # A restart of the job is a new run, which recomputes every tile.
+    monkeypatch.setenv("OPENEO_RUN_ID", "run2")
+    executor.execute(tiles[0])
+    assert ran == [10, 11, 11, 10, 11]
+    assert sorted(os.listdir(workspace / "RESULTS")) == ["10.nc", "11.nc"]
@@ -0,0 +1,96 @@
+import datetime
+
+import pystac
+
+from openeo_argoworkflows_executor.chunking import (
+    DEFAULT_BLOCK_SIZE,
+    MAX_CHUNK_EDGE,
+    auto_chunks,
+)
+from openeo_argoworkflows_executor.collection_profiles import _data_bands
+
+MB = 2**20
+
+
+def test_auto_chunks_edge_is_a_multiple_of_the_block_size():
+    chunks = auto_chunks("uint16", n_bands=1, n_times=1, target_bytes=8 * MB)
+
+    # sqrt(8 MiB / 2 bytes) = 2048 pixels, rounded down to whole blocks.
+    assert chunks["y"] == chunks["x"] == MAX_CHUNK_EDGE
+    assert chunks["x"] % DEFAULT_BLOCK_SIZE == 0
+
+    chunks = auto_chunks(
+        "uint16", n_bands=4, n_times=1, block_size=256, target_bytes=8 * MB
+    )
+    assert chunks["x"] == 1024
+
+
+def test_auto_chunks_edge_is_at_least_one_block():
+    chunks = auto_chunks("float64", n_bands=100, n_times=1, target_bytes=1 * MB)
+    assert chunks["x"] == DEFAULT_BLOCK_SIZE
+    assert chunks["time"] == 1
+
+
+def test_auto_chunks_edge_is_bounded_by_max_edge_and_chunk_size():
+    chunks = auto_chunks(
+        "uint8", n_bands=1, n_times=1, max_edge=1000, target_bytes=64 * MB
+    )
+    assert chunks["x"] == 512
+
+    chunks = auto_chunks(
+        "uint8", n_bands=1, n_times=1, chunk_size="300", target_bytes=64 * MB
+    )
+    assert chunks["x"] == 300
+
+
+def test_auto_chunks_edge_is_bounded_by_the_extent():
+    chunks = auto_chunks(
+        "uint16", n_bands=1, n_times=1, extent_pixels=(100, 700), target_bytes=8 * MB
+    )
+    assert chunks["x"] == chunks["y"] == 2 * DEFAULT_BLOCK_SIZE
+
+    chunks = auto_chunks(
+        "uint16", n_bands=1, n_times=1, extent_pixels=(10, 10), target_bytes=8 * MB
+    )
+    assert chunks["x"] == DEFAULT_BLOCK_SIZE
+
+
+def test_auto_chunks_time_fills_the_target():
+    chunks = auto_chunks(
+        "uint8", n_bands=1, n_times=50, extent_pixels=(512, 512), target_bytes=8 * MB
+    )
+    assert chunks["x"] == 512
+    assert chunks["time"] == 8 * MB // (512 * 512)
+
+
+def test_auto_chunks_time_is_bounded_by_the_timesteps():
+    chunks = auto_chunks(
+        "uint8", n_bands=1, n_times=3, extent_pixels=(512, 512), target_bytes=8 * MB
+    )
+    assert chunks["time"] == 3
+
+    chunks = auto_chunks(
+        "uint8", n_bands=1, n_times=0, extent_pixels=(512, 512), target_bytes=8 * MB
+    )
+    assert chunks["time"] == 1
+
+
+def test_data_bands_skip_thumbnails_and_metadata():
+    item = pystac.Item(
+        id="item",
+        geometry=None,
+        bbox=None,
+        datetime=datetime.datetime(2026, 1, 1),
+        properties={},
+    )
+    item.add_asset(
+        "B04",
+        pystac.Asset(
+            "B04.tif", roles=["data"], extra_fields={"raster:bands": [{}]}
+        ),
+    )
+    item.add_asset("SCL", pystac.Asset("SCL.tif", roles=["data"]))
+    item.add_asset("thumbnail", pystac.Asset("thumb.png", roles=["thumbnail"]))
+    item.add_asset("metadata", pystac.Asset("meta.xml", roles=["metadata"]))
+
+    assert _data_bands(item) == ["B04", "SCL"]
@@ -0,0 +1,178 @@
+import json
+import os
+import time
+
+from types import SimpleNamespace
+
+import pytest
+
+from openeo_argoworkflows_executor.cluster import ClusterHandle, WarmClusterPool
+from openeo_argoworkflows_executor.models import ClusterProfile, UserProfile
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def restart(self):
+        self.calls.append("restart")
+
+    def run(self, func):
+        self.calls.append(func.__name__)
+
+    def close(self):
+        self.calls.append("close")
+
+
+class FakeCluster:
+    def __init__(self, name, options=None):
+        self.name = name
+        self.options = options
+        self.status = "running"
+        self.client = FakeClient()
+
+    def get_client(self, set_as_default=True):
+        return self.client
+
+    def adapt(self, minimum, maximum):
+        pass
+
+    def shutdown(self):
+        self.status = "closed"
+
+
+class FakeGateway:
+    def __init__(self, address=None):
+        self.clusters = {}
+
+    def connect(self, name, shutdown_on_close=True):
+        return self.clusters[name]
+
+    def cluster_options(self):
+        return SimpleNamespace()
+
+    def new_cluster(self, options, shutdown_on_close=True):
+        cluster = FakeCluster(f"cluster-{len(self.clusters)}", options)
+        self.clusters[cluster.name] = cluster
+        return cluster
+
+
+def _profiles(tmp_path, job_id="job1", user_id="user1", **pool_options):
+    dask_profile = ClusterProfile(
+        GATEWAY_URL="http://gateway",
+        WARM_POOL_SIZE=1,
+        WARM_POOL_PATH=tmp_path,
+        **pool_options,
+    )
+    user_profile = UserProfile(
+        OPENEO_USER_ID=user_id,
+        OPENEO_JOB_ID=job_id,
+        OPENEO_USER_WORKSPACE=tmp_path / user_id / job_id,
+    )
+    return dask_profile, user_profile
+
+
+def _pool(gateway, tmp_path, **kwargs):
+    return WarmClusterPool(gateway, *_profiles(tmp_path, **kwargs))
+
+
+def _pooled(gateway, pool, released=None):
+    cluster = gateway.new_cluster(None)
+    (pool.path / f"{cluster.name}.idle").write_text(
+        json.dumps({"released": released or time.time()})
+    )
+    return cluster
+
+
+def test_lease_renames_the_idle_record(tmp_path):
+    gateway = FakeGateway()
+    pool = _pool(gateway, tmp_path)
+    cluster = _pooled(gateway, pool)
+
+    assert pool.lease() is cluster
+    assert os.listdir(pool.path) == [f"{cluster.name}.job1.leased"]
+    assert cluster.client.calls == ["collect", "close"]
+
+    # A second executor finds no idle cluster.
+    assert _pool(gateway, tmp_path, job_id="job2").lease() is None
+
+
+def test_lease_discards_idled_out_and_stopped_clusters(tmp_path):
+    gateway = FakeGateway()
+    pool = _pool(gateway, tmp_path)
+    idled_out = _pooled(gateway, pool, released=time.time() - 3600)
+    stopped = _pooled(gateway, pool)
+    stopped.status = "stopped"
+
+    assert pool.lease() is None
+    assert os.listdir(pool.path) == []
+    assert stopped.status == "closed"
+    # The gateway reaps clusters that idled out, they aren't even connected to.
+    assert idled_out.status == "running"
+
+
+def test_pools_are_isolated_per_user(tmp_path):
+    gateway = FakeGateway()
+    _pooled(gateway, _pool(gateway, tmp_path))
+
+    assert _pool(gateway, tmp_path, user_id="user2").lease() is None
+    assert _pool(gateway, tmp_path, job_id="job2").lease() is not None
+
+
+def test_shared_pools_restart_the_workers(tmp_path):
+    gateway = FakeGateway()
+    cluster = _pooled(gateway, _pool(gateway, tmp_path, WARM_POOL_ISOLATION="shared"))
+
+    pool = _pool(gateway, tmp_path, user_id="user2", WARM_POOL_ISOLATION="shared")
+    assert pool.lease() is cluster
+    assert cluster.client.calls == ["restart", "close"]
+
+
+def test_release_keeps_the_pool_size(tmp_path):
+    gateway = FakeGateway()
+    pool = _pool(gateway, tmp_path)
+    first, second = gateway.new_cluster(None), gateway.new_cluster(None)
+
+    assert pool.release(first)
+    assert not pool.release(second)
+    assert os.listdir(pool.path) == [f"{first.name}.idle"]
+
+    first.status = "closed"
+    assert pool.lease() is None
+    assert not pool.release(first)
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gateway = FakeGateway()
+    monkeypatch.setattr("dask_gateway.Gateway", lambda address: gateway)
+    return gateway
+
+
+def _run_job(tmp_path, failed=False, **kwargs):
+    handle = ClusterHandle(*_profiles(tmp_path, **kwargs)).start()
+    handle.client()
+    handle.shutdown(failed=failed)
+    return handle.cluster
+
+
+def test_successful_jobs_return_their_cluster_to_the_pool(tmp_path, gateway):
+    cluster = _run_job(tmp_path)
+    assert cluster.status == "running"
+    assert _run_job(tmp_path, job_id="job2") is cluster
+
+
+def test_failed_jobs_shut_their_cluster_down(tmp_path, gateway):
+    cluster = _run_job(tmp_path, failed=True)
+    assert cluster.status == "closed"
+    assert not list(tmp_path.glob("*/*"))
+
+
+def test_pooled_clusters_are_provisioned_for_the_pool(tmp_path, gateway):
+    cluster = _run_job(tmp_path)
+    assert cluster.options.OPENEO_USER_ID == "user1"
+    assert cluster.options.OPENEO_JOB_ID.startswith("warm-pool-")
+
+    cluster = _run_job(tmp_path, WARM_POOL_ISOLATION="shared")
+    assert cluster.options.OPENEO_USER_ID == "warm-pool"
+    assert cluster.options.OPENEO_JOB_ID.startswith("warm-pool-")
@@ -0,0 +1,112 @@
+import datetime
+
+import pyproj
+import pystac
+import pytest
+
+from openeo_argoworkflows_executor.collection_profiles import (
+    CollectionProfile,
+    collection_crs,
+    derive_collection_profile,
+)
+
+UTM_33N = pyproj.CRS.from_epsg(32633)
+
+
+def _item(**properties):
+    return pystac.Item(
+        id="item",
+        geometry=None,
+        bbox=None,
+        datetime=datetime.datetime(2026, 1, 1),
+        properties=properties,
+    )
+
+
+def _collection(**extra_fields):
+    return pystac.Collection(
+        id="collection",
+        description="",
+        extent=pystac.Extent(
+            pystac.SpatialExtent([[-180, -90, 180, 90]]),
+            pystac.TemporalExtent([[None, None]]),
+        ),
+        extra_fields=extra_fields,
+    )
+
+
+def _profile(crs_strategy, **kwargs):
+    return CollectionProfile(crs_strategy=crs_strategy, resolution=10, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "crs_strategy, properties",
+    [
+        ("proj:wkt2", {"proj:wkt2": UTM_33N.to_wkt()}),
+        ("proj:code", {"proj:code": "EPSG:32633"}),
+        ("proj:epsg", {"proj:epsg": 32633}),
+        ("grid:code", {"grid:code": "MGRS-33UWP"}),
+    ],
+)
+def test_item_crs_per_strategy(crs_strategy, properties):
+    assert _profile(crs_strategy).item_crs(_item(**properties)) == UTM_33N
+
+
+def test_item_crs_of_the_fixed_strategy():
+    profile = _profile("fixed", crs=UTM_33N.to_wkt())
+    assert profile.item_crs(_item(**{"proj:epsg": 4326})) == UTM_33N
+
+
+def test_item_crs_falls_back_to_the_other_strategies():
+    profile = _profile("proj:code")
+    assert profile.item_crs(_item(**{"grid:code": "MGRS-33UWP"})) == UTM_33N
+    invalid_code = _item(**{"proj:code": "not a crs", "proj:epsg": 32633})
+    assert profile.item_crs(invalid_code) == UTM_33N
+
+
+def test_item_crs_falls_back_to_the_collection_crs():
+    profile = _profile("proj:code", collection_crs="EPSG:32633")
+    assert profile.item_crs(_item()) == UTM_33N
+    # The item's own CRS takes precedence.
+    assert profile.item_crs(_item(**{"proj:epsg": 32634})) == "EPSG:32634"
+
+
+def test_item_crs_fails_clearly_without_any_crs():
+    with pytest.raises(ValueError, match="CRS of item item"):
+        _profile("proj:code").item_crs(_item(**{"grid:code": None}))
+
+
+@pytest.mark.parametrize(
+    "extra_fields",
+    [
+        {"proj:code": "EPSG:32633"},
+        {"summaries": {"proj:epsg": [32633]}},
+        {"cube:dimensions": {"x": {"type": "spatial", "reference_system": 32633}}},
+        {"crs": ["http://www.opengis.net/def/crs/EPSG/0/32633"]},
+    ],
+)
+def test_collection_crs(extra_fields):
+    summaries = extra_fields.pop("summaries", None)
+    collection = _collection(**extra_fields)
+    if summaries:
+        collection.summaries = pystac.Summaries(summaries)
+    assert collection_crs(collection) == UTM_33N
+
+
+def test_collections_with_several_crs_publish_none():
+    collection = _collection(crs=["EPSG:32633", "EPSG:32634"])
+    collection.summaries = pystac.Summaries({"proj:epsg": [32633, 32634]})
+    assert collection_crs(collection) is None
+
+
+def test_profiles_keep_the_collection_crs():
+    item = _item()
+    item.add_asset("B04", pystac.Asset("B04_10m.tif", roles=["data"]))
+
+    collection = _collection(**{"proj:code": "EPSG:32633"})
+    profile = derive_collection_profile(item, collection)
+    assert profile.crs_strategy == "fixed"
+    assert profile.item_crs(_item()) == UTM_33N
+
+    profile = derive_collection_profile(item)
+    assert profile.item_crs(_item()) == pyproj.CRS.from_epsg(4326)
@@ -0,0 +1,218 @@
+import json
+import os
+import time
+
+import dask
+import numpy as np
+import pytest
+import rioxarray  # noqa: F401
+import xarray as xr
+
+from openeo_argoworkflows_executor.cube_cache import (
+    EVICTION_GRACE,
+    META_FILE,
+    STAGING_SUFFIX,
+    STAGING_TTL,
+    CubeCache,
+    PendingWrite,
+    cube_key,
+    get_cube_cache,
+)
+from openeo_argoworkflows_executor.extra_processes.process_implementations.io import (
+    save_result,
+)
+
+CHUNKS = {"y": 4, "x": 4}
+
+
+def _cube(offset=0):
+    data = np.arange(2 * 8 * 8, dtype="float32").reshape(2, 8, 8) + offset
+    return xr.DataArray(
+        data,
+        dims=("bands", "y", "x"),
+        coords={"bands": ["B04", "B08"], "y": np.arange(8), "x": np.arange(8)},
+    ).chunk(CHUNKS)
+
+
+def _cache(tmp_path, max_bytes=2**30, **kwargs):
+    return CubeCache(str(tmp_path), max_bytes=max_bytes, **kwargs)
+
+
+def _store(cache, key, cube):
+    """Store cube and run its write, as save_result does."""
+    stored = cache.store(key, cube, CHUNKS)
+    pending = cache.take_pending()
+    dask.compute(*(write.write for write in pending))
+    cache.publish(pending)
+    return stored
+
+
+def _set_meta(tmp_path, key, **fields):
+    path = tmp_path / key / META_FILE
+    path.write_text(json.dumps({**json.loads(path.read_text()), **fields}))
+
+
+def test_cube_key_is_independent_of_argument_order():
+    assert cube_key(collection="s2", bands=["B04"]) == cube_key(
+        bands=["B04"], collection="s2"
+    )
+    assert cube_key(collection="s2") != cube_key(collection="s1")
+
+
+def test_store_and_open_round_trip(tmp_path):
+    cache = _cache(tmp_path)
+    key = cube_key(collection="s2")
+    assert cache.open(key, CHUNKS) is None
+
+    # Nothing is computed when the cube is stored, only when its write is.
+    cube = _cube()
+    assert cache.store(key, cube, CHUNKS) is cube
+    assert cache.open(key, CHUNKS) is None
+    (pending,) = cache.take_pending()
+    assert pending.key == key
+    assert cache.take_pending() == []
+
+    dask.compute(pending.write)
+    cache.publish([pending])
+    # The writes went through a staging directory, which is gone.
+    assert os.listdir(tmp_path) == [key]
+
+    opened = cache.open(key, CHUNKS)
+    assert list(opened["bands"].values) == ["B04", "B08"]
+    assert opened.chunks is not None
+    xr.testing.assert_equal(opened.compute(), _cube().compute())
+
+
+def test_store_keeps_the_entry_of_another_job(tmp_path):
+    cache = _cache(tmp_path)
+    key = cube_key(collection="s2")
+    _store(cache, key, _cube())
+
+    stored = cache.store(key, _cube(offset=1), CHUNKS)
+    xr.testing.assert_equal(stored.compute(), _cube().compute())
+    assert cache.take_pending() == []
+
+
+def test_publish_keeps_the_entry_another_job_published_first(tmp_path):
+    cache = _cache(tmp_path)
+    key = cube_key(collection="s2")
+    cache.store(key, _cube(offset=1), CHUNKS)
+    _store(_cache(tmp_path), key, _cube())
+
+    # The write staged first finishes last.
+    (pending,) = cache.take_pending()
+    dask.compute(pending.write)
+    cache.publish([pending])
+    xr.testing.assert_equal(cache.open(key, CHUNKS).compute(), _cube().compute())
+    assert os.listdir(tmp_path) == [key]
+
+
+def test_store_replaces_expired_entries(tmp_path):
+    cache = _cache(tmp_path, max_age=60)
+    key = cube_key(collection="s2")
+    _store(cache, key, _cube())
+    _set_meta(tmp_path, key, created=time.time() - 120)
+    assert cache.open(key, CHUNKS) is None
+
+    _store(cache, key, _cube(offset=1))
+    xr.testing.assert_equal(
+        cache.open(key, CHUNKS).compute(), _cube(offset=1).compute()
+    )
+
+
+def test_store_skips_large_cubes(tmp_path):
+    cache = _cache(tmp_path, max_bytes=_cube().nbytes)
+    key = cube_key(collection="s2")
+
+    assert _store(cache, key, _cube()) is not None
+    assert cache.open(key, CHUNKS) is None
+
+
+def test_evict_removes_expired_and_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, max_age=3600)
+    keys = [cube_key(collection=name) for name in ("old", "idle", "recent")]
+    for key in keys:
+        _store(cache, key, _cube())
+    old, idle, recent = keys
+
+    now = time.time()
+    _set_meta(tmp_path, old, created=now - 7200)
+    _set_meta(tmp_path, idle, last_access=now - 2 * EVICTION_GRACE)
+    entry_bytes = json.loads((tmp_path / recent / META_FILE).read_text())["bytes"]
+    cache.max_bytes = entry_bytes
+
+    cache.evict()
+    assert os.listdir(tmp_path) == [recent]
+
+
+def test_evict_keeps_recently_used_entries_over_the_limit(tmp_path):
+    cache = _cache(tmp_path)
+    key = cube_key(collection="s2")
+    _store(cache, key, _cube())
+    cache.max_bytes = 1
+
+    cache.evict()
+    assert cache.open(key, CHUNKS) is not None
+
+
+def test_evict_removes_abandoned_writes(tmp_path):
+    cache = _cache(tmp_path)
+    abandoned = tmp_path / f"key.{int(time.time() - 2 * STAGING_TTL)}.a{STAGING_SUFFIX}"
+    running = tmp_path / f"key.{int(time.time())}.b{STAGING_SUFFIX}"
+    for path in (abandoned, running):
+        (path / "cube.zarr").mkdir(parents=True)
+
+    cache.evict()
+    assert os.listdir(tmp_path) == [running.name]
+
+
+def test_discard_removes_the_staged_writes(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store(cube_key(collection="s2"), _cube(), CHUNKS)
+    assert os.listdir(tmp_path)
+
+    cache.discard(cache.take_pending())
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.fixture
+def shared_cache(tmp_path, monkeypatch):
+    (tmp_path / "RESULTS").mkdir()
+    monkeypatch.setenv("OPENEO_RESULTS_PATH", str(tmp_path / "RESULTS"))
+    monkeypatch.setenv("OPENEO_METADATA_PATH", str(tmp_path / "METADATA"))
+    monkeypatch.setenv("OPENEO_CUBE_CACHE_URL", str(tmp_path / "cubes"))
+    monkeypatch.setenv("OPENEO_CUBE_CACHE_MAX_GB", "1")
+    get_cube_cache.cache_clear()
+    yield get_cube_cache()
+    get_cube_cache.cache_clear()
+
+
+def _result(cube):
+    return cube.rio.write_crs("EPSG:32633")
+
+
+def test_save_result_writes_the_staged_cubes(tmp_path, shared_cache):
+    key = cube_key(collection="s2")
+    cube = shared_cache.store(key, _cube(), CHUNKS)
+
+    save_result(_result(cube), "netCDF")
+    assert len(os.listdir(tmp_path / "RESULTS")) == 1
+    assert shared_cache.take_pending() == []
+    xr.testing.assert_equal(shared_cache.open(key, CHUNKS).compute(), _cube().compute())
+
+
+def test_save_result_succeeds_when_the_cache_write_fails(
+    tmp_path, shared_cache, monkeypatch
+):
+    def fail():
+        raise OSError("The cache is full.")
+
+    staging = tmp_path / "cubes" / f"key.1{STAGING_SUFFIX}"
+    staging.mkdir(parents=True)
+    pending = PendingWrite("key", str(staging), ["B04"], dask.delayed(fail)())
+    monkeypatch.setattr(shared_cache, "take_pending", lambda: [pending])
+
+    save_result(_result(_cube()), "netCDF")
+    assert len(os.listdir(tmp_path / "RESULTS")) == 1
+    assert not staging.exists()
+    assert shared_cache.open("key", CHUNKS) is None
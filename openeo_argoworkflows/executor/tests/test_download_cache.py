@@ -0,0 +1,93 @@
+import json
+import os
+
+from openeo_argoworkflows_executor.download_cache import (
+    INDEX_FILE,
+    DownloadCache,
+    link_download_directory,
+)
+
+
+def _download(cache, product, size=100):
+    path = cache.root / product
+    path.mkdir(parents=True)
+    (path / "band.tif").write_bytes(b"0" * size)
+
+
+def _index(cache):
+    return json.loads((cache.root / INDEX_FILE).read_text())
+
+
+def _products(cache):
+    return sorted(name for name in os.listdir(cache.root) if not name.startswith("."))
+
+
+def test_release_indexes_the_downloads_of_a_job(tmp_path):
+    cache = DownloadCache(tmp_path, max_bytes=1000)
+    cache.acquire("job1")
+    _download(cache, "S2A_1", size=300)
+    cache.release("job1")
+
+    index = _index(cache)
+    assert index["S2A_1"]["bytes"] == 300
+    assert not (tmp_path / ".leases" / "job1.json").exists()
+
+
+def test_least_recently_used_products_are_evicted(tmp_path):
+    cache = DownloadCache(tmp_path, max_bytes=250)
+    for job_id, product in (("job1", "S2A_1"), ("job2", "S2A_2")):
+        cache.acquire(job_id)
+        _download(cache, product)
+        cache.release(job_id)
+
+    # job3 may have used both products, S2A_1 was used before S2A_2.
+    cache.acquire("job3")
+    _download(cache, "S2A_3")
+    cache.release("job3")
+
+    assert _products(cache) == ["S2A_2", "S2A_3"]
+    assert set(_index(cache)) == {"S2A_2", "S2A_3"}
+
+
+def test_products_of_running_jobs_are_pinned(tmp_path):
+    cache = DownloadCache(tmp_path, max_bytes=150)
+    cache.acquire("job1")
+    _download(cache, "S2A_1")
+    cache.release("job1")
+
+    # job2 may read S2A_1, which it found at its start, and S2A_3, which was
+    # downloaded while it ran.
+    cache.acquire("job2")
+    cache.acquire("job3")
+    _download(cache, "S2A_2")
+    _download(cache, "S2A_3")
+    cache.release("job3")
+    assert _products(cache) == ["S2A_1", "S2A_2", "S2A_3"]
+
+    # All three were last used by job2.
+    cache.release("job2")
+    assert len(_products(cache)) == 1
+    assert sum(entry["bytes"] for entry in _index(cache).values()) <= 150
+
+
+def test_acquire_makes_room(tmp_path):
+    cache = DownloadCache(tmp_path, max_bytes=1000)
+    cache.acquire("job1")
+    _download(cache, "S2A_1")
+    cache.release("job1")
+
+    cache.max_bytes = 50
+    cache.acquire("job2")
+    assert _products(cache) == []
+    assert not list(tmp_path.glob(".evicting-*"))
+
+
+def test_link_download_directory(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1000)
+    download_directory = tmp_path / "job" / "eodag_download"
+    download_directory.mkdir(parents=True)
+    (download_directory / "partial").write_text("left by an earlier attempt")
+
+    link_download_directory(download_directory, cache)
+    assert download_directory.is_symlink()
+    assert download_directory.resolve() == cache.root.resolve()
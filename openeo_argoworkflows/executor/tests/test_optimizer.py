@@ -0,0 +1,188 @@
+from openeo_argoworkflows_executor.optimizer import (
+    _remove_node,
+    eliminate_common_subexpressions,
+    merge_loads,
+    optimize_process_graph,
+    push_down_filters,
+)
+
+EXTENT = {"west": 10.0, "south": 45.0, "east": 11.0, "north": 46.0}
+
+
+def _load(bands=("B04", "B08"), **arguments):
+    return {
+        "process_id": "load_collection",
+        "arguments": {
+            "id": "sentinel-2-l2a",
+            "spatial_extent": dict(EXTENT),
+            "temporal_extent": ["2026-01-01", "2026-06-01"],
+            "bands": list(bands),
+            **arguments,
+        },
+    }
+
+
+def _node(process_id, result=False, **arguments):
+    node = {
+        "process_id": process_id,
+        "arguments": {
+            name: {"from_node": value[1:]}
+            if isinstance(value, str) and value.startswith("@")
+            else value
+            for name, value in arguments.items()
+        },
+    }
+    if result:
+        node["result"] = True
+    return node
+
+
+def _save(data):
+    return _node("save_result", result=True, data=f"@{data}", format="netCDF")
+
+
+def test_push_down_filters_folds_into_the_load():
+    nodes = {
+        "load": _load(),
+        "bands": _node("filter_bands", data="@load", bands=["B04"]),
+        "time": _node(
+            "filter_temporal", data="@bands", extent=["2026-02-01", "2026-12-01"]
+        ),
+        "bbox": _node(
+            "filter_bbox",
+            data="@time",
+            extent={"west": 10.5, "south": 44.0, "east": 12.0, "north": 45.5},
+        ),
+        "save": _save("bbox"),
+    }
+
+    assert len(push_down_filters(nodes)) == 3
+    assert set(nodes) == {"load", "save"}
+    assert nodes["save"]["arguments"]["data"] == {"from_node": "load"}
+
+    arguments = nodes["load"]["arguments"]
+    assert arguments["bands"] == ["B04"]
+    assert arguments["temporal_extent"] == ["2026-02-01", "2026-06-01"]
+    assert arguments["spatial_extent"] == {
+        "west": 10.5,
+        "south": 45.0,
+        "east": 11.0,
+        "north": 45.5,
+    }
+
+
+def test_push_down_filters_keeps_filters_of_shared_loads():
+    nodes = {
+        "load": _load(),
+        "bands": _node("filter_bands", data="@load", bands=["B04"]),
+        "other": _node("reduce_dimension", data="@load", dimension="t"),
+        "merge": _node("merge_cubes", cube1="@bands", cube2="@other"),
+        "save": _save("merge"),
+    }
+
+    assert push_down_filters(nodes) == []
+    assert nodes["load"]["arguments"]["bands"] == ["B04", "B08"]
+    assert "bands" in nodes
+
+
+def test_push_down_filters_keeps_filters_that_dont_fold():
+    nodes = {
+        "load": _load(),
+        "bands": _node("filter_bands", data="@load", bands=["B11"]),
+        "save": _save("bands"),
+    }
+
+    assert push_down_filters(nodes) == []
+    assert nodes["load"]["arguments"]["bands"] == ["B04", "B08"]
+
+
+def test_remove_node_moves_the_result_flag():
+    nodes = {
+        "load": _load(),
+        "bands": _node("filter_bands", result=True, data="@load", bands=["B04"]),
+    }
+
+    _remove_node(nodes, "bands", "load")
+    assert nodes == {"load": {**_load(), "result": True}}
+
+
+def test_merge_loads_rewires_consumers_of_the_target():
+    nodes = {
+        "load1": _load(bands=["B04"]),
+        "load2": _load(bands=["B08"]),
+        "merge": _node("merge_cubes", cube1="@load1", cube2="@load2"),
+        "save": _save("merge"),
+    }
+
+    assert len(merge_loads(nodes)) == 1
+    assert nodes["load1"]["arguments"]["bands"] == ["B04", "B08"]
+    assert nodes["load1_bands"] == _node("filter_bands", data="@load1", bands=["B04"])
+    assert nodes["load2"] == _node("filter_bands", data="@load1", bands=["B08"])
+    assert nodes["merge"]["arguments"] == {
+        "cube1": {"from_node": "load1_bands"},
+        "cube2": {"from_node": "load2"},
+    }
+
+
+def test_merge_loads_moves_the_result_flag_of_the_target():
+    nodes = {
+        "load1": {**_load(bands=["B04"]), "result": True},
+        "load2": _load(bands=["B08"]),
+    }
+
+    merge_loads(nodes)
+    assert "result" not in nodes["load1"]
+    assert nodes["load1_bands"]["result"] is True
+
+
+def test_eliminate_common_subexpressions_merges_whole_chains():
+    # The duplicate ndvi only matches once its load was merged, which relies
+    # on the nodes being visited in dependency order.
+    nodes = {
+        "a_load": _load(),
+        "z_load": _load(),
+        "b_ndvi": _node("ndvi", data="@z_load"),
+        "c_ndvi": _node("ndvi", data="@a_load"),
+        "merge": _node("merge_cubes", cube1="@b_ndvi", cube2="@c_ndvi"),
+        "save": _save("merge"),
+    }
+
+    assert eliminate_common_subexpressions(nodes) == [
+        "z_load into a_load",
+        "c_ndvi into b_ndvi",
+    ]
+    assert set(nodes) == {"a_load", "b_ndvi", "merge", "save"}
+    assert nodes["b_ndvi"]["arguments"]["data"] == {"from_node": "a_load"}
+    assert nodes["merge"]["arguments"] == {
+        "cube1": {"from_node": "b_ndvi"},
+        "cube2": {"from_node": "b_ndvi"},
+    }
+
+
+def test_eliminate_common_subexpressions_keeps_side_effects():
+    nodes = {
+        "load": _load(),
+        "save1": _save("load"),
+        "save2": _save("load"),
+    }
+
+    assert eliminate_common_subexpressions(nodes) == []
+    assert set(nodes) == {"load", "save1", "save2"}
+
+
+def test_optimize_process_graph_returns_a_copy():
+    pg_data = {
+        "load": _load(),
+        "bands": _node("filter_bands", data="@load", bands=["B04"]),
+        "save": _save("bands"),
+    }
+
+    optimized = optimize_process_graph(pg_data)
+    assert set(optimized) == {"load", "save"}
+    assert "bands" in pg_data
+    assert pg_data["load"]["arguments"]["bands"] == ["B04", "B08"]
+
+
+def test_optimize_process_graph_returns_the_graph_on_failure():
+    pg_data = {"broken": {"arguments": {}}}
+    assert optimize_process_graph(pg_data) is pg_data
@@ -0,0 +1,95 @@
+import sys
+import types
+
+import pytest
+
+from openeo_pg_parser_networkx import Process
+
+from openeo_argoworkflows_executor.executor import (
+    LazyProcessRegistry,
+    _dedl_process_source,
+    get_process_registry,
+)
+
+
+def _source(name, process_ids, calls):
+    def resolve(process_id):
+        calls.append((name, process_id))
+        if process_id not in process_ids:
+            return None
+        return Process(spec={"id": process_id}, implementation=lambda: name)
+
+    return resolve
+
+
+def test_registry_resolves_the_graph_processes():
+    registry = get_process_registry()
+
+    assert registry["load_collection"].implementation.__module__ == (
+        "openeo_argoworkflows_executor.extra_processes.process_implementations.io"
+    )
+    assert registry["save_result"].implementation.__module__ == (
+        "openeo_argoworkflows_executor.extra_processes.process_implementations.io"
+    )
+    # Processes named after python keywords are published with an underscore.
+    assert registry["_and"].implementation.__name__ == "_and"
+    assert registry["and"] is registry["_and"]
+
+    with pytest.raises(KeyError):
+        registry["not_a_process"]
+
+
+def test_registry_tries_the_sources_in_order():
+    calls = []
+    registry = LazyProcessRegistry(
+        sources=[
+            _source("extra", {"load_collection"}, calls),
+            _source("dedl", {"load_stac", "load_collection"}, calls),
+            _source("slim", {"load_stac", "add"}, calls),
+        ]
+    )
+
+    assert registry["load_collection"].implementation() == "extra"
+    assert registry["load_stac"].implementation() == "dedl"
+    assert registry["add"].implementation() == "slim"
+    assert calls == [
+        ("extra", "load_collection"),
+        ("extra", "load_stac"),
+        ("dedl", "load_stac"),
+        ("extra", "add"),
+        ("dedl", "add"),
+        ("slim", "add"),
+    ]
+
+    # Resolved processes are kept, unknown ones are looked up every time.
+    calls.clear()
+    registry["load_collection"]
+    with pytest.raises(KeyError):
+        registry["unknown"]
+    assert calls == [("extra", "unknown"), ("dedl", "unknown"), ("slim", "unknown")]
+
+
+def test_dedl_source_without_the_dedl_package(monkeypatch):
+    monkeypatch.setitem(sys.modules, "openeo_processes_dedl_cube_load", None)
+    assert _dedl_process_source("load_stac") is None
+
+    registry = LazyProcessRegistry(sources=[_dedl_process_source])
+    with pytest.raises(KeyError):
+        registry["load_stac"]
+
+
+def test_dedl_source_binds_load_stac(monkeypatch):
+    def load_stac():
+        pass
+
+    specs = types.ModuleType("openeo_processes_dedl_cube_load.specs")
+    specs.load_stac = {"id": "load_stac"}
+    package = types.ModuleType("openeo_processes_dedl_cube_load")
+    package.load_stac = load_stac
+    package.specs = specs
+    monkeypatch.setitem(sys.modules, "openeo_processes_dedl_cube_load", package)
+    monkeypatch.setitem(sys.modules, "openeo_processes_dedl_cube_load.specs", specs)
+
+    process = _dedl_process_source("load_stac")
+    assert process.implementation is load_stac
+    assert _dedl_process_source("load_collection") is None
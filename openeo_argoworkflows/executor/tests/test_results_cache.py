@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from dask.distributed import Client
+from openeo_pg_parser_networkx import OpenEOProcessGraph, Process
+from openeo_processes_dask_slim.process_implementations.core import process
+
+from openeo_argoworkflows_executor import results_cache
+from openeo_argoworkflows_executor.executor import (
+    LazyProcessRegistry,
+    _module_process_source,
+    get_process_registry,
+)
+from openeo_argoworkflows_executor.optimizer import merge_loads
+from openeo_argoworkflows_executor.results_cache import EVICTED, RefCountedResults
+
+CUBE = xr.DataArray(
+    np.arange(24, dtype="float64").reshape(6, 2, 2),
+    dims=("t", "y", "x"),
+    coords={
+        "t": pd.date_range("2026-01-01", periods=6, freq="10D"),
+        "y": [0, 1],
+        "x": [0, 1],
+    },
+)
+
+
+def _math(process_id, x, y, result=False):
+    node = {
+        "process_id": process_id,
+        "arguments": {
+            name: {"from_node": value} if isinstance(value, str) else value
+            for name, value in (("x", x), ("y", y))
+        },
+    }
+    if result:
+        node["result"] = True
+    return node
+
+
+SCALED = {
+    "process_id": "multiply",
+    "arguments": {"x": {"from_parameter": "cube"}, "y": 2},
+}
+
+
+def _run(pg_data, results_cache):
+    graph = OpenEOProcessGraph(pg_data)
+    if results_cache is not None:
+        results_cache = results_cache(graph)
+    pg_callable = graph.to_callable(
+        process_registry=get_process_registry(), results_cache=results_cache
+    )
+    return pg_callable(named_parameters={"cube": CUBE}), results_cache
+
+
+def _evicted(cache) -> set:
+    """The ids (without their graph uid) of the evicted nodes."""
+    return {node.split("-")[0] for node, value in cache.items() if value is EVICTED}
+
+
+def _assert_same_result(pg_data) -> RefCountedResults:
+    expected, _ = _run(pg_data, lambda graph: {})
+    result, cache = _run(pg_data, RefCountedResults)
+    xr.testing.assert_equal(result, expected)
+    return cache
+
+
+def test_linear_graph_evicts_every_parent():
+    pg_data = {
+        "scaled": SCALED,
+        "shifted": _math("add", "scaled", 1),
+        "out": _math("multiply", "shifted", 3, result=True),
+    }
+
+    cache = _assert_same_result(pg_data)
+    assert _evicted(cache) == {"scaled", "shifted"}
+
+
+def test_fan_out_graph_evicts_shared_parents_after_their_last_consumer():
+    pg_data = {
+        "scaled": SCALED,
+        "a": _math("add", "scaled", 1),
+        "b": _math("multiply", "scaled", 3),
+        "out": _math("add", "a", "b", result=True),
+    }
+
+    cache = _assert_same_result(pg_data)
+    assert _evicted(cache) == {"scaled", "a", "b"}
+
+
+def test_inputs_of_aggregates_keep_their_parents():
+    # The parser re-runs the input of an aggregate whenever the aggregate is
+    # called, here once for each of its consumers a and b.
+    pg_data = {
+        "scaled": SCALED,
+        "shifted": _math("add", "scaled", 1),
+        "agg": {
+            "process_id": "aggregate_temporal_period",
+            "arguments": {
+                "data": {"from_node": "shifted"},
+                "period": "month",
+                "reducer": {
+                    "process_graph": {
+                        "mean": {
+                            "process_id": "mean",
+                            "arguments": {"data": {"from_parameter": "data"}},
+                            "result": True,
+                        }
+                    }
+                },
+            },
+        },
+        "a": _math("add", "agg", 1),
+        "b": _math("multiply", "agg", 3),
+        "out": _math("add", "a", "b", result=True),
+    }
+
+    cache = _assert_same_result(pg_data)
+    assert "scaled" not in _evicted(cache)
+    assert {"agg", "a", "b"} <= _evicted(cache)
+
+
+@pytest.fixture
+def client():
+    with Client(processes=False, n_workers=1, dashboard_address=None) as client:
+        yield client
+
+
+@pytest.fixture
+def persisted(monkeypatch):
+    """The results persisted by the cache, by their number of bands."""
+    persisted = []
+
+    def persist(result):
+        persisted.append(result.sizes.get("bands"))
+        return _persist(result)
+
+    _persist = results_cache._persist
+    monkeypatch.setattr(results_cache, "_persist", persist)
+    return persisted
+
+
+BANDS_CUBE = xr.concat(
+    [CUBE, CUBE * 10, CUBE * 100], dim=pd.Index(["B04", "B08", "SCL"], name="bands")
+).chunk({"bands": 1})
+
+
+def _load_collection(bands, **kwargs):
+    return BANDS_CUBE.sel(bands=bands)
+
+
+def test_merged_loads_are_not_persisted(client, persisted):
+    def load(bands):
+        return {
+            "process_id": "load_collection",
+            "arguments": {"id": "s2", "spatial_extent": None, "bands": bands},
+        }
+
+    pg_data = {
+        "red": load(["B04"]),
+        "nir": load(["B08"]),
+        "cloud": load(["SCL"]),
+        "a": {
+            "process_id": "merge_cubes",
+            "arguments": {"cube1": {"from_node": "red"}, "cube2": {"from_node": "nir"}},
+        },
+        "out": {
+            "process_id": "merge_cubes",
+            "arguments": {"cube1": {"from_node": "a"}, "cube2": {"from_node": "cloud"}},
+            "result": True,
+        },
+    }
+    assert merge_loads(pg_data)
+
+    registry = LazyProcessRegistry(
+        sources=[
+            lambda process_id: Process(
+                spec={"id": process_id}, implementation=_load_collection
+            )
+            if process_id == "load_collection"
+            else None,
+            _module_process_source("openeo_processes_dask_slim"),
+        ],
+        wrap_funcs=[process],
+    )
+    graph = OpenEOProcessGraph(pg_data)
+    result = graph.to_callable(
+        process_registry=registry, results_cache=RefCountedResults(graph)
+    )()
+
+    # The union of the bands is read by each consumer instead of being held
+    # in memory, each consumer still gets its own bands.
+    assert persisted == []
+    xr.testing.assert_equal(result.compute(), BANDS_CUBE.compute())
+
+
+def test_shared_results_are_persisted_if_they_fit_in_memory(client, monkeypatch):
+    cube = BANDS_CUBE * 2
+    assert client.who_has(results_cache._persist(cube))
+
+    monkeypatch.setattr(results_cache, "_cluster_memory", lambda client: cube.nbytes)
+    assert results_cache._persist(cube) is cube
@@ -0,0 +1,171 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import rioxarray  # noqa: F401
+import xarray as xr
+
+from openeo_argoworkflows_executor.extra_processes.process_implementations.io import (
+    save_result,
+)
+
+CRS = "EPSG:32633"
+
+
+def _cube(dtype="uint16", size=16, chunk=8):
+    data = np.arange(2 * 2 * size * size).reshape(2, 2, size, size) % 1000
+    data = data.astype(dtype)
+    cube = xr.DataArray(
+        data,
+        dims=("bands", "t", "y", "x"),
+        coords={
+            "bands": ["B04", "B08"],
+            "t": pd.date_range("2026-01-01", periods=2),
+            "y": 5_000_000 - 10.0 * np.arange(size),
+            "x": 400_000 + 10.0 * np.arange(size),
+        },
+    )
+    return cube.chunk({"t": 1, "y": chunk, "x": chunk}).rio.write_crs(CRS)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    (tmp_path / "RESULTS").mkdir()
+    monkeypatch.setenv("OPENEO_RESULTS_PATH", str(tmp_path / "RESULTS"))
+    monkeypatch.setenv("OPENEO_METADATA_PATH", str(tmp_path / "METADATA"))
+    return tmp_path
+
+
+def _outputs(workspace):
+    return sorted(os.listdir(workspace / "RESULTS"))
+
+
+def _manifest(workspace):
+    (manifest,) = (workspace / "METADATA").glob("*.manifest.json")
+    return json.loads(manifest.read_text())
+
+
+def test_results_are_a_single_file_by_default(workspace):
+    save_result(_cube(size=64, chunk=8), "netCDF", {"chunksizes": {"y": 8, "x": 8}})
+
+    (output,) = _outputs(workspace)
+    assert output.endswith(".nc")
+    assert [piece["file"] for piece in _manifest(workspace)["pieces"]] == [output]
+
+
+def test_piece_size_splits_results_into_chunk_aligned_pieces(workspace):
+    cube = _cube(size=16, chunk=8)
+    options = {"piece_size": 8, "chunksizes": {"t": 1, "y": 8, "x": 8}}
+    save_result(cube, "netCDF", options)
+
+    outputs = _outputs(workspace)
+    assert [output[-7:] for output in outputs] == [
+        "_0_0.nc",
+        "_0_1.nc",
+        "_1_0.nc",
+        "_1_1.nc",
+    ]
+    pieces = [xr.open_dataset(workspace / "RESULTS" / output) for output in outputs]
+    assert all(piece.sizes["x"] == piece.sizes["y"] == 8 for piece in pieces)
+
+    merged = xr.combine_by_coords(pieces)
+    np.testing.assert_array_equal(merged["B08"].values, cube.sel(bands="B08").values)
+
+
+def _only_output(workspace):
+    (output,) = _outputs(workspace)
+    return workspace / "RESULTS" / output
+
+
+@pytest.mark.parametrize(
+    "layout, chunksizes", [("time", (1, 512, 512)), ("space", (2, 128, 128))]
+)
+def test_netcdf_keeps_the_dtype_and_follows_the_layout(workspace, layout, chunksizes):
+    save_result(_cube(size=1024, chunk=512), "netCDF", {"layout": layout})
+
+    with xr.open_dataset(_only_output(workspace)) as ds:
+        assert set(ds.data_vars) == {"B04", "B08"}
+        assert ds["B04"].dtype == "uint16"
+        assert ds["B04"].encoding["zlib"]
+        assert ds["B04"].encoding["chunksizes"] == chunksizes
+        # Coordinates are stored contiguously, readable in one range request.
+        assert ds["x"].encoding.get("contiguous")
+        assert ds.attrs["crs"] == CRS
+
+
+def test_netcdf_packs_floats_with_nodata_and_scale(workspace):
+    cube = _cube(dtype="float32") / 10
+    cube = cube.where(cube.x > 400_000).rio.write_crs(CRS)
+    save_result(cube, "netCDF", {"dtype": "int16", "scale_factor": 0.1})
+
+    path = _only_output(workspace)
+    with xr.open_dataset(path, mask_and_scale=False) as raw:
+        assert raw["B04"].dtype == "int16"
+        assert raw["B04"].attrs["_FillValue"] == np.iinfo("int16").min
+        assert raw["B04"].attrs["scale_factor"] == 0.1
+        assert (raw["B04"].isel(x=0) == np.iinfo("int16").min).all()
+
+    with xr.open_dataset(path) as ds:
+        np.testing.assert_allclose(
+            ds["B04"].values, cube.sel(bands="B04").values, atol=0.05
+        )
+
+
+def test_zarr_is_consolidated_and_chunked_by_layout(workspace):
+    cube = _cube(size=1024, chunk=512)
+    save_result(cube, "Zarr", {"layout": "space", "nodata": 0})
+
+    path = _only_output(workspace)
+    assert path.suffix == ".zarr"
+    with xr.open_zarr(path, consolidated=True, mask_and_scale=False) as ds:
+        assert ds["B08"].dtype == "uint16"
+        assert ds["B08"].encoding["chunks"] == (2, 128, 128)
+        assert ds["B08"].attrs["_FillValue"] == 0
+        np.testing.assert_array_equal(ds["B08"].values, cube.sel(bands="B08").values)
+
+
+def test_gtiff_writes_one_cog_per_timestep(workspace):
+    rasterio = pytest.importorskip("rasterio")
+
+    cube = _cube(dtype="float32", size=1024, chunk=512)
+    cube = cube.where(cube.x > 400_000).rio.write_crs(CRS)
+    save_result(cube, "GTiff", {"dtype": "int16", "blocksize": 256})
+
+    outputs = _outputs(workspace)
+    assert [output.split("_", 1)[1] for output in outputs] == [
+        "20260101T000000.tif",
+        "20260102T000000.tif",
+    ]
+    with rasterio.open(workspace / "RESULTS" / outputs[1]) as src:
+        assert src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+        assert src.block_shapes == [(256, 256), (256, 256)]
+        assert src.overviews(1)
+        assert src.dtypes == ("int16", "int16")
+        assert src.nodata == np.iinfo("int16").min
+        assert src.crs.to_string() == CRS
+        band = src.read(2)
+        assert (band[:, 0] == src.nodata).all()
+        np.testing.assert_array_equal(
+            band[:, 1:], cube.isel(t=1).sel(bands="B08").values[:, 1:]
+        )
+
+
+def test_the_manifest_describes_every_output(workspace):
+    save_result(_cube(), "GTiff")
+
+    manifest = _manifest(workspace)
+    assert manifest["crs"] == CRS
+    assert [piece["file"] for piece in manifest["pieces"]] == _outputs(workspace)
+
+    piece = manifest["pieces"][0]
+    assert piece["shape"] == {"bands": 2, "y": 16, "x": 16}
+    assert piece["bounds"] == [400_000.0, 4_999_850.0, 400_150.0, 5_000_000.0]
+    assert piece["stac"]["proj_shape"] == [16, 16]
+    assert piece["stac"]["start_datetime"] == "2026-01-01T00:00:00Z"
+
+
+def test_unsupported_formats_are_rejected(workspace):
+    with pytest.raises(ValueError, match="not supported"):
+        save_result(_cube(), "JPEG")
@@ -0,0 +1,225 @@
+import datetime
+
+import pytest
+
+from openeo_pg_parser_networkx import OpenEOProcessGraph
+from openeo_pg_parser_networkx.pg_schema import TemporalInterval
+
+from openeo_argoworkflows_executor import executor
+from openeo_argoworkflows_executor.extra_processes.process_implementations import io
+from openeo_argoworkflows_executor.extra_processes.process_implementations.io import (
+    save_result,
+)
+from openeo_argoworkflows_executor.stac import (
+    StacGrid,
+    StacItemIndex,
+    _item_indices,
+    create_result_items,
+    create_stac_item,
+    get_item_index,
+    register_item_index,
+)
+
+from tests.test_save_result import _cube, _outputs, workspace  # noqa: F401
+
+
+@pytest.mark.parametrize("format", ["netCDF", "GTiff"])
+def test_items_from_metadata_match_items_from_the_results(workspace, format):
+    save_result(_cube(), format)
+    filepaths = [str(workspace / "RESULTS" / output) for output in _outputs(workspace)]
+
+    items = create_result_items(filepaths, workspace / "METADATA", workers=4)
+    assert [item.id for item in items] == [
+        output.rsplit(".", 1)[0] for output in _outputs(workspace)
+    ]
+    for filepath, item in zip(filepaths, items):
+        expected = create_stac_item(filepath).to_dict()
+        item = item.to_dict()
+        if format == "GTiff":
+            # GeoTIFFs don't store their timestep, so the item of an opened
+            # GeoTIFF gets the time it was created instead.
+            assert item["properties"].pop("datetime").startswith("2026-01-0")
+            expected["properties"].pop("datetime")
+        assert item == expected
+
+
+def test_results_without_metadata_are_opened(workspace):
+    save_result(_cube(), "netCDF")
+    for manifest in (workspace / "METADATA").iterdir():
+        manifest.unlink()
+    (output,) = _outputs(workspace)
+    filepath = str(workspace / "RESULTS" / output)
+
+    (item,) = create_result_items([filepath], workspace / "METADATA")
+    assert item.to_dict() == create_stac_item(filepath).to_dict()
+    assert item.properties["proj:shape"] == [16, 16]
+
+
+# A job bbox of about 44 x 33 km, split into 10 km tiles.
+BBOX = [16.0, 48.0, 16.6, 48.3]
+
+
+def _item(item_id, bbox, geometry=True):
+    item = {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "id": item_id,
+        "bbox": bbox,
+        "geometry": None,
+        "properties": {"datetime": "2026-01-01T00:00:00Z"},
+        "links": [],
+        "assets": {},
+    }
+    if geometry:
+        west, south, east, north = bbox
+        corners = [(west, south), (east, south), (east, north), (west, north)]
+        item["geometry"] = {
+            "type": "Polygon",
+            "coordinates": [corners + corners[:1]],
+        }
+    return item
+
+
+@pytest.fixture(autouse=True)
+def item_indices():
+    yield
+    _item_indices.clear()
+
+
+def test_item_index_serves_the_items_of_a_tile():
+    items = [
+        _item("west", [16.0, 48.0, 16.2, 48.3]),
+        _item("east", [16.4, 48.0, 16.6, 48.3], geometry=False),
+        _item("no-footprint", None, geometry=False),
+    ]
+    index = StacItemIndex(BBOX, items)
+
+    assert [item["id"] for item in index.items] == ["west", "east"]
+    assert [item.id for item in index.query([16.1, 48.1, 16.15, 48.2])] == ["west"]
+    assert [item.id for item in index.query([16.1, 48.1, 16.5, 48.2])] == [
+        "west",
+        "east",
+    ]
+    assert index.query([16.25, 48.1, 16.35, 48.2]) == []
+
+
+def test_item_index_only_covers_its_extent():
+    index = StacItemIndex(BBOX, [])
+
+    assert index.covers([16.2, 48.1, 16.6, 48.3])
+    assert index.covers([16.2, 48.1, 16.6 + 1e-7, 48.3])
+    assert not index.covers([16.2, 48.1, 16.7, 48.3])
+
+
+def test_item_indices_are_found_by_normalised_datetimes():
+    index = StacItemIndex(BBOX, [])
+    register_item_index("s2", "2026-01-01", "2026-02-01T01:00:00+01:00", index)
+
+    (start, end) = TemporalInterval(["2026-01-01T00:00:00Z", "2026-02-01T00:00:00Z"])
+    assert get_item_index("s2", start.root, end.root) is index
+    assert get_item_index("s2", "2026-01-01T00:00:00Z", "2026-02-01") is index
+    assert get_item_index("s1", "2026-01-01", "2026-02-01") is None
+    assert get_item_index("s2", "2026-01-02", "2026-02-01") is None
+
+    register_item_index("s2", "2026-01-01", None, index)
+    assert get_item_index("s2", datetime.datetime(2026, 1, 1), "..") is index
+
+
+class Catalog:
+    def __init__(self, items):
+        self.items = items
+        self.searches = []
+
+    def search(self, **query):
+        self.searches.append(query)
+        return type("Search", (), {"items": lambda _: iter(self.items)})()
+
+
+def test_tiles_fall_back_to_their_own_search(monkeypatch):
+    catalog = Catalog(["searched"])
+    monkeypatch.setattr(io, "open_catalog", lambda: catalog)
+    register_item_index(
+        "s2",
+        "2026-01-01T00:00:00Z",
+        "2026-02-01T00:00:00Z",
+        StacItemIndex(BBOX, [_item("indexed", BBOX)]),
+    )
+    temporal_extent = TemporalInterval(["2026-01-01T00:00:00Z", "2026-02-01T00:00:00Z"])
+
+    tile = {"collections": ["s2"], "bbox": (16.1, 48.1, 16.2, 48.2)}
+    items = io._search_items("s2", tile, temporal_extent)
+    assert [item.id for item in items] == ["indexed"]
+    assert catalog.searches == []
+
+    outside = {"collections": ["s2"], "bbox": (16.5, 48.1, 16.7, 48.2)}
+    assert io._search_items("s2", outside, temporal_extent) == ["searched"]
+    other_collection = {"collections": ["s1"], "bbox": (16.1, 48.1, 16.2, 48.2)}
+    assert io._search_items("s1", other_collection, temporal_extent) == ["searched"]
+    assert len(catalog.searches) == 2
+
+
+def _grid():
+    grid = StacGrid(BBOX, 10000, 4326)
+    grid.set_grid_cells()
+    return grid
+
+
+def test_grid_drops_the_cells_no_footprint_intersects():
+    grid = _grid()
+    n_cells = len(grid.cells)
+    footprint = StacItemIndex(BBOX, [_item("west", [16.0, 48.0, 16.1, 48.3])])
+
+    dropped = grid.drop_uncovered_cells(footprint.footprints)
+    assert len(grid.cells) + len(dropped) == n_cells
+    assert all(cell[2].bounds[0] < 16.1 for cell in grid.cells)
+    assert all(cell[2].bounds[0] >= 16.1 for cell in dropped)
+
+
+def _load_graph(temporal_extent=("2026-01-01T00:00:00Z", "2026-02-01T00:00:00Z")):
+    return {
+        "load": {
+            "process_id": "load_collection",
+            "arguments": {
+                "id": "s2",
+                "spatial_extent": dict(zip(("west", "south", "east", "north"), BBOX)),
+                "temporal_extent": list(temporal_extent),
+            },
+        },
+        "save": {
+            "process_id": "save_result",
+            "arguments": {"data": {"from_node": "load"}, "format": "netCDF"},
+            "result": True,
+        },
+    }
+
+
+def test_executor_drops_tiles_without_items(monkeypatch):
+    searches = []
+
+    def search_items(collection_id, bbox, datetime_range):
+        searches.append((collection_id, bbox, datetime_range))
+        return [_item("west", [16.0, 48.0, 16.1, 48.3])]
+
+    monkeypatch.setattr(executor, "search_items", search_items)
+    n_cells = len(_grid().cells)
+
+    sub_graphs = executor.prepare_graphs(OpenEOProcessGraph(_load_graph()), 10000)
+    assert searches == [
+        ("s2", BBOX, "2026-01-01T00:00:00Z/2026-02-01T00:00:00Z")
+    ]
+    assert 0 < len(sub_graphs) < n_cells
+    assert get_item_index("s2", "2026-01-01", "2026-02-01") is not None
+
+
+@pytest.mark.parametrize("items", [[], Exception("STAC API down")])
+def test_executor_keeps_every_tile_without_a_pre_query(monkeypatch, items):
+    def search_items(*args):
+        if isinstance(items, Exception):
+            raise items
+        return items
+
+    monkeypatch.setattr(executor, "search_items", search_items)
+
+    sub_graphs = executor.prepare_graphs(OpenEOProcessGraph(_load_graph()), 10000)
+    assert len(sub_graphs) == len(_grid().cells)
+    assert get_item_index("s2", "2026-01-01", "2026-02-01") is None
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from openeo_argoworkflows_executor import stac_api
+from openeo_argoworkflows_executor.profiling import profiler
+
+
+class StacApiStub(BaseHTTPRequestHandler):
+    """Answers with the queued statuses first, then with 200."""
+
+    statuses: list = []
+    requests = 0
+    in_flight = 0
+    max_in_flight = 0
+    delay = 0.0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            status = cls.statuses.pop(0) if cls.statuses else 200
+        time.sleep(cls.delay)
+
+        body = json.dumps({"type": "Catalog"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+        with cls.lock:
+            cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stac_server(monkeypatch):
+    # A subclass per test, so that the counters start from zero.
+    handler = type(
+        "Handler", (StacApiStub,), {"statuses": [], "lock": threading.Lock()}
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(stac_api, "BACKOFF_FACTOR", 0)
+    stac_api.get_stac_io.cache_clear()
+    yield handler, f"http://127.0.0.1:{server.server_port}/"
+
+    server.shutdown()
+    server.server_close()
+    stac_api.get_stac_io.cache_clear()
+
+
+def test_rate_limited_requests_are_retried(stac_server):
+    handler, url = stac_server
+    handler.statuses = [429, 503]
+    failed = profiler.operations.get("stac_api_request", {}).get("failed", 0)
+
+    assert json.loads(stac_api.get_stac_io().request(url)) == {"type": "Catalog"}
+    assert handler.requests == 3
+    # The retries are one request to the caller.
+    assert profiler.operations["stac_api_request"]["failed"] == failed
+
+
+def test_requests_fail_once_the_retries_are_used_up(stac_server):
+    handler, url = stac_server
+    handler.statuses = [429] * (stac_api.MAX_RETRIES + 1)
+
+    with pytest.raises(Exception):
+        stac_api.get_stac_io().request(url)
+    assert handler.requests == stac_api.MAX_RETRIES + 1
+
+
+def test_requests_share_a_bounded_connection_pool(stac_server):
+    handler, url = stac_server
+    handler.delay = 0.05
+    stac_io = stac_api.get_stac_io()
+    assert stac_api.get_stac_io() is stac_io
+
+    n_requests = 3 * stac_api.MAX_CONCURRENT_REQUESTS
+    with ThreadPoolExecutor(max_workers=n_requests) as pool:
+        list(pool.map(lambda _: stac_io.request(url), range(n_requests)))
+
+    assert handler.requests == n_requests
+    assert handler.max_in_flight == stac_api.MAX_CONCURRENT_REQUESTS